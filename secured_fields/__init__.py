@@ -1,2 +1,3 @@
 from .fields import *
 from .mixins import *
+from .query import *
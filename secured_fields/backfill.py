@@ -0,0 +1,337 @@
+import itertools
+import typing
+from concurrent import futures
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import BinaryField, Case, ExpressionWrapper, F, Field, Model, QuerySet, TextField, Value, When
+from django.db.models.lookups import Exact, IsNull
+
+from .fernet import get_fernet
+from .mixins import EncryptedMixin
+
+
+class Batch(typing.NamedTuple):
+    last_pk: typing.Any
+    rows: int
+    updated: int
+    failed: int
+
+
+class RawChange(typing.NamedTuple):
+    """Change of a stored value, and of its hash column if any, applied only when it is still `old`"""
+
+    old: typing.Optional[str]
+    new: typing.Optional[str]
+    hashed: typing.Optional[str] = None
+
+
+def iter_batches(queryset: QuerySet, batch_size: int, start_after=None) -> typing.Iterator[typing.List[typing.Any]]:
+    """Walk the queryset in primary key order using keyset pagination
+
+    Unlike `OFFSET` pagination, every batch is an indexed range scan, and rows leaving the queryset
+    while it is walked (e.g. once they are backfilled) do not make the next batch skip any row.
+    Querysets of values must select the primary key first.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = start_after
+
+    while True:
+        batch_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(batch_queryset[:batch_size])
+        if not batch:
+            return
+
+        yield batch
+        last_pk = batch[-1].pk if isinstance(batch[-1], Model) else batch[-1][0]
+
+
+def get_encrypted_fields(model: typing.Type[Model]) -> list:
+    # pylint: disable=protected-access
+    return [field for field in model._meta.local_concrete_fields if isinstance(field, EncryptedMixin)]
+
+
+def get_raw_field(field: Field) -> Field:
+    """Return the field the stored values are read as, so they are not decrypted when loaded"""
+
+    return BinaryField() if getattr(field, 'binary', False) else TextField()
+
+
+def get_raw_expression(field: Field) -> ExpressionWrapper:
+    """Return the column of the field read as its stored values
+
+    The column is not cast, MySQL has no `CAST()` to its `longblob` type of binary values.
+    """
+    return ExpressionWrapper(F(field.name), output_field=get_raw_field(field))
+
+
+def get_raw_values(model: typing.Type[Model], field_names: typing.Sequence[str], *, using: str) -> QuerySet:
+    """Primary keys and stored values of the fields, without decrypting them"""
+
+    fields = [model._meta.get_field(field_name) for field_name in field_names]  # pylint: disable=protected-access
+    raw_fields = [get_raw_expression(field) for field in fields]
+    return model._base_manager.using(using).values_list('pk', *raw_fields)  # pylint: disable=protected-access
+
+
+def update_raw_values(
+    model: typing.Type[Model],
+    changes: typing.Dict[str, typing.Dict[typing.Any, RawChange]],
+    *,
+    using: str,
+):
+    """Write new stored values in a single `UPDATE`, from the changes of each field by primary key
+
+    A value is only replaced when it is still the old one, so changes saved since it was read are kept.
+    """
+    pks = set()
+    updates = {}
+    for field_name, values in changes.items():
+        if not values:
+            continue
+
+        field = model._meta.get_field(field_name)  # pylint: disable=protected-access
+        old_value = get_raw_expression(field)
+        columns = {field_name: ({pk: change.new for pk, change in values.items()}, get_raw_field(field))}
+        if field.hash_field is not None:
+            columns[field.hash_field.name] = ({pk: change.hashed for pk, change in values.items()}, TextField())
+
+        for column_name, (column_values, output_field) in columns.items():
+            conditions = [
+                When(Exact(old_value, values[pk].old), pk=pk, then=Value(value, output_field=output_field))
+                for pk, value in column_values.items()
+                if value is not None
+            ]
+            if conditions:
+                updates[column_name] = Case(*conditions, default=F(column_name), output_field=output_field)
+        pks.update(values)
+
+    if updates:
+        model._base_manager.using(using).filter(pk__in=pks).update(**updates)  # pylint: disable=protected-access
+
+
+def rotate_keys(
+    model: typing.Type[Model],
+    *,
+    using: str = DEFAULT_DB_ALIAS,
+    batch_size: int = 1000,
+    workers: int = 1,
+    start_after=None,
+) -> typing.Iterator[Batch]:
+    """Re-encrypt the stored values of every encrypted field of the model with the primary key
+
+    With a key provider, the primary key is the current data key, see `fernet.DataKeys`. With a key
+    resolver, the keys are the ones of the calling context, e.g. within `resolvers.use_tenant()`. Values
+    already encrypted with the primary key are skipped, and the hashed sections are kept as is.
+    Each batch is updated in its own transaction, and reported once committed, so the walk can be
+    resumed after its last primary key.
+    """
+    fields = get_encrypted_fields(model)
+    if not fields:
+        return
+    # NOTE: resolved here, the threads of the executor do not get the context of the caller
+    clients = {field.name: get_fernet(field) for field in fields}
+    primary_key_ids = {name: client.get_primary_key_id() for name, client in clients.items()}
+
+    def rotate(field: EncryptedMixin, value) -> typing.Tuple[typing.Any, bool]:
+        """Return the rotated value, `None` when it is already up to date, and whether it failed"""
+
+        if value is None:
+            return None, False
+
+        client = clients[field.name]
+
+        encrypted_section = field.get_token(value)
+        if not client.is_token(encrypted_section):
+            # not encrypted yet, see `secured_fields.operations`
+            return None, False
+
+        key_id = client.find_key_id(encrypted_section)
+        if key_id is None:
+            return None, True
+        if key_id == primary_key_ids[field.name]:
+            return None, False
+
+        if field.binary:
+            return client.from_token(client.rotate(encrypted_section)), False
+
+        return client.rotate(encrypted_section).decode() + value[len(encrypted_section):], False
+
+    queryset = get_raw_values(model, [field.name for field in fields], using=using)
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in iter_batches(queryset, batch_size, start_after=start_after):
+            changes = {field.name: {} for field in fields}
+            failed = 0
+            for index, field in enumerate(fields, 1):
+                values = [row[index] for row in batch]
+                for row, (rotated, is_failed) in zip(batch, executor.map(rotate, itertools.repeat(field), values)):
+                    if rotated is not None:
+                        changes[field.name][row[0]] = RawChange(row[index], rotated)
+                    failed += is_failed
+
+            with transaction.atomic(using=using):
+                update_raw_values(model, changes, using=using)
+
+            rotated_pks = set()
+            for values in changes.values():
+                rotated_pks.update(values)
+            yield Batch(batch[-1][0], len(batch), len(rotated_pks), failed)
+
+
+def backfill_hash_column(
+    model: typing.Type[Model],
+    field_name: str,
+    *,
+    using: str = DEFAULT_DB_ALIAS,
+    batch_size: int = 1000,
+) -> int:
+    """Fill the hash column of a searchable field with `hash_column=True` for existing records
+
+    Only records without a hashed value are updated, so an interrupted backfill can be run again.
+    Returns the number of updated records.
+    """
+    field = model._meta.get_field(field_name)  # pylint: disable=protected-access
+    assert getattr(field, 'hash_field', None) is not None, f'`{field_name}` should have `hash_column=True`'
+
+    hash_field_name = field.hash_field.name
+    manager = model._base_manager.db_manager(using)  # pylint: disable=protected-access
+    queryset = manager.filter(**{f'{hash_field_name}__isnull': True})
+    queryset = queryset.only('pk', field_name)
+
+    updated = 0
+    for batch in iter_batches(queryset, batch_size):
+        # NOTE: the hash field resolves its value from the decrypted value of the encrypted field,
+        #       so only the hash column gets written
+        updated += manager.bulk_update(batch, [hash_field_name])
+
+    return updated
+
+
+def get_text_field(model: typing.Type[Model], field_name: str) -> EncryptedMixin:
+    field = model._meta.get_field(field_name)  # pylint: disable=protected-access
+    assert isinstance(field, EncryptedMixin), f'`{field_name}` should be an encrypted field'
+    if field.get_original_internal_type() == 'BinaryField':
+        raise NotImplementedError('`BinaryField` values cannot be converted in place')
+    if field.binary:
+        raise NotImplementedError('Values of fields with `binary=True` cannot be converted in place')
+
+    return field
+
+
+def is_encrypted(field: EncryptedMixin, value: str) -> bool:
+    client = get_fernet(field)
+    encrypted_section = field.get_encrypted_section(value)
+
+    return client.is_token(encrypted_section) and client.find_key_id(encrypted_section) is not None
+
+
+def encrypt_existing_values(
+    model: typing.Type[Model],
+    field_name: str,
+    *,
+    using: str = DEFAULT_DB_ALIAS,
+    batch_size: int = 1000,
+    start_after=None,
+) -> typing.Iterator[Batch]:
+    """Encrypt the values stored unencrypted before the field was encrypted
+
+    Values are read the same way as `from_db_value()` reads them, then stored the same way as `save()`
+    stores them, hashed section or hash column included. Only one batch is held in memory, and
+    already encrypted values are skipped, so an interrupted pass can be run again.
+    """
+    field = get_text_field(model, field_name)
+    connection = connections[using]
+
+    # NOTE: `isnull` of a searchable field checks its hash, which unencrypted values may not have
+    queryset = get_raw_values(model, [field_name], using=using).filter(IsNull(get_raw_expression(field), False))
+    for batch in iter_batches(queryset, batch_size, start_after=start_after):
+        changes = {}
+        for pk, value in batch:
+            if is_encrypted(field, value):
+                continue
+
+            python_value = field.decrypt_db_value(value, connection=connection)
+            changes[pk] = RawChange(
+                value,
+                field.get_db_prep_save(python_value, connection),
+                field.get_hash(python_value, connection) if field.hash_field is not None else None,
+            )
+
+        with transaction.atomic(using=using):
+            update_raw_values(model, {field_name: changes}, using=using)
+
+        yield Batch(batch[-1][0], len(batch), len(changes), 0)
+
+
+def decrypt_existing_values(
+    model: typing.Type[Model],
+    field_name: str,
+    *,
+    using: str = DEFAULT_DB_ALIAS,
+    batch_size: int = 1000,
+) -> typing.Iterator[Batch]:
+    """Store the values of an encrypted field unencrypted, as they were before it was encrypted"""
+
+    field = get_text_field(model, field_name)
+    connection = connections[using]
+
+    # NOTE: `isnull` of a searchable field checks its hash, which unencrypted values may not have
+    queryset = get_raw_values(model, [field_name], using=using).filter(IsNull(get_raw_expression(field), False))
+    for batch in iter_batches(queryset, batch_size):
+        changes = {}
+        for pk, value in batch:
+            if not is_encrypted(field, value):
+                continue
+
+            python_value = field.decrypt_db_value(value, connection=connection)
+            # the value which `get_db_prep_save()` encrypts
+            plaintext = field.prepare_encryption(field.prepare_db_value(python_value, connection)).decode()
+            changes[pk] = RawChange(value, plaintext)
+
+        with transaction.atomic(using=using):
+            update_raw_values(model, {field_name: changes}, using=using)
+
+        yield Batch(batch[-1][0], len(batch), len(changes), 0)
+
+
+def backfill_hashes(
+    model: typing.Type[Model],
+    field_name: str,
+    *,
+    using: str = DEFAULT_DB_ALIAS,
+    batch_size: int = 1000,
+    start_after=None,
+) -> typing.Iterator[Batch]:
+    """Add the hashed values of a field changed to `searchable=True` to its existing records
+
+    Values are decrypted once to be hashed, and only their hashed section (or hash column) is written,
+    the encrypted section stays as it is. Values which already have it are skipped without being
+    decrypted, so an interrupted pass can be run again.
+    """
+    field = get_text_field(model, field_name)
+    assert field.searchable, f'`{field_name}` should have `searchable=True`'
+    connection = connections[using]
+
+    queryset = get_raw_values(model, [field_name], using=using).filter(IsNull(get_raw_expression(field), False))
+    if field.hash_field is not None:
+        queryset = queryset.filter(**{f'{field.hash_field.name}__isnull': True})
+
+    for batch in iter_batches(queryset, batch_size, start_after=start_after):
+        changes = {}
+        failed = 0
+        for pk, value in batch:
+            if field.hash_field is None and field.get_encrypted_section(value) != value:
+                continue
+            if not is_encrypted(field, value):
+                # not encrypted yet, see `encrypt_existing_values()`
+                failed += 1
+                continue
+
+            hashed = field.get_hash(field.decrypt_db_value(value, connection=connection), connection)
+            if field.hash_field is None:
+                changes[pk] = RawChange(value, value + field.separator + hashed)
+            else:
+                changes[pk] = RawChange(value, None, hashed)
+
+        with transaction.atomic(using=using):
+            update_raw_values(model, {field_name: changes}, using=using)
+
+        yield Batch(batch[-1][0], len(batch), len(changes), failed)
@@ -0,0 +1,183 @@
+import collections
+import contextlib
+import contextvars
+import hashlib
+import threading
+import time
+import typing
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'entries', 'size'])
+
+# overhead of an entry on top of its value, the sha256 digest of the token
+ENTRY_OVERHEAD = 32
+
+
+class DecryptionCache:
+    """LRU cache of decrypted values keyed by the digest of their token
+
+    Entries are evicted once there are more than `max_entries` of them, or their values take more than
+    `max_bytes`, and expire after `ttl` seconds if set.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: typing.Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.entries: typing.OrderedDict[bytes, typing.Tuple[bytes, typing.Optional[float]]] = \
+            collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, token: bytes) -> typing.Optional[bytes]:
+        key = hashlib.sha256(token).digest()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                self._delete(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token: bytes, value: bytes):
+        size = len(value) + ENTRY_OVERHEAD
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        key = hashlib.sha256(token).digest()
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+
+        with self.lock:
+            if key in self.entries:
+                self._delete(key)
+
+            self.entries[key] = (value, expires_at)
+            self.size += size
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._delete(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, len(self.entries), self.size)
+
+    def _delete(self, key: bytes):
+        value, _ = self.entries.pop(key)
+        self.size -= len(value) + ENTRY_OVERHEAD
+
+
+class ClientCache:
+    """LRU cache of the clients of keys, see `fernet.DataKeys` and `fernet.ClientRegistry`
+
+    Entries are evicted once there are more than `max_entries` of them, and expire after `ttl` seconds if set,
+    so unwrapped keys do not stay in memory longer than needed.
+    """
+
+    def __init__(self, max_entries: int, ttl: typing.Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.entries: typing.OrderedDict[typing.Hashable, typing.Tuple[typing.Any, typing.Optional[float]]] = \
+            collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key_id: typing.Hashable) -> typing.Any:
+        with self.lock:
+            entry = self.entries.get(key_id)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                del self.entries[key_id]
+                entry = None
+
+            if entry is None:
+                return None
+
+            self.entries.move_to_end(key_id)
+            return entry[0]
+
+    def set(self, key_id: typing.Hashable, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+
+        with self.lock:
+            self.entries.pop(key_id, None)
+            self.entries[key_id] = (value, expires_at)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def create_cache(**kwargs) -> DecryptionCache:
+    kwargs.setdefault('max_entries', getattr(settings, 'SECURED_FIELDS_DECRYPTION_CACHE_MAX_ENTRIES', 1024))
+    kwargs.setdefault('max_bytes', getattr(settings, 'SECURED_FIELDS_DECRYPTION_CACHE_MAX_BYTES', 1024 * 1024))
+    kwargs.setdefault('ttl', getattr(settings, 'SECURED_FIELDS_DECRYPTION_CACHE_TTL', None))
+
+    return DecryptionCache(**kwargs)
+
+
+process_cache: typing.Optional[DecryptionCache] = None
+scoped_cache: contextvars.ContextVar[typing.Optional[DecryptionCache]] = \
+    contextvars.ContextVar('scoped_cache', default=None)
+
+
+def get_decryption_cache() -> typing.Optional[DecryptionCache]:
+    """Return the cache of the current scope, or the process-wide one if enabled"""
+
+    global process_cache
+
+    cache = scoped_cache.get()
+    if cache is not None:
+        return cache
+
+    if process_cache is None and getattr(settings, 'SECURED_FIELDS_DECRYPTION_CACHE', False):
+        process_cache = create_cache()
+
+    return process_cache
+
+
+@contextlib.contextmanager
+def decryption_cache(**kwargs) -> typing.Iterator[DecryptionCache]:
+    """Cache decrypted values in a new cache, dropped at the end of the block
+
+    Accepts the same arguments as `DecryptionCache`, defaulting to the ones of the settings.
+    """
+    cache = create_cache(**kwargs)
+    token = scoped_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        scoped_cache.reset(token)
+
+
+@receiver(setting_changed)
+def reset_cache(setting, **kwargs):  # pylint: disable=unused-argument
+    global process_cache
+
+    # NOTE: cached values must not outlive the keys which decrypted them
+    if setting == 'SECURED_FIELDS_KEY' or setting.startswith('SECURED_FIELDS_DECRYPTION_CACHE'):
+        if process_cache is not None:
+            process_cache.clear()
+        process_cache = None
+
+        cache = scoped_cache.get()
+        if cache is not None and setting == 'SECURED_FIELDS_KEY':
+            cache.clear()
@@ -0,0 +1,133 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import typing
+
+from cryptography import exceptions, fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import aead
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+class AEADCipher:
+    """Encryption with an AEAD algorithm, using keys derived from the Fernet keys of `SECURED_FIELDS_KEY`
+
+    A token is the version prefix followed by the id of the key, the nonce and the ciphertext with its tag,
+    encoded in base64url without padding. It is 32 bytes longer than the value before encoding, against
+    57 bytes plus the padding to the block size for a Fernet token. Failures raise `fernet.InvalidToken`,
+    like Fernet does.
+    """
+
+    name: str
+    prefix: bytes
+    # magic of the files encrypted with the cipher, see `secured_fields.streams`
+    magic: bytes
+    algorithm: typing.Type
+
+    key_id_size = 4
+    nonce_size = 12
+    tag_size = 16
+    overhead = key_id_size + nonce_size + tag_size
+
+    token_pattern = re.compile(r'[A-Za-z0-9_-]*')
+
+    def __init__(self, keys: typing.Sequence[typing.Union[bytes, str]]):
+        keys = [key.encode() if isinstance(key, str) else key for key in keys]
+
+        # same ids as `MultiFernet.get_key_id()`, as bytes
+        self.key_ids = [hashlib.sha256(key).digest()[:self.key_id_size] for key in keys]
+        self.aeads = [self.algorithm(self.derive_key(key)) for key in keys]
+        self.aeads_by_key_id = dict(zip(reversed(self.key_ids), reversed(self.aeads)))
+
+    def derive_key(self, key: bytes) -> bytes:
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b'secured_fields ' + self.name.encode(),
+        ).derive(base64.urlsafe_b64decode(key))
+
+    def encrypt_raw(self, data: bytes) -> bytes:
+        nonce = os.urandom(self.nonce_size)
+        return self.key_ids[0] + nonce + self.aeads[0].encrypt(nonce, data, self.prefix)
+
+    def split(self, record: bytes) -> typing.Tuple[bytes, bytes, bytes]:
+        """Split a record into its key id, nonce and ciphertext"""
+
+        if len(record) < self.overhead:
+            raise fernet.InvalidToken
+
+        nonce_end = self.key_id_size + self.nonce_size
+        return record[:self.key_id_size], record[self.key_id_size:nonce_end], record[nonce_end:]
+
+    def decrypt_raw(self, record: bytes) -> bytes:
+        key_id, nonce, ciphertext = self.split(record)
+
+        # NOTE: ids are short, so another key may share it
+        key = self.aeads_by_key_id.get(key_id)
+        for candidate in ([key] if key is not None else []) + [aead for aead in self.aeads if aead is not key]:
+            try:
+                return candidate.decrypt(nonce, ciphertext, self.prefix)
+            except exceptions.InvalidTag:
+                continue
+
+        raise fernet.InvalidToken
+
+    def encrypt(self, data: bytes) -> bytes:
+        return self.prefix + base64.urlsafe_b64encode(self.encrypt_raw(data)).rstrip(b'=')
+
+    def decrypt(self, token: bytes) -> bytes:
+        return self.decrypt_raw(self.decode(token))
+
+    def decode(self, token: bytes) -> bytes:
+        encoded = token[len(self.prefix):]
+        try:
+            return base64.urlsafe_b64decode(encoded + b'=' * (-len(encoded) % 4))
+        except (binascii.Error, ValueError) as e:
+            raise fernet.InvalidToken from e
+
+    def is_token(self, msg: str) -> bool:
+        encoded = msg[len(self.prefix):]
+        return (
+            msg.startswith(self.prefix.decode()) and len(encoded) * 3 // 4 >= self.overhead and
+            len(encoded) % 4 != 1 and self.token_pattern.fullmatch(encoded) is not None
+        )
+
+    def rotate(self, token: bytes) -> bytes:
+        return self.encrypt(self.decrypt(token))
+
+    def find_key_id(self, token: bytes) -> typing.Optional[str]:
+        """Return the id of the key which decrypts the token, as a hex string, `None` if none of them does"""
+
+        try:
+            _, nonce, ciphertext = self.split(self.decode(token))
+        except fernet.InvalidToken:
+            return None
+
+        for key_id, key in zip(self.key_ids, self.aeads):
+            try:
+                key.decrypt(nonce, ciphertext, self.prefix)
+            except exceptions.InvalidTag:
+                continue
+            return key_id.hex()
+
+        return None
+
+
+class AESGCMCipher(AEADCipher):
+    name = 'aes-gcm'
+    prefix = b'a1:'
+    magic = b'SFA1'
+    algorithm = aead.AESGCM
+
+
+class ChaCha20Poly1305Cipher(AEADCipher):
+    name = 'chacha20-poly1305'
+    prefix = b'c1:'
+    magic = b'SFC1'
+    algorithm = aead.ChaCha20Poly1305
+
+
+CIPHER_CLASSES: typing.Tuple[typing.Type[AEADCipher], ...] = (AESGCMCipher, ChaCha20Poly1305Cipher)
@@ -0,0 +1,89 @@
+import typing
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# NOTE: first byte of a compressed payload, which never starts a UTF-8 encoded value, so payloads
+#       stored before compression was enabled are told apart without another flag
+FLAG = b'\xff'
+MARKERS = {
+    'zlib': b'z',
+    'zstd': b's',
+}
+
+
+class CompressionStats:
+    """Values compressed by a field, and their size before and after compression"""
+
+    def __init__(self):
+        self.values = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+    def add(self, input_size: int, output_size: int):
+        self.values += 1
+        self.input_bytes += input_size
+        self.output_bytes += output_size
+
+    @property
+    def ratio(self) -> typing.Optional[float]:
+        """Compressed size over the original size, `None` before any value is compressed"""
+
+        if not self.input_bytes:
+            return None
+
+        return self.output_bytes / self.input_bytes
+
+
+def get_algorithm(option: typing.Union[bool, str]) -> typing.Optional[str]:
+    """Return the algorithm of the `compress` argument of a field, zlib for `True`"""
+
+    if not option:
+        return None
+    if option is True:
+        # NOTE: not picked from the installed packages, so values keep the same algorithm wherever they are written
+        return 'zlib'
+    if option not in MARKERS:
+        raise ValueError(f'Unknown compression: {option!r}')
+    if option == 'zstd' and zstandard is None:
+        raise ImproperlyConfigured('`compress=\'zstd\'` requires the `zstandard` package')
+
+    return option
+
+
+def get_min_size() -> int:
+    # NOTE: the size of a compressed value depends on its content, so the length of the ciphertext leaks
+    #       how much a value matching a guess compresses (CRIME/BREACH) when attacker-controlled input is
+    #       stored next to a secret. Compression is only done for fields opting in with `compress`.
+    return getattr(settings, 'SECURED_FIELDS_COMPRESSION_MIN_SIZE', 1024)
+
+
+def compress(algorithm: str, value: bytes) -> bytes:
+    if algorithm == 'zstd':
+        data = zstandard.ZstdCompressor().compress(value)
+    else:
+        data = zlib.compress(value)
+
+    return FLAG + MARKERS[algorithm] + data
+
+
+def is_compressed(payload: bytes) -> bool:
+    return payload.startswith(FLAG)
+
+
+def decompress(payload: bytes) -> bytes:
+    marker, data = payload[1:2], payload[2:]
+    if marker == MARKERS['zlib']:
+        return zlib.decompress(data)
+    if marker == MARKERS['zstd']:
+        if zstandard is None:
+            raise ImproperlyConfigured('Reading values compressed with zstd requires the `zstandard` package')
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    raise ValueError(f'Unknown compression marker: {marker!r}')
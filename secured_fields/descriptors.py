@@ -0,0 +1,42 @@
+import contextvars
+
+from django.db.models.query_utils import DeferredAttribute
+
+# load the values of every encrypted field lazily, see `EncryptedQuerySet.iterator()`
+lazy_decryption = contextvars.ContextVar('lazy_decryption', default=False)
+
+
+class EncryptedValue:
+    """Stored value of an encrypted field loaded lazily, which is decrypted on first access"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}>'
+
+
+class EncryptedAttribute(DeferredAttribute):
+    """Decrypt the value of an encrypted field loaded lazily on first access
+
+    Assigning a value replaces the stored one, so only unchanged values are kept encrypted on the
+    instance.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        value = super().__get__(instance, cls)
+        if isinstance(value, EncryptedValue):
+            value = self.field.decrypt_db_value(value.value)
+            instance.__dict__[self.field.attname] = value
+
+        return value
+
+    def __set__(self, instance, value):
+        # NOTE: a data descriptor, otherwise the instance's `__dict__` takes precedence over
+        #       `__get__()` once the value is set
+        instance.__dict__[self.field.attname] = value
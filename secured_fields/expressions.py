@@ -0,0 +1,48 @@
+from django.db import models
+from django.db.models.expressions import Col
+
+
+class HashedSection(models.Func):
+    """Hashed section at the end of the stored value of a searchable field
+
+    The length is rendered as a literal instead of a param, so the expression in a query is identical
+    to the one of the index declared on it.
+    """
+
+    function = 'RIGHT'
+    template = '%(function)s(%(expressions)s, 64)'
+    output_field = models.CharField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        # NOTE: MySQL only substitutes the generated column of `HashIndex` for an expression of the same text
+        #       and type, so the `longtext` result of `RIGHT()` is cast to the `varchar(64)` of the column
+        return super().as_sql(
+            compiler,
+            connection,
+            template='CAST(%(function)s(%(expressions)s, 64) AS CHAR(64))',
+            **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            function='SUBSTR',
+            template='%(function)s(%(expressions)s, -64)',
+            **extra_context,
+        )
+
+
+class EncryptedCol(Col):
+    """Column of an encrypted field, flagged when it is selected to build model instances"""
+
+    for_instance = False
+
+    def select_format(self, compiler, sql, params):
+        # NOTE: model instances select the columns from `get_default_columns()`, while `values()`
+        #       and annotations select the ones stored on the query, which keep being decrypted
+        query = compiler.query
+        if query.default_cols and not any(self is annotation for annotation in query.annotation_select.values()):
+            self.for_instance = True
+
+        return super().select_format(compiler, sql, params)
@@ -1,24 +1,481 @@
+import base64
+import binascii
+import hashlib
+import re
+import threading
+import time
 import typing
 
 from cryptography import fernet
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
 
-fernet_client: typing.Optional[fernet.MultiFernet] = None
+from . import metrics
+from .cache import ClientCache
+from .ciphers import CIPHER_CLASSES, AEADCipher
+from .providers import KeyProvider, get_key_provider
+from .resolvers import KeyResolver, Keys
 
 
-def get_fernet():
+class MultiFernet(fernet.MultiFernet):
+    """`MultiFernet` also reading tokens enveloped with the id of the key which encrypted them
+
+    An enveloped token is `v1:<key id>:<Fernet token>`, so it is decrypted by its key directly instead of
+    trying every key in order. Bare Fernet tokens are still decrypted by trying every key.
+
+    Tokens of the AEAD ciphers (see `secured_fields.ciphers`) are recognized by their prefix, and handled
+    by the cipher instead.
+
+    Fields with `binary=True` store raw records instead of tokens: the decoded Fernet token, or the magic of
+    the AEAD cipher followed by its decoded token.
+
+    With a key provider (see `secured_fields.providers`), new values are encrypted with a data key instead,
+    as `d1:<data key id>:<token>`, or its magic, its raw id and its raw record for raw records.
+    """
+
+    envelope_prefix = b'v1:'
+    envelope_separator = b':'
+
+    data_key_prefix = b'd1:'
+    data_key_magic = b'SFD1'
+    data_key_id_size = 8
+    data_key_id_pattern = re.compile(r'[0-9a-f]{16}')
+
+    # prefix of the tokens in decryption caches, so a value cached for some keys is not read with others
+    cache_namespace = b''
+
+    # version byte `0x80` followed by base64url characters, at least a timestamp, an IV, one block
+    # and a HMAC (73 bytes) long
+    token_pattern = re.compile(r'gA[A-Za-z0-9_-]*={0,2}')
+    token_min_length = 100
+
+    def __init__(self, keys: typing.Sequence[typing.Union[bytes, str]], use_data_keys: bool = True):
+        fernets = [fernet.Fernet(key) for key in keys]
+        super().__init__(fernets)
+
+        self.key_ids = [self.get_key_id(key) for key in keys]
+        self.fernets_by_key_id = dict(zip(reversed(self.key_ids), reversed(fernets)))
+        self.ciphers = {cipher_class.name: cipher_class(keys) for cipher_class in CIPHER_CLASSES}
+        # NOTE: `False` for the clients of the data keys themselves
+        self.use_data_keys = use_data_keys
+
+    @staticmethod
+    def get_key_id(key: typing.Union[bytes, str]) -> str:
+        if isinstance(key, str):
+            key = key.encode()
+
+        return hashlib.sha256(key).hexdigest()[:8]
+
+    def split_envelope(self, token: bytes) -> typing.Tuple[typing.Optional[str], bytes]:
+        """Split a token into its key id and its Fernet token, the key id is `None` for a bare token"""
+
+        if not token.startswith(self.envelope_prefix):
+            return None, token
+
+        key_id, _, token = token[len(self.envelope_prefix):].partition(self.envelope_separator)
+        return key_id.decode(), token
+
+    def get_data_keys(self) -> typing.Optional['DataKeys']:
+        return get_data_keys() if self.use_data_keys else None
+
+    def get_data_key_client(self, key_id: str) -> 'MultiFernet':
+        provider_keys = self.get_data_keys()
+        if provider_keys is None:
+            raise ImproperlyConfigured('`SECURED_FIELDS_KEY_PROVIDER` is required to decrypt values of data keys')
+
+        return provider_keys.get(key_id)
+
+    def split_data_key(self, token: bytes) -> typing.Tuple[str, bytes]:
+        """Split a token of a data key into the id of the data key and its token"""
+
+        key_id, _, token = token[len(self.data_key_prefix):].partition(self.envelope_separator)
+        return key_id.decode(), token
+
+    def split_raw_data_key(self, record: bytes) -> typing.Tuple[str, bytes]:
+        """Split a raw record of a data key into the id of the data key and its raw record"""
+
+        key_id_end = len(self.data_key_magic) + self.data_key_id_size
+        return record[len(self.data_key_magic):key_id_end].hex(), record[key_id_end:]
+
+    def get_primary_key_id(self) -> str:
+        """Return the id of the key encrypting new values, the current data key with a key provider"""
+
+        provider_keys = self.get_data_keys()
+        if provider_keys is not None:
+            return provider_keys.get_current()[0]
+
+        return self.key_ids[0]
+
+    def get_cipher(self, msg: typing.Union[bytes, str]) -> typing.Optional[AEADCipher]:
+        """Return the AEAD cipher of the token, `None` for a Fernet token"""
+
+        if isinstance(msg, str):
+            msg = msg.encode()
+
+        for cipher in self.ciphers.values():
+            if msg.startswith(cipher.prefix):
+                return cipher
+
+        return None
+
+    def encrypt_with(self, cipher_name: str, msg: bytes, key_id: bool = False) -> bytes:
+        """Encrypt with the cipher named as in `SECURED_FIELDS_CIPHER`, or with Fernet"""
+
+        provider_keys = self.get_data_keys()
+        if provider_keys is not None:
+            key_id, client = provider_keys.get_current()
+            return (
+                self.data_key_prefix + key_id.encode() + self.envelope_separator +
+                client.encrypt_with(cipher_name, msg)
+            )
+
+        if cipher_name != 'fernet':
+            return self.ciphers[cipher_name].encrypt(msg)
+        if key_id:
+            return self.encrypt_with_key_id(msg)
+
+        return self.encrypt(msg)
+
+    def encrypt_raw_with(self, cipher_name: str, msg: bytes) -> bytes:
+        """Encrypt into a raw record with the cipher named as in `SECURED_FIELDS_CIPHER`, or with Fernet"""
+
+        provider_keys = self.get_data_keys()
+        if provider_keys is not None:
+            key_id, client = provider_keys.get_current()
+            return self.data_key_magic + bytes.fromhex(key_id) + client.encrypt_raw_with(cipher_name, msg)
+
+        if cipher_name != 'fernet':
+            cipher = self.ciphers[cipher_name]
+            return cipher.magic + cipher.encrypt_raw(msg)
+
+        # NOTE: Fernet only produces base64 tokens
+        return base64.urlsafe_b64decode(self.encrypt(msg))
+
+    def get_raw_cipher(self, record: bytes) -> typing.Optional[AEADCipher]:
+        """Return the AEAD cipher of the raw record, `None` for a Fernet record"""
+
+        for cipher in self.ciphers.values():
+            if record.startswith(cipher.magic):
+                return cipher
+
+        return None
+
+    def decrypt_raw(self, record: bytes) -> bytes:
+        if record.startswith(self.data_key_magic):
+            key_id, record = self.split_raw_data_key(record)
+            return self.get_data_key_client(key_id).decrypt_raw(record)
+
+        cipher = self.get_raw_cipher(record)
+        if cipher is not None:
+            return cipher.decrypt_raw(record[len(cipher.magic):])
+
+        return self.decrypt(base64.urlsafe_b64encode(record))
+
+    def to_token(self, record: bytes) -> bytes:
+        """Encode a raw record into its token"""
+
+        if record.startswith(self.data_key_magic):
+            key_id, record = self.split_raw_data_key(record)
+            return self.data_key_prefix + key_id.encode() + self.envelope_separator + self.to_token(record)
+
+        cipher = self.get_raw_cipher(record)
+        if cipher is not None:
+            return cipher.prefix + base64.urlsafe_b64encode(record[len(cipher.magic):]).rstrip(b'=')
+
+        return base64.urlsafe_b64encode(record)
+
+    def from_token(self, token: bytes) -> bytes:
+        """Decode a token into its raw record, the key id envelope of a Fernet token is dropped"""
+
+        if token.startswith(self.data_key_prefix):
+            key_id, token = self.split_data_key(token)
+            if not self.data_key_id_pattern.fullmatch(key_id):
+                raise fernet.InvalidToken
+            return self.data_key_magic + bytes.fromhex(key_id) + self.from_token(token)
+
+        cipher = self.get_cipher(token)
+        if cipher is not None:
+            return cipher.magic + cipher.decode(token)
+
+        try:
+            return base64.urlsafe_b64decode(self.split_envelope(token)[1])
+        except (binascii.Error, ValueError) as e:
+            raise fernet.InvalidToken from e
+
+    def envelope(self, token: bytes) -> bytes:
+        """Envelope a token encrypted with the primary key"""
+
+        return self.envelope_prefix + self.key_ids[0].encode() + self.envelope_separator + token
+
+    def is_token(self, msg: str) -> bool:
+        """Check the structure of a token without decrypting it, for skipping obvious non-tokens"""
+
+        if msg.startswith(self.data_key_prefix.decode()):
+            key_id, _, msg = msg[len(self.data_key_prefix):].partition(self.envelope_separator.decode())
+            return self.data_key_id_pattern.fullmatch(key_id) is not None and self.is_token(msg)
+
+        cipher = self.get_cipher(msg)
+        if cipher is not None:
+            return cipher.is_token(msg)
+
+        if msg.startswith(self.envelope_prefix.decode()):
+            msg = msg[len(self.envelope_prefix):].partition(self.envelope_separator.decode())[2]
+
+        return (
+            len(msg) >= self.token_min_length and len(msg) % 4 == 0 and self.token_pattern.fullmatch(msg) is not None
+        )
+
+    def encrypt_with_key_id(self, msg: bytes) -> bytes:
+        return self.envelope(self.encrypt(msg))
+
+    def decrypt(self, msg: typing.Union[bytes, str], ttl: typing.Optional[int] = None) -> bytes:
+        if isinstance(msg, str):
+            msg = msg.encode()
+
+        if msg.startswith(self.data_key_prefix):
+            key_id, token = self.split_data_key(msg)
+            return self.get_data_key_client(key_id).decrypt(token, ttl)
+
+        cipher = self.get_cipher(msg)
+        if cipher is not None:
+            return cipher.decrypt(msg)
+
+        key_id, token = self.split_envelope(msg)
+        misses = 0
+        key = self.fernets_by_key_id.get(key_id)
+        if key is not None:
+            try:
+                return key.decrypt(token, ttl)
+            except fernet.InvalidToken:
+                # ids are short, so another key may share it
+                misses += 1
+
+        # NOTE: same as `fernet.MultiFernet.decrypt()`, counting the keys tried in vain
+        for key in self._fernets:
+            try:
+                value = key.decrypt(token, ttl)
+            except fernet.InvalidToken:
+                misses += 1
+                continue
+
+            if misses:
+                metrics.increment('key_misses', value=misses)
+            return value
+
+        if misses:
+            metrics.increment('key_misses', value=misses)
+        raise fernet.InvalidToken
+
+    def rotate(self, msg: typing.Union[bytes, str]) -> bytes:
+        if isinstance(msg, str):
+            msg = msg.encode()
+
+        if self.get_data_keys() is not None or msg.startswith(self.data_key_prefix):
+            # re-encrypted with the current data key, by the same cipher
+            token = self.split_data_key(msg)[1] if msg.startswith(self.data_key_prefix) else msg
+            cipher = self.get_cipher(token)
+            return self.encrypt_with('fernet' if cipher is None else cipher.name, self.decrypt(msg))
+
+        cipher = self.get_cipher(msg)
+        if cipher is not None:
+            return cipher.rotate(msg)
+
+        key_id, token = self.split_envelope(msg)
+        token = super().rotate(token)
+        if key_id is None:
+            return token
+
+        return self.envelope(token)
+
+    def find_key_id(self, msg: typing.Union[bytes, str]) -> typing.Optional[str]:
+        """Return the id of the key which decrypts the token, `None` if none of them does"""
+
+        if isinstance(msg, str):
+            msg = msg.encode()
+
+        if msg.startswith(self.data_key_prefix):
+            key_id, token = self.split_data_key(msg)
+            try:
+                client = self.get_data_key_client(key_id)
+            except (fernet.InvalidToken, ImproperlyConfigured):
+                # NOTE: without a key provider, the values of its data keys are unknown like any other
+                return None
+            return key_id if client.find_key_id(token) is not None else None
+
+        cipher = self.get_cipher(msg)
+        if cipher is not None:
+            return cipher.find_key_id(msg)
+
+        key_id, token = self.split_envelope(msg)
+        if key_id is not None and key_id in self.fernets_by_key_id:
+            return key_id
+
+        for key_id, key in zip(self.key_ids, self._fernets):
+            try:
+                key.decrypt(token)
+            except fernet.InvalidToken:
+                continue
+            return key_id
+
+        return None
+
+
+class DataKeys:
+    """Data keys of envelope encryption, unwrapped by the key provider and cached by their id
+
+    New values are encrypted with the same data key for `SECURED_FIELDS_DATA_KEY_MAX_AGE` seconds, so the
+    provider is called once per data key and process, instead of once per value.
+    """
+
+    def __init__(self, provider: KeyProvider, max_entries: int, ttl: typing.Optional[float], max_age: float):
+        self.provider = provider
+        self.cache = ClientCache(max_entries, ttl)
+        self.max_age = max_age
+        self.current: typing.Optional[typing.Tuple[str, MultiFernet, float]] = None
+        self.lock = threading.Lock()
+
+    def get_current(self) -> typing.Tuple[str, MultiFernet]:
+        """Return the id and the client of the data key encrypting new values"""
+
+        with self.lock:
+            if self.current is None or self.current[2] <= time.monotonic():
+                key_id, key = self.provider.generate_data_key()
+                metrics.increment('data_keys_generated')
+                client = MultiFernet([key], use_data_keys=False)
+                self.cache.set(key_id, client)
+                self.current = (key_id, client, time.monotonic() + self.max_age)
+
+            return self.current[0], self.current[1]
+
+    def get(self, key_id: str) -> MultiFernet:
+        client = self.cache.get(key_id)
+        if client is None:
+            client = MultiFernet([self.provider.get_data_key(key_id)], use_data_keys=False)
+            metrics.increment('data_key_unwraps')
+            self.cache.set(key_id, client)
+
+        return client
+
+
+class ClientRegistry:
+    """Clients of the keys resolved by `SECURED_FIELDS_KEY_RESOLVER`, built once per cache key of the resolver
+
+    The clients are kept in a bounded LRU cache shared by the threads, while the cache key is resolved from
+    the context of the caller, so a value is always handled with the keys of its own context.
+    """
+
+    def __init__(self, resolver: KeyResolver, max_entries: int):
+        self.resolver = resolver
+        self.clients = ClientCache(max_entries)
+
+    def get(self, field=None) -> typing.Optional[MultiFernet]:
+        """Return the client of the keys of the field, `None` for the one of `SECURED_FIELDS_KEY`"""
+
+        cache_key = self.resolver.get_cache_key(field)
+        if cache_key is None:
+            return None
+
+        client = self.clients.get(cache_key)
+        if client is None:
+            # NOTE: values of the keys of a resolver are never encrypted with the data keys of the provider
+            client = MultiFernet(get_keys_list(self.resolver.get_keys(cache_key)), use_data_keys=False)
+            client.cache_namespace = client.key_ids[0].encode() + b':'
+            self.clients.set(cache_key, client)
+
+        return client
+
+
+fernet_client: typing.Optional[MultiFernet] = None
+
+# `False` until the key resolver of the settings is loaded, `None` if there is none
+client_registry: typing.Union[ClientRegistry, None, bool] = False
+
+# `False` until the key provider of the settings is loaded, `None` if there is none
+data_keys: typing.Union[DataKeys, None, bool] = False
+
+
+def get_cipher_name() -> str:
+    """Name of the cipher encrypting new values, `'fernet'` or one of `secured_fields.ciphers`"""
+
+    cipher_name = getattr(settings, 'SECURED_FIELDS_CIPHER', 'fernet')
+    if cipher_name != 'fernet' and cipher_name not in {cipher_class.name for cipher_class in CIPHER_CLASSES}:
+        raise ImproperlyConfigured(f'Unknown `SECURED_FIELDS_CIPHER`: {cipher_name!r}')
+
+    return cipher_name
+
+
+def get_keys_list(keys: Keys) -> typing.Sequence[typing.Union[bytes, str]]:
+    if isinstance(keys, (str, bytes)):
+        return [keys]
+
+    return keys
+
+
+def get_client_registry() -> typing.Optional[ClientRegistry]:
+    global client_registry
+
+    if client_registry is False:
+        resolver_class = getattr(settings, 'SECURED_FIELDS_KEY_RESOLVER', None)
+        client_registry = None if not resolver_class else ClientRegistry(
+            import_string(resolver_class)(),
+            max_entries=getattr(settings, 'SECURED_FIELDS_KEY_RESOLVER_CACHE_MAX_ENTRIES', 1000),
+        )
+
+    return client_registry
+
+
+def get_fernet(field=None) -> MultiFernet:
+    """Return the client of the keys of the field, resolved by `SECURED_FIELDS_KEY_RESOLVER` if set"""
+
     global fernet_client
 
+    registry = get_client_registry()
+    if registry is not None:
+        client = registry.get(field)
+        if client is not None:
+            return client
+
     if fernet_client is None:
         fernet_key = getattr(settings, 'SECURED_FIELDS_KEY', None)
         assert fernet_key is not None, '`SECURED_FIELDS_KEY` is required when using django-secured-fields'
 
-        if isinstance(fernet_key, str):
-            fernet_keys = [fernet_key]
-        else:
-            fernet_keys = fernet_key
-
-        fernet_instances = [fernet.Fernet(key) for key in fernet_keys]
-        fernet_client = fernet.MultiFernet(fernet_instances)
+        fernet_client = MultiFernet(get_keys_list(fernet_key))
 
     return fernet_client
+
+
+def get_data_keys() -> typing.Optional[DataKeys]:
+    global data_keys
+
+    if data_keys is False:
+        provider = get_key_provider()
+        data_keys = None if provider is None else DataKeys(
+            provider,
+            max_entries=getattr(settings, 'SECURED_FIELDS_DATA_KEY_CACHE_MAX_ENTRIES', 1000),
+            ttl=getattr(settings, 'SECURED_FIELDS_DATA_KEY_CACHE_TTL', 3600),
+            max_age=getattr(settings, 'SECURED_FIELDS_DATA_KEY_MAX_AGE', 3600),
+        )
+
+    return data_keys
+
+
+@receiver(setting_changed)
+def reset_data_keys(setting, **kwargs):  # pylint: disable=unused-argument
+    global data_keys
+
+    if setting.startswith('SECURED_FIELDS_KEY_PROVIDER') or setting.startswith('SECURED_FIELDS_DATA_KEY'):
+        data_keys = False
+
+
+@receiver(setting_changed)
+def reset_client_registry(setting, **kwargs):  # pylint: disable=unused-argument
+    global client_registry
+
+    if setting.startswith('SECURED_FIELDS_KEY_RESOLVER') or setting in (
+        'SECURED_FIELDS_TENANT_KEYS',
+        'SECURED_FIELDS_FIELD_KEYS',
+    ):
+        client_registry = False
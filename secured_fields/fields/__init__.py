@@ -85,3 +85,14 @@ EncryptedDateTimeField.register_lookup(lookups.EncryptedIn, 'in')
 EncryptedDecimalField.register_lookup(lookups.EncryptedIn, 'in')
 EncryptedIntegerField.register_lookup(lookups.EncryptedIn, 'in')
 EncryptedTextField.register_lookup(lookups.EncryptedIn, 'in')
+
+# isnull
+EncryptedBinaryField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedBooleanField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedCharField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedDateField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedDateTimeField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedDecimalField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedIntegerField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedJSONField.register_lookup(lookups.EncryptedIsNull, 'isnull')
+EncryptedTextField.register_lookup(lookups.EncryptedIsNull, 'isnull')
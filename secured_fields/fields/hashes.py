@@ -0,0 +1,159 @@
+from django.core.exceptions import FieldError
+from django.db import connections, models, router
+from django.db.models import DEFERRED
+from django.db.models.query_utils import DeferredAttribute
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from ..descriptors import EncryptedValue
+from ..enum import DatabaseVendor
+
+
+class PendingHash:
+    """Value of a `HashField` which is hashed once the database connection is known"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class HashDescriptor(DeferredAttribute):
+    """Return the hashed value of the current value of the encrypted field of a `HashField`
+
+    The loaded hashed value is returned while the encrypted field keeps its loaded value encrypted (see
+    `EncryptedAttribute`) or is not loaded, otherwise the value is hashed again, so it never gets stale.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        # NOTE: loaded from the database only when its encrypted field is not loaded either
+        source_field = self.field.source_field
+        if source_field is not None and not {self.field.attname, source_field.attname} & instance.__dict__.keys():
+            return super().__get__(instance, cls)
+
+        value = self.field.get_pending_value(instance)
+        if isinstance(value, PendingHash):
+            using = instance._state.db  # pylint: disable=protected-access
+            using = using or router.db_for_write(type(instance), instance=instance)
+            value = self.field.get_hash(value.value, connections[using])
+
+        return value
+
+    def __set__(self, instance, value):
+        # NOTE: a data descriptor, otherwise the instance's `__dict__` takes precedence over `__get__()`
+        instance.__dict__[self.field.attname] = value
+
+
+@receiver(pre_save)
+def check_update_fields(sender, instance, update_fields=None, **kwargs):  # pylint: disable=unused-argument
+    """Refuse to save an encrypted field without its hash column, which would keep the previous hashed value
+
+    `update_fields` also holds the fields `save()` picks itself, e.g. the loaded ones of an instance with deferred
+    fields.
+    """
+    if update_fields is None:
+        return
+
+    for field in sender._meta.concrete_fields:  # pylint: disable=protected-access
+        hash_field = getattr(field, 'hash_field', None)
+        if hash_field is None or hash_field.name in update_fields:
+            continue
+        if field.name in update_fields or field.attname in update_fields:
+            raise FieldError(
+                f'Saving `{field.name}` requires saving `{hash_field.name}` too, add it to `update_fields` or load it '
+                f'along with `{field.name}`'
+            )
+
+
+class HashFieldMixin(models.Field):
+    """Companion column holding the hashed value of a searchable encrypted field with `hash_column=True`"""
+
+    descriptor_class = HashDescriptor
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+        self.source_field = None
+
+    def contribute_to_class(self, cls, name, private_only=False):
+        # NOTE: the encrypted field adds its hash field by itself, but historical models built by
+        #       migrations declare it explicitly too, so only the first one is kept
+        if any(field.name == name for field in cls._meta.local_fields):  # pylint: disable=protected-access
+            return
+
+        super().contribute_to_class(cls, name, private_only=private_only)
+
+    def get_hash(self, value, connection):
+        return self.source_field.get_hash(value, connection)
+
+    def get_pending_value(self, instance):
+        """Return the loaded hashed value while it matches the encrypted field, or a `PendingHash` of its value"""
+
+        value = instance.__dict__.get(self.attname)
+        if self.source_field is None or hasattr(value, 'resolve_expression'):
+            return value
+
+        source_value = instance.__dict__.get(self.source_field.attname, DEFERRED)
+        # NOTE: an unchanged lazy value keeps its loaded hashed value, so it is not decrypted
+        if source_value is DEFERRED or (
+            isinstance(source_value, EncryptedValue) and isinstance(value, (str, bytes, memoryview))
+        ):
+            return value
+        # e.g. `instance.field = F('other')`, which cannot be hashed, see `pre_save()`
+        if hasattr(source_value, 'resolve_expression'):
+            return value
+
+        return PendingHash(source_value)
+
+    def pre_save(self, model_instance, add):
+        value = self.get_pending_value(model_instance)
+        if self.source_field is not None and not hasattr(value, 'resolve_expression'):
+            if hasattr(model_instance.__dict__.get(self.source_field.attname), 'resolve_expression'):
+                raise FieldError(
+                    f'Saving `{self.source_field.name}` as an expression requires setting `{self.name}` too'
+                )
+
+        # NOTE: hashed in `get_db_prep_save()`, once the connection is known
+        return value
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, PendingHash):
+            value = self.get_hash(value.value, connection)
+
+        return super().get_db_prep_save(value, connection)
+
+    def value_to_string(self, obj):
+        # derived from the encrypted field, so it is not serialized
+        return None
+
+
+class HashField(HashFieldMixin, models.CharField):
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 64)
+        super().__init__(*args, **kwargs)
+
+
+class BinaryHashField(HashFieldMixin, models.BinaryField):
+    """Hash column of a field with `binary=True`, holding the raw digest instead of its hex form"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 32)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        # NOTE: MySQL cannot index a `longblob` column without a prefix length
+        if connection.vendor == DatabaseVendor.MYSQL:
+            return f'varbinary({self.max_length})'
+
+        return super().db_type(connection)
+
+    def get_hash(self, value, connection):
+        hashed_value = super().get_hash(value, connection)
+        return None if hashed_value is None else bytes.fromhex(hashed_value)
@@ -0,0 +1,107 @@
+import io
+import re
+
+from django.db.models.fields.files import FieldFile
+from django.http import FileResponse, HttpResponse
+
+range_pattern = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class RangeFile:
+    """Window of `length` bytes from `start` over a seekable file"""
+
+    def __init__(self, file, start: int, length: int):
+        self.file = file
+        self.start = start
+        self.length = length
+        self.position = 0
+        self.name = getattr(file, 'name', None)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.length - self.position:
+            size = self.length - self.position
+
+        self.file.seek(self.start + self.position)
+        data = self.file.read(size)
+        self.position += len(data)
+
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.length
+
+        self.position = max(0, min(offset, self.length))
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header: str, size: int):
+    """Return the `(start, end)` bytes of a single range header, `None` if it should be ignored
+
+    Raises `ValueError` if the range cannot be satisfied.
+    """
+    match = range_pattern.fullmatch(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start:
+        # NOTE: an empty file has no byte to satisfy a suffix range with
+        if not end or int(end) == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - int(end), 0), size - 1
+
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+
+    return start, size - 1 if not end else min(int(end), size - 1)
+
+
+def encrypted_file_response(request, file, *, as_attachment=False, filename='', **kwargs) -> HttpResponse:
+    """Serve an encrypted file, or the single byte range requested from it
+
+    Only the segments of the requested range are decrypted. `file` is usually the value of an
+    `EncryptedFileField`, other arguments are the ones of `FileResponse`.
+    """
+    if isinstance(file, FieldFile):
+        # a file of its own, closed along with the response
+        file = file.storage.open(file.name, 'rb')
+
+    size = file.size
+    try:
+        byte_range = parse_range(request.headers.get('Range', ''), size)
+    except ValueError:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename, **kwargs)
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1),
+            as_attachment=as_attachment,
+            filename=filename,
+            status=206,
+            **kwargs,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,53 @@
+from django.db.backends.ddl_references import Statement, Table
+from django.db.models import Index
+from django.db.models.sql import Query
+
+from .enum import DatabaseVendor
+
+
+class HashIndex(Index):
+    """Index on the hashed section of a searchable field (see `HashedSection`)
+
+    MySQL cannot index an expression on a `longtext` column, so a stored generated column holding the
+    hashed section is added next to the field, hidden from the model, and gets the index. Lookups keep
+    comparing the same expression, which MySQL matches to the generated column.
+    """
+
+    sql_create_generated_column = (
+        'ALTER TABLE %(table)s ADD COLUMN %(column)s varchar(64) GENERATED ALWAYS AS (%(expression)s) STORED, '
+        'ADD INDEX %(name)s (%(column)s)'
+    )
+    sql_delete_generated_column = 'ALTER TABLE %(table)s DROP INDEX %(name)s, DROP COLUMN %(column)s'
+
+    @property
+    def contains_expressions(self):
+        # NOTE: Django skips expression indexes on backends not supporting them (MariaDB, MySQL < 8.0.13),
+        #       which the generated column supports anyway
+        return False
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != DatabaseVendor.MYSQL:
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+        query = Query(model, alias_cols=False)
+        expression = self.expressions[0].resolve_expression(query)
+        expression_sql, _ = query.get_compiler(connection=schema_editor.connection).compile(expression)
+
+        return Statement(
+            self.sql_create_generated_column,
+            table=Table(model._meta.db_table, schema_editor.quote_name),  # pylint: disable=protected-access
+            column=schema_editor.quote_name(self.name),
+            name=schema_editor.quote_name(self.name),
+            expression=expression_sql,
+        )
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != DatabaseVendor.MYSQL:
+            return super().remove_sql(model, schema_editor, **kwargs)
+
+        return Statement(
+            self.sql_delete_generated_column,
+            table=Table(model._meta.db_table, schema_editor.quote_name),  # pylint: disable=protected-access
+            column=schema_editor.quote_name(self.name),
+            name=schema_editor.quote_name(self.name),
+        )
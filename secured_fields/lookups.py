@@ -1,10 +1,27 @@
 from django.db.models import lookups
 
-from . import mixins, utils
+from . import mixins, strategies
 
 
 class EncryptedExact(lookups.EndsWith):
 
+    def get_hash_expression(self, connection):
+        return self.lhs.output_field.get_hash_expression(self.lhs, connection)
+
+    def process_lhs(self, compiler, connection, lhs=None):
+        hash_expression = self.get_hash_expression(connection)
+        if hash_expression is not None:
+            # NOTE: `BuiltinLookup.process_lhs()` is skipped since it adds the casts of LIKE lookups
+            return lookups.Lookup.process_lhs(self, compiler, connection, hash_expression)
+
+        return super().process_lhs(compiler, connection, lhs)
+
+    def get_rhs_op(self, connection, rhs):
+        if self.get_hash_expression(connection) is not None:
+            return f'= {rhs}'
+
+        return super().get_rhs_op(connection, rhs)
+
     def get_db_prep_lookup(self, value, connection):
         # NOTE: `process_rhs()` replaces the param with its hash, so the value has to be
         #       prepared exactly the way the field prepared it when the value was saved.
@@ -24,7 +41,9 @@ class EncryptedExact(lookups.EndsWith):
             params = list(params)
 
             # search using hash
-            params[0] = '%' + mixins.EncryptedMixin.separator + utils.hash_with_salt(str(params[0]))
+            params[0] = self.lhs.output_field.get_lookup_hash(str(params[0]))
+            if self.get_hash_expression(connection) is None:
+                params[0] = '%' + mixins.EncryptedMixin.separator + params[0]
 
         return rhs, params
 
@@ -52,16 +71,32 @@ class EncryptedIn(lookups.In):
         return lookups.EndsWith(self.lhs, '%s').get_rhs_op(connection, '%s')
 
     def as_sql(self, compiler, connection):
-        sql, params = super().as_sql(compiler, connection)
+        _, params = self.process_rhs(compiler, connection)
+
+        # search using hash for each item, different values may be prepared into the same one
+        field = self.lhs.output_field
+        hashes = list(dict.fromkeys(field.get_lookup_hash(str(param)) for param in params))
+
+        strategy = strategies.get_in_lookup_strategy(connection)
+        hash_expression = field.get_hash_expression(self.lhs, connection)
+        if hash_expression is not None:
+            lhs_sql, lhs_params = compiler.compile(hash_expression)
+            return strategy.equal_any(lhs_sql, lhs_params, hashes)
+
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        patterns = ['%' + mixins.EncryptedMixin.separator + hashed for hashed in hashes]
 
-        # reformat to multiple OR condition instead
-        sql += (' OR ' + sql) * (len(params) - 1)
-        sql = f'({sql})'
+        return strategy.like_any(lhs_sql, lhs_params, self.get_rhs_op(connection, '%s'), patterns)
 
-        # search using hash for each item
-        params = [
-            '%' + mixins.EncryptedMixin.separator + utils.hash_with_salt(str(param))
-            for param in params
-        ]
 
-        return sql, params
+class EncryptedIsNull(lookups.IsNull):
+
+    def process_lhs(self, compiler, connection, lhs=None):
+        # the hashed section is `NULL` exactly when the value is, so the indexed hash is checked instead
+        field = self.lhs.output_field
+        # NOTE: a hash column is only filled once saved or backfilled, so it is not checked for the value
+        hash_expression = field.get_hash_expression(self.lhs, connection) if field.hash_field is None else None
+        if hash_expression is not None:
+            return lookups.Lookup.process_lhs(self, compiler, connection, hash_expression)
+
+        return super().process_lhs(compiler, connection, lhs)
@@ -0,0 +1,71 @@
+import time
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from ...mixins import EncryptedMixin
+
+
+def get_models(labels):
+    """Models from `app_label` or `app_label.ModelName` labels, all of them by default"""
+
+    if not labels:
+        return apps.get_models()
+
+    results = []
+    for label in labels:
+        try:
+            if '.' in label:
+                results.append(apps.get_model(label))
+            else:
+                results.extend(apps.get_app_config(label).get_models())
+        except LookupError as e:
+            raise CommandError(str(e)) from e
+
+    return results
+
+
+class BatchedFieldCommand(BaseCommand):
+    """Base of the commands updating the stored values of encrypted fields by batches of records"""
+
+    # past tense of the update, for the report
+    action = 'updated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='`app_label.ModelName` of the model')
+        parser.add_argument('fields', nargs='+', help='Names of the encrypted fields')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows updated per transaction')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to wait between batches')
+
+    def get_batches(self, model, field, options):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        try:
+            model = apps.get_model(options['model'])
+            fields = [model._meta.get_field(name) for name in options['fields']]  # pylint: disable=protected-access
+        except (LookupError, ValueError, FieldDoesNotExist) as e:
+            raise CommandError(str(e)) from e
+
+        for field in fields:
+            if not isinstance(field, EncryptedMixin):
+                raise CommandError(f'`{field.name}` is not an encrypted field')
+
+            rows = updated = failed = 0
+            started_at = time.monotonic()
+            for batch in self.get_batches(model, field, options):
+                rows += batch.rows
+                updated += batch.updated
+                failed += batch.failed
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+
+            elapsed = time.monotonic() - started_at
+            rate = rows / elapsed if elapsed else 0
+            self.stdout.write(
+                f'{model._meta.label}.{field.name}: {self.action} {updated} of {rows} rows, '
+                f'{failed} skipped ({rate:.0f} rows/s)'
+            )
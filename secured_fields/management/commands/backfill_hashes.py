@@ -0,0 +1,21 @@
+from django.core.management import CommandError
+
+from ... import backfill
+from ._utils import BatchedFieldCommand
+
+
+class Command(BatchedFieldCommand):
+    help = 'Command to add the hashed values of fields changed to `searchable=True` to their existing records'
+
+    action = 'hashed'
+
+    def get_batches(self, model, field, options):
+        if not field.searchable:
+            raise CommandError(f'`{field.name}` is not searchable')
+
+        return backfill.backfill_hashes(
+            model,
+            field.name,
+            using=options['database'],
+            batch_size=options['batch_size'],
+        )
@@ -0,0 +1,16 @@
+from ... import backfill
+from ._utils import BatchedFieldCommand
+
+
+class Command(BatchedFieldCommand):
+    help = 'Command to encrypt the values stored unencrypted before a field was changed to an encrypted field'
+
+    action = 'encrypted'
+
+    def get_batches(self, model, field, options):
+        return backfill.encrypt_existing_values(
+            model,
+            field.name,
+            using=options['database'],
+            batch_size=options['batch_size'],
+        )
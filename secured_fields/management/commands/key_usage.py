@@ -0,0 +1,42 @@
+import collections
+
+from django.core.management import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.lookups import IsNull
+
+from ...backfill import get_raw_expression
+from ...fernet import get_fernet
+from ...mixins import EncryptedMixin
+from ._utils import get_models
+
+
+class Command(BaseCommand):
+    help = 'Command to report how many stored values are encrypted with each key of `SECURED_FIELDS_KEY`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help='`app_label` or `app_label.ModelName` to report, all by default')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        for model in get_models(options['labels']):
+            for field in model._meta.concrete_fields:  # pylint: disable=protected-access
+                if not isinstance(field, EncryptedMixin):
+                    continue
+
+                client = get_fernet(field)
+                counts = collections.Counter()
+                raw_value = get_raw_expression(field)
+                # NOTE: `isnull` of a searchable field may check its hash, which unencrypted values may not have
+                queryset = model._base_manager.using(options['database'])  # pylint: disable=protected-access
+                values = queryset.filter(IsNull(raw_value, False)).values_list(raw_value, flat=True)
+                for value in values.iterator(chunk_size=options['batch_size']):
+                    counts[client.find_key_id(field.get_token(value))] += 1
+
+                self.stdout.write(f'{model._meta.label}.{field.name}')  # pylint: disable=protected-access
+                for index, key_id in enumerate(client.key_ids):
+                    self.stdout.write(f'  key {index} ({key_id}): {counts[key_id]}')
+                data_key_count = sum(count for key_id, count in counts.items() if key_id not in {None, *client.key_ids})
+                if data_key_count:
+                    self.stdout.write(f'  data keys of the key provider: {data_key_count}')
+                self.stdout.write(f'  not encrypted or unknown key: {counts[None]}')
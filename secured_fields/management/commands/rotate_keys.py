@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from ... import backfill
+from ._utils import get_models
+
+
+class Command(BaseCommand):
+    help = 'Command to re-encrypt the stored values of encrypted fields with the first key of `SECURED_FIELDS_KEY`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help='`app_label` or `app_label.ModelName` to rotate, all by default')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows updated per transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Number of threads re-encrypting the values')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to wait between batches')
+        parser.add_argument('--checkpoint', help='File recording the progress, to resume an interrupted rotation')
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('`--batch-size` and `--workers` should be positive')
+
+        checkpoint = self.load_checkpoint(options['checkpoint'])
+
+        for model in get_models(options['labels']):
+            # pylint: disable=protected-access
+            if model._meta.proxy or not backfill.get_encrypted_fields(model):
+                continue
+
+            label = model._meta.label
+            progress = checkpoint.setdefault(label, {'last_pk': None, 'done': False})
+            if progress['done']:
+                self.stdout.write(f'{label}: already rotated')
+                continue
+
+            start_after = None
+            if progress['last_pk'] is not None:
+                start_after = model._meta.pk.to_python(progress['last_pk'])
+
+            rows = rotated = failed = 0
+            started_at = time.monotonic()
+            for batch in backfill.rotate_keys(
+                model,
+                using=options['database'],
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                start_after=start_after,
+            ):
+                rows += batch.rows
+                rotated += batch.updated
+                failed += batch.failed
+
+                progress['last_pk'] = str(batch.last_pk)
+                self.save_checkpoint(options['checkpoint'], checkpoint)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{label}: {rows} rows read, up to pk {batch.last_pk}')
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+
+            progress['done'] = True
+            self.save_checkpoint(options['checkpoint'], checkpoint)
+
+            elapsed = time.monotonic() - started_at
+            rate = rows / elapsed if elapsed else 0
+            self.stdout.write(
+                f'{label}: rotated {rotated} of {rows} rows, {failed} values with an unknown key '
+                f'({rate:.0f} rows/s)'
+            )
+
+    @staticmethod
+    def load_checkpoint(path) -> dict:
+        if not path or not os.path.exists(path):
+            return {}
+
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def save_checkpoint(path, checkpoint: dict):
+        if not path:
+            return
+
+        # NOTE: replaced at once, so an interruption never leaves a partially written file
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,195 @@
+import abc
+import bisect
+import contextvars
+import logging
+import threading
+import time
+import typing
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import Signal, receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('secured_fields.metrics')
+
+# sent after each encryption, decryption or hashing of a field value, with `operation`, `model`, `field`,
+# `duration` and `size` arguments
+operation_recorded = Signal()
+
+Labels = typing.Dict[str, str]
+
+
+class Collector(abc.ABC):
+    """Interface of the metrics collectors, e.g. forwarding to Prometheus or StatsD
+
+    Metrics are `operations` (counter), `operation_seconds` (histogram) and `bytes` (counter) labelled by
+    `operation`, `model` and `field`, `invalid_tokens`, `compressed_values`, `compression_input_bytes` and
+    `compression_output_bytes` (counters) labelled by `model` and `field`, and `key_misses` (counter), the keys
+    tried in vain before the one decrypting a value. With a key provider, `data_keys_generated` and
+    `data_key_unwraps` (counters) count its calls.
+    """
+
+    @abc.abstractmethod
+    def increment(self, name: str, labels: Labels, value: float = 1):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def observe(self, name: str, labels: Labels, value: float):
+        raise NotImplementedError
+
+
+class Histogram:
+    buckets = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class InMemoryCollector(Collector):
+    """Collect the metrics in the process, see `snapshot()`"""
+
+    def __init__(self):
+        self.counters: typing.Dict[typing.Tuple[str, tuple], float] = {}
+        self.histograms: typing.Dict[typing.Tuple[str, tuple], Histogram] = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """Return the counters and histograms by name and labels, e.g. `operations{field="...",...}`"""
+
+        def format_key(key) -> str:
+            name, labels = key
+            if not labels:
+                return name
+            return name + '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}'
+
+        with self.lock:
+            counters = {format_key(key): value for key, value in self.counters.items()}
+            histograms = {
+                format_key(key): {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': dict(zip(Histogram.buckets, histogram.counts)),
+                } for key, histogram in self.histograms.items()
+            }
+
+        return {'counters': counters, 'histograms': histograms}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+class RequestTotals:
+    """Number of values, time and bytes by operation, for the current request"""
+
+    def __init__(self):
+        self.operations: typing.Dict[str, typing.List[float]] = {}
+
+    def add(self, operation: str, duration: float, size: int):
+        totals = self.operations.setdefault(operation, [0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += duration
+        totals[2] += size
+
+    def __bool__(self):
+        return bool(self.operations)
+
+
+request_totals: contextvars.ContextVar[typing.Optional[RequestTotals]] = \
+    contextvars.ContextVar('request_totals', default=None)
+
+# `False` until the collector of the settings is loaded, `None` if there is none
+collector: typing.Union[Collector, None, bool] = False
+
+
+def get_collector() -> typing.Optional[Collector]:
+    global collector
+
+    if collector is False:
+        collector_class = getattr(settings, 'SECURED_FIELDS_METRICS_COLLECTOR', None)
+        collector = import_string(collector_class)() if collector_class else None
+
+    return collector
+
+
+def get_labels(field) -> Labels:
+    model = getattr(field, 'model', None)
+    return {
+        'model': model._meta.label if model is not None else '',  # pylint: disable=protected-access
+        'field': field.name or '',
+    }
+
+
+def start() -> typing.Optional[float]:
+    """Return the start time of an operation, `None` when nothing records it"""
+
+    if get_collector() is None and request_totals.get() is None and not operation_recorded.receivers:
+        return None
+
+    return time.perf_counter()
+
+
+def record(operation: str, field, started_at: float, size: int):
+    """Record an operation on a value of the field started at `started_at`, from `start()`"""
+
+    duration = time.perf_counter() - started_at
+    labels = get_labels(field)
+
+    current_collector = get_collector()
+    if current_collector is not None:
+        operation_labels = {'operation': operation, **labels}
+        current_collector.increment('operations', operation_labels)
+        current_collector.observe('operation_seconds', operation_labels, duration)
+        current_collector.increment('bytes', operation_labels, size)
+
+    totals = request_totals.get()
+    if totals is not None:
+        totals.add(operation, duration, size)
+
+    if operation_recorded.receivers:
+        operation_recorded.send(
+            sender=field.__class__,
+            operation=operation,
+            model=labels['model'],
+            field=labels['field'],
+            duration=duration,
+            size=size,
+        )
+
+
+def increment(name: str, field=None, value: float = 1):
+    """Increment a counter of the collector, if any"""
+
+    current_collector = get_collector()
+    if current_collector is not None:
+        current_collector.increment(name, {} if field is None else get_labels(field), value)
+
+
+@receiver(setting_changed)
+def reset_collector(setting, **kwargs):  # pylint: disable=unused-argument
+    global collector
+
+    if setting == 'SECURED_FIELDS_METRICS_COLLECTOR':
+        collector = False
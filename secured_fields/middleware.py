@@ -0,0 +1,56 @@
+from django.conf import settings
+
+from . import metrics
+from .cache import decryption_cache
+
+
+class DecryptionCacheMiddleware:
+    """Cache the values decrypted while handling a request, for the duration of the request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with decryption_cache():
+            return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Total the values encrypted, decrypted and hashed while handling a request
+
+    The totals are logged to the `secured_fields.metrics` logger, and added to the `Server-Timing` header
+    of the response with `SECURED_FIELDS_METRICS_HEADER = True`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        totals = metrics.RequestTotals()
+        token = metrics.request_totals.set(totals)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.request_totals.reset(token)
+
+        if totals:
+            metrics.logger.info(
+                '%s %s: %s',
+                request.method,
+                request.path,
+                ', '.join(
+                    f'{operation} {count} values ({size} bytes) in {duration * 1000:.2f}ms'
+                    for operation, (count, duration, size) in totals.operations.items()
+                ),
+            )
+
+            if getattr(settings, 'SECURED_FIELDS_METRICS_HEADER', False):
+                server_timing = ', '.join(
+                    f'secured-fields-{operation};dur={duration * 1000:.3f};desc="{count} values"'
+                    for operation, (count, duration, _) in totals.operations.items()
+                )
+                if response.has_header('Server-Timing'):
+                    server_timing = f'{response["Server-Timing"]}, {server_timing}'
+                response['Server-Timing'] = server_timing
+
+        return response
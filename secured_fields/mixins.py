@@ -3,19 +3,34 @@ __all__ = [
     'EncryptedStorageMixin',
 ]
 
+import collections
+import contextvars
+import itertools
 import re
 import typing
+from concurrent import futures
 from io import BytesIO
 
 from cryptography import fernet
+from django.conf import settings
 from django.core.files import File
-from django.db import connection
+from django.db.backends.utils import names_digest
 from django.db.models import Field
+from django.db.models.expressions import Col
 from django.utils.functional import cached_property
 
-from . import exceptions, utils
+from . import compression, exceptions, metrics, streams, utils
+from .cache import get_decryption_cache
+from .descriptors import EncryptedAttribute, EncryptedValue, lazy_decryption
 from .enum import DatabaseVendor
-from .fernet import get_fernet
+from .expressions import EncryptedCol, HashedSection
+from .fernet import get_cipher_name, get_fernet
+from .fields.hashes import BinaryHashField, HashField
+from .indexes import HashIndex
+from .uploadhandler import EncryptedUploadedFile
+
+# what encrypting and hashing the values of a field depends on, see `EncryptedMixin.get_encryption_options()`
+EncryptionOptions = collections.namedtuple('EncryptionOptions', ['client', 'cipher_name', 'key_id', 'salt'])
 
 INTEGER_INTERNAL_TYPES = frozenset({
     'AutoField',
@@ -40,16 +55,40 @@ class EncryptedMixin(Field):
     internal_type = _encrypted_internal_type
     call_super_from_db_value = False
 
-    def __init__(self, *args, searchable=False, **kwargs):
+    def __init__(
+        self,
+        *args,
+        searchable=False,
+        hash_column=False,
+        lazy=False,
+        binary=False,
+        compress=False,
+        **kwargs,
+    ):
         if self.get_original_internal_type() == 'BinaryField' and searchable:
             raise NotImplementedError('`BinaryField` with `searchable=True` is not supported yet')
+        if self.get_original_internal_type() == 'BinaryField' and compress:
+            # its values may start with the flag of compressed values
+            raise NotImplementedError('`BinaryField` with `compress` is not supported yet')
+        if hash_column and not searchable:
+            raise ValueError('`hash_column=True` requires `searchable=True`')
+        if binary and searchable and not hash_column:
+            # a hashed section at the end of a binary value cannot be matched the same way on every backend
+            raise ValueError('`binary=True` with `searchable=True` requires `hash_column=True`')
         self.searchable = searchable
+        self.hash_column = hash_column
+        self.binary = binary
+        if binary:
+            self.internal_type = self._encrypted_internal_type = 'BinaryField'
+        self.hash_field = None
+        self.lazy = lazy
+        self.compress = compress
+        self.compression_algorithm = compression.get_algorithm(compress)
+        # number of values read in their format before encryption
+        self.legacy_reads = 0
+        self.compression_stats = compression.CompressionStats()
 
         kwargs['unique'] = False
-        if self.searchable:
-            # NOTE: MySQL does not support index on `longtext` column
-            if connection.vendor != DatabaseVendor.MYSQL:
-                kwargs['db_index'] = True
 
         super().__init__(*args, **kwargs)
 
@@ -58,6 +97,14 @@ class EncryptedMixin(Field):
 
         if self.searchable is not False:
             kwargs['searchable'] = self.searchable
+        if self.hash_column is not False:
+            kwargs['hash_column'] = self.hash_column
+        if self.lazy is not False:
+            kwargs['lazy'] = self.lazy
+        if self.binary is not False:
+            kwargs['binary'] = self.binary
+        if self.compress is not False:
+            kwargs['compress'] = self.compress
 
         kwargs.pop('unique', None)
         if self.searchable:
@@ -65,9 +112,64 @@ class EncryptedMixin(Field):
 
         return name, path, args, kwargs
 
+    def contribute_to_class(self, cls, name, private_only=False):
+        # NOTE: the values of other fields are only loaded encrypted by `EncryptedQuerySet.iterator()`, which
+        #       decrypts them before handing the instances over
+        if self.lazy:
+            self.descriptor_class = EncryptedAttribute
+
+        super().contribute_to_class(cls, name, private_only=private_only)
+        opts = cls._meta  # pylint: disable=protected-access
+
+        if self.searchable and not self.hash_column and not opts.abstract:
+            # NOTE: a plain index on the stored value cannot serve lookups matching its end, so the
+            #       index is put on the hashed section instead. Historical models built by
+            #       migrations already declare it in their options.
+            index_name = self.get_hash_index_name()
+            if not any(index.name == index_name for index in opts.indexes):
+                opts.indexes = [*opts.indexes, HashIndex(HashedSection(self.name), name=index_name)]
+                # migrations only pick up the indexes declared in the model's `Meta`
+                opts.original_attrs['indexes'] = opts.indexes
+
+        if self.hash_column and not opts.abstract:
+            hash_field_name = self.get_hash_field_name()
+
+            # NOTE: historical models built by migrations may already declare the hash field
+            for field in opts.local_fields:
+                if field.name == hash_field_name:
+                    self.hash_field = field
+                    break
+            else:
+                self.hash_field = BinaryHashField() if self.binary else HashField()
+                self.hash_field.contribute_to_class(cls, hash_field_name)
+
+            self.hash_field.source_field = self
+
+    def get_hash_field_name(self) -> str:
+        return f'{self.name}_hash'
+
+    def get_hash_index_name(self) -> str:
+        # same parts as `Index.set_name_with_model()`, which keeps the name under 30 characters
+        table_name = self.model._meta.db_table  # pylint: disable=protected-access
+        digest = names_digest(table_name, self.column, 'hash', length=6)
+
+        return f'{table_name[:10]}_{self.column[:7]}_{digest}_hash'
+
     def get_internal_type(self):
         return self.internal_type
 
+    def get_col(self, alias, output_field=None):
+        # NOTE: not cached like the default one, since it is flagged by the query selecting it
+        return EncryptedCol(alias, self, output_field)
+
+    def pre_save(self, model_instance, add):
+        # NOTE: read without the descriptor, an unchanged lazy value is saved without being decrypted
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, EncryptedValue) and not getattr(self, 'auto_now', False):
+            return value
+
+        return super().pre_save(model_instance, add)
+
     def get_original_internal_type(self):
         return super().get_internal_type()
 
@@ -77,7 +179,7 @@ class EncryptedMixin(Field):
     def prepare_encryption(self, value) -> bytes:
         return self.prepare_string(value).encode()
 
-    def prepare_db_value(self, value, connection):  # pylint: disable=redefined-outer-name
+    def prepare_db_value(self, value, connection):
         """Convert the value into its database representation before it gets encrypted"""
 
         # NOTE: integer-based fields hand `get_internal_type()` over to
@@ -90,24 +192,191 @@ class EncryptedMixin(Field):
 
         return super().get_db_prep_save(value, connection)
 
-    def get_db_prep_save(self, value, connection):  # pylint: disable=redefined-outer-name
+    def get_db_prep_save(self, value, connection):
+        return self.encrypt_value(value, connection)[0]
+
+    def get_encryption_options(self) -> EncryptionOptions:
+        """Resolve the client of the keys of the field and the settings its values are encrypted with"""
+
+        return EncryptionOptions(
+            client=get_fernet(self),
+            cipher_name=get_cipher_name(),
+            key_id=getattr(settings, 'SECURED_FIELDS_KEY_ID', False),
+            salt=utils.get_hash_salt(),
+        )
+
+    def encrypt_value(
+        self,
+        value,
+        connection,
+        options: typing.Optional[EncryptionOptions] = None,
+        hash_column: bool = False,
+    ) -> typing.Tuple[typing.Any, typing.Union[str, bytes, None]]:
+        """Return the stored value of a value, and its value of the hash column if `hash_column` is set
+
+        `options` are resolved for this value only when not given, see `encrypt_many()`.
+        """
         if value is None:
-            return value
+            return value, None
+
+        # unchanged since loaded, so the stored value is written back as is
+        if isinstance(value, EncryptedValue):
+            return value.value, None
+
+        # expressions (e.g. `update(field=F('other'))`) are compiled as is, like `Field.get_db_prep_save()`
+        if hasattr(value, 'as_sql'):
+            return value, None
+
+        if options is None:
+            options = self.get_encryption_options()
 
         if not isinstance(value, bytes):
             value = self.prepare_db_value(value, connection)
 
         value = self.prepare_encryption(value)
+        # NOTE: compressed apart from `prepare_encryption()`, the hashed value is the one of the uncompressed value
+        payload = self.compress_payload(value)
+
+        started_at = metrics.start()
+        if self.binary:
+            encrypted = options.client.encrypt_raw_with(options.cipher_name, payload)
+        else:
+            encrypted = options.client.encrypt_with(options.cipher_name, payload, key_id=options.key_id).decode()
+        if started_at is not None:
+            metrics.record('encrypt', self, started_at, len(payload))
 
-        encrypted = get_fernet().encrypt(value).decode()
         if not self.searchable:
-            return encrypted
+            return encrypted, None
+
+        if self.hash_column:
+            if not hash_column:
+                return encrypted, None
+            hashed = self.hash(value, options.salt)
+            return encrypted, bytes.fromhex(hashed) if self.binary else hashed
 
         # append hashed value
-        return encrypted + self.separator + utils.hash_with_salt(value)
+        return encrypted + self.separator + self.hash(value, options.salt), None
+
+    def encrypt_many(
+        self,
+        values: typing.Sequence,
+        connection,
+        workers: int = 1,
+        hash_column: bool = False,
+    ) -> typing.List[typing.Tuple[typing.Any, typing.Union[str, bytes, None]]]:
+        """Return what `encrypt_value()` returns for each value of a column
+
+        The client and the settings are resolved once for the whole column. With more than one worker, the
+        column is split into one chunk per worker, encrypted on a thread pool in the context of the caller.
+        """
+        options = self.get_encryption_options()
+
+        def encrypt_chunk(chunk: typing.Sequence) -> list:
+            return [self.encrypt_value(value, connection, options, hash_column) for value in chunk]
+
+        if workers <= 1 or len(values) <= 1:
+            return encrypt_chunk(values)
+
+        size = -(-len(values) // workers)
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            tasks = [
+                executor.submit(contextvars.copy_context().run, encrypt_chunk, values[offset:offset + size])
+                for offset in range(0, len(values), size)
+            ]
+            return list(itertools.chain.from_iterable(task.result() for task in tasks))
+
+    def compress_payload(self, value: bytes) -> bytes:
+        """Compress a value of `SECURED_FIELDS_COMPRESSION_MIN_SIZE` bytes or more, if it gets smaller"""
+
+        if self.compression_algorithm is None or len(value) < compression.get_min_size():
+            return value
+
+        compressed = compression.compress(self.compression_algorithm, value)
+        if len(compressed) >= len(value):
+            return value
+
+        self.compression_stats.add(len(value), len(compressed))
+        metrics.increment('compressed_values', self)
+        metrics.increment('compression_input_bytes', self, len(value))
+        metrics.increment('compression_output_bytes', self, len(compressed))
+
+        return compressed
+
+    def get_hash(self, value, connection) -> typing.Optional[str]:
+        """Hash the value the same way as `get_db_prep_save()` does for the hashed section"""
+
+        if value is None:
+            return value
+
+        if isinstance(value, EncryptedValue):
+            value = self.decrypt_db_value(value.value)
+
+        if not isinstance(value, bytes):
+            value = self.prepare_db_value(value, connection)
+
+        return self.hash(self.prepare_encryption(value))
 
-    def decrypt(self, value: str) -> typing.Union[bytes, str]:
-        value = get_fernet().decrypt(value.encode())
+    def hash(self, value: bytes, salt: typing.Optional[bytes] = None) -> str:
+        started_at = metrics.start()
+        hashed = utils.hash_with_salt(value, salt)
+        if started_at is not None:
+            metrics.record('hash', self, started_at, len(value))
+
+        return hashed
+
+    def get_lookup_hash(self, value: str) -> typing.Union[str, bytes]:
+        """Return the hashed value matched by lookups, in the form the hash column stores it"""
+
+        hashed = utils.hash_with_salt(value)
+        return bytes.fromhex(hashed) if self.binary else hashed
+
+    def get_hash_expression(self, lhs, connection):
+        """Return an expression holding the bare hashed value of `lhs`
+
+        `None` means the hashed value can only be matched as the suffix of the stored value.
+        """
+        if self.hash_field is not None:
+            if isinstance(lhs, Col):
+                return Col(lhs.alias, self.hash_field)
+            return None
+
+        # NOTE: a stored raw record has no hashed section, and PostgreSQL has no `RIGHT()` on `bytea`
+        if self.binary:
+            return None
+
+        # only searchable fields have an index on the hashed section, the column is checked as is otherwise
+        if not self.searchable:
+            return None
+
+        # NOTE: the connection is the one the query is compiled for, so this follows the database
+        #       routers instead of the default database. Each of these backends gets an index matching
+        #       the expression from `HashIndex`.
+        if connection.vendor in (DatabaseVendor.MYSQL, DatabaseVendor.POSTGRESQL, DatabaseVendor.SQLITE):
+            return HashedSection(lhs)
+
+        return None
+
+    def decrypt(self, value: typing.Union[str, bytes, memoryview]) -> typing.Union[bytes, str]:
+        """Decrypt a token, or the raw record stored by a field with `binary=True`"""
+
+        is_raw = not isinstance(value, str)
+        token = bytes(value) if is_raw else value.encode()
+        client = get_fernet(self)
+        # NOTE: namespaced by the keys of the client, so a value decrypted for a tenant is not read by another one
+        cache_key = client.cache_namespace + token
+
+        cache = get_decryption_cache()
+        value = None if cache is None else cache.get(cache_key)
+        if value is None:
+            started_at = metrics.start()
+            value = client.decrypt_raw(token) if is_raw else client.decrypt(token)
+            if started_at is not None:
+                metrics.record('decrypt', self, started_at, len(token))
+            # values are read the same whether `compress` is still set or not
+            if self.get_original_internal_type() != 'BinaryField' and compression.is_compressed(value):
+                value = compression.decompress(value)
+            if cache is not None:
+                cache.set(cache_key, value)
 
         # convert to str if not expecting bytes
         if self.get_original_internal_type() != 'BinaryField':
@@ -115,20 +384,43 @@ class EncryptedMixin(Field):
 
         return value
 
-    def from_db_value(self, value, expression, connection):  # pylint: disable=redefined-outer-name
+    def from_db_value(self, value, expression, connection):
         if value is None:
             return value
 
+        # decrypted on first access (see `EncryptedAttribute`), or by `EncryptedQuerySet.iterator()`
+        if (
+            isinstance(value, (str, bytes, memoryview)) and getattr(expression, 'for_instance', False) and
+            (self.lazy or lazy_decryption.get())
+        ):
+            return EncryptedValue(value)
+
+        return self.decrypt_db_value(value, expression, connection)
+
+    def decrypt_db_value(self, value, expression=None, connection=None):
+        """Convert a value loaded from the database into its Python value"""
+
         # NOTE: decryption only happens here, on values coming from the database. `to_python()`
         #       must not decrypt since it also receives in-memory values (form input, `full_clean()`,
         #       `loaddata` fixtures), and a plaintext that happens to be a valid Fernet token would
         #       silently be replaced by its decrypted content.
         if isinstance(value, str):
+            encrypted_section = self.get_encrypted_section(value)
+            if get_fernet(self).is_token(encrypted_section):
+                try:
+                    value = self.decrypt(encrypted_section)
+                except fernet.InvalidToken:
+                    # not encrypted
+                    self.legacy_reads += 1
+                    metrics.increment('invalid_tokens', self)
+            else:
+                self.legacy_reads += 1
+        elif self.binary and isinstance(value, (bytes, memoryview)):
             try:
-                value = self.decrypt(self.get_encrypted_section(value))
+                value = self.decrypt(value)
             except fernet.InvalidToken:
-                # not encrypted
-                pass
+                self.legacy_reads += 1
+                metrics.increment('invalid_tokens', self)
 
         value = self.to_python(value)
 
@@ -155,6 +447,14 @@ class EncryptedMixin(Field):
 
         return value
 
+    def get_token(self, value: typing.Union[str, bytes, memoryview]) -> str:
+        """Return the token of a stored value, without its hashed section"""
+
+        if isinstance(value, str):
+            return self.get_encrypted_section(value)
+
+        return get_fernet(self).to_token(bytes(value)).decode()
+
     @cached_property
     def validators(self):
         """Correcting internal type using for validation in integer-based fields"""
@@ -186,19 +486,47 @@ class EncryptedMixin(Field):
 
 
 class EncryptedStorageMixin:
-    """Mixin for encrypt/decrypt file content before saving/after getting from the storage"""
+    """Mixin for encrypt/decrypt file content before saving/after getting from the storage
+
+    Files are encrypted and decrypted as streams, by segments of `SECURED_FIELDS_FILE_SEGMENT_SIZE` bytes,
+    see `secured_fields.streams`. Files encrypted as a whole by earlier versions are still readable.
+    """
 
     def _open(self, name, mode='rb'):
         content = super()._open(name, mode)
-        decrypted_content = get_fernet().decrypt(content.read())
-        return File(BytesIO(decrypted_content))
+
+        header = streams.read_exactly(content, streams.HEADER.size)
+        if not streams.is_encrypted_stream(header):
+            decrypted_content = get_fernet().decrypt(header + content.read())
+            content.close()
+            return File(BytesIO(decrypted_content), name)
+
+        if getattr(content, 'seekable', lambda: False)():
+            return File(streams.EncryptedFile(content, header), name)
+
+        def get_chunks():
+            # NOTE: restarted when seeking back to the start, after the header on the first time
+            if content.tell() != streams.HEADER.size:
+                content.seek(streams.HEADER.size)
+            return streams.decrypt_chunks(content, header)
+
+        return File(streams.ChunksReader(get_chunks, file=content), name)
 
     def _save(self, name, content):
-        pos = content.tell()
-        content.seek(0)
-        encrypted_content = get_fernet().encrypt(content.read())
-        content.seek(0)
-        content.write(encrypted_content)
-        content.seek(pos)
-
-        return super()._save(name, content)
+        # already encrypted while uploaded
+        if isinstance(content, EncryptedUploadedFile):
+            return super()._save(name, content.encrypted_content())
+
+        segment_size = streams.get_segment_size()
+        cipher = streams.get_stream_cipher()
+
+        size = getattr(content, 'size', None)
+        if size is not None:
+            size = streams.get_encrypted_size(size, segment_size, cipher)
+
+        encrypted_content = streams.ChunksReader(
+            lambda: streams.encrypt_chunks(content, segment_size, cipher=cipher),
+            size=size,
+        )
+
+        return super()._save(name, File(encrypted_content, name))
@@ -0,0 +1,198 @@
+import typing
+
+from django.db.migrations.operations.base import Operation
+
+from . import backfill
+
+
+class BatchedFieldOperation(Operation):
+    """Base of the operations updating the stored values of a field by batches of records"""
+
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, model_name: str, name: str, batch_size: int = 1000):
+        self.model_name = model_name
+        self.name = name
+        self.batch_size = batch_size
+
+    def deconstruct(self):
+        kwargs = {
+            'model_name': self.model_name,
+            'name': self.name,
+        }
+        if self.batch_size != 1000:
+            kwargs['batch_size'] = self.batch_size
+
+        return self.__class__.__name__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def get_model(self, app_label, schema_editor, state):
+        """Return the historical model, `None` if it is not migrated on this database"""
+
+        model = state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return None
+
+        return model
+
+    def run(self, batches: typing.Iterator[backfill.Batch]):
+        for _ in batches:
+            pass
+
+
+class BackfillHashColumn(BatchedFieldOperation):
+    """Fill the hash column of a searchable field with `hash_column=True` for existing records
+
+    Add it after the `AddField` operation of the hash column generated by `makemigrations`.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = self.get_model(app_label, schema_editor, to_state)
+        if model is None:
+            return
+
+        backfill.backfill_hash_column(
+            model,
+            self.name,
+            using=schema_editor.connection.alias,
+            batch_size=self.batch_size,
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # the hash column is dropped by reversing its `AddField` operation
+        pass
+
+    def describe(self):
+        return f'Backfill hash column of {self.model_name}.{self.name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'backfill_{self.model_name.lower()}_{self.name.lower()}_hash'
+
+
+class BackfillHashes(BatchedFieldOperation):
+    """Add the hashed values of a field changed to `searchable=True` to its existing records
+
+    Add it after the `AlterField` operation generated by `makemigrations`. Only the hashed section (or
+    the hash column) is written, the encrypted values are kept as they are.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = self.get_model(app_label, schema_editor, to_state)
+        if model is None:
+            return
+
+        self.run(
+            backfill.backfill_hashes(
+                model,
+                self.name,
+                using=schema_editor.connection.alias,
+                batch_size=self.batch_size,
+            )
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # records keep their hashed values, which are ignored once the field is not searchable anymore
+        pass
+
+    def describe(self):
+        return f'Backfill hashes of {self.model_name}.{self.name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'backfill_{self.model_name.lower()}_{self.name.lower()}_hashes'
+
+
+class EncryptExistingValues(BatchedFieldOperation):
+    """Encrypt the values stored unencrypted before a field was changed to an encrypted field
+
+    Add it after the `AlterField` operation generated by `makemigrations`. Values are updated by batches;
+    on large tables, set `atomic = False` on the migration so each batch is committed on its own, or run
+    the `encrypt_existing_values` command instead. Reversing it stores the values unencrypted again.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = self.get_model(app_label, schema_editor, to_state)
+        if model is None:
+            return
+
+        self.run(
+            backfill.encrypt_existing_values(
+                model,
+                self.name,
+                using=schema_editor.connection.alias,
+                batch_size=self.batch_size,
+            )
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # NOTE: run before the field is reverted by its `AlterField` operation, so it is still encrypted
+        model = self.get_model(app_label, schema_editor, from_state)
+        if model is None:
+            return
+
+        self.run(
+            backfill.decrypt_existing_values(
+                model,
+                self.name,
+                using=schema_editor.connection.alias,
+                batch_size=self.batch_size,
+            )
+        )
+
+    def describe(self):
+        return f'Encrypt existing values of {self.model_name}.{self.name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'encrypt_{self.model_name.lower()}_{self.name.lower()}'
+
+
+class RemoveLegacySearchIndex(Operation):
+    """Drop the plain index created on the stored value of a searchable field by earlier versions
+
+    The index cannot serve lookups, which match the hashed section at the end of the stored value, and
+    is replaced by the index on the hashed section generated by `makemigrations`.
+    """
+
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, model_name: str, name: str):
+        self.model_name = model_name
+        self.name = name
+
+    def deconstruct(self):
+        kwargs = {
+            'model_name': self.model_name,
+            'name': self.name,
+        }
+
+        return self.__class__.__name__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        # pylint: disable=protected-access
+        column = model._meta.get_field(self.name).column
+        for index_name in schema_editor._constraint_names(model, [column], index=True, unique=False):
+            schema_editor.execute(schema_editor._delete_index_sql(model, index_name))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # the legacy index is never used, so it is not recreated
+        pass
+
+    def describe(self):
+        return f'Remove legacy search index of {self.model_name}.{self.name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'remove_{self.model_name.lower()}_{self.name.lower()}_legacy_index'
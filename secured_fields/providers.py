@@ -0,0 +1,94 @@
+import abc
+import os
+import re
+import typing
+
+from cryptography import fernet
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class KeyProvider(abc.ABC):
+    """Interface of the providers of the data keys of envelope encryption, e.g. backed by a KMS
+
+    Data keys are Fernet keys wrapped by a master key which the provider keeps outside of the app. Wrapped
+    keys are stored by the provider under their id, which is a 16 characters hex string.
+    """
+
+    @abc.abstractmethod
+    def generate_data_key(self) -> typing.Tuple[str, bytes]:
+        """Create a data key, and return its id and its unwrapped key"""
+
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_data_key(self, key_id: str) -> bytes:
+        """Return the unwrapped data key of the id, raise `fernet.InvalidToken` for an unknown one"""
+
+        raise NotImplementedError
+
+
+class LocalKeyProvider(KeyProvider):
+    """Data keys wrapped with a Fernet master key, each stored as a file of `directory`
+
+    Meant for tests and development, the master key is read from `master_key_path`, e.g. a key from
+    `python manage.py generate_key`.
+    """
+
+    key_id_pattern = re.compile(r'[0-9a-f]{16}')
+
+    def __init__(self, directory: str, master_key_path: str):
+        self.directory = directory
+        with open(master_key_path, 'rb') as f:
+            self.master_key = fernet.Fernet(f.read().strip())
+
+    def get_path(self, key_id: str) -> str:
+        if not self.key_id_pattern.fullmatch(key_id):
+            raise fernet.InvalidToken
+
+        return os.path.join(self.directory, f'{key_id}.key')
+
+    def generate_data_key(self):
+        key_id = os.urandom(8).hex()
+        data_key = fernet.Fernet.generate_key()
+
+        os.makedirs(self.directory, exist_ok=True)
+        # NOTE: exclusive creation, so a data key is never replaced once values are encrypted with it
+        with open(self.get_path(key_id), 'xb') as f:
+            f.write(self.master_key.encrypt(data_key))
+
+        return key_id, data_key
+
+    def get_data_key(self, key_id):
+        try:
+            with open(self.get_path(key_id), 'rb') as f:
+                wrapped_key = f.read()
+        except FileNotFoundError as e:
+            raise fernet.InvalidToken from e
+
+        return self.master_key.decrypt(wrapped_key)
+
+
+# `False` until the provider of the settings is loaded, `None` if there is none
+key_provider: typing.Union[KeyProvider, None, bool] = False
+
+
+def get_key_provider() -> typing.Optional[KeyProvider]:
+    global key_provider
+
+    if key_provider is False:
+        provider_class = getattr(settings, 'SECURED_FIELDS_KEY_PROVIDER', None)
+        options = getattr(settings, 'SECURED_FIELDS_KEY_PROVIDER_OPTIONS', {})
+        key_provider = import_string(provider_class)(**options) if provider_class else None
+
+    return key_provider
+
+
+@receiver(setting_changed)
+def reset_key_provider(setting, **kwargs):  # pylint: disable=unused-argument
+    global key_provider
+
+    if setting.startswith('SECURED_FIELDS_KEY_PROVIDER'):
+        key_provider = False
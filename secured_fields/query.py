@@ -0,0 +1,224 @@
+__all__ = [
+    'EncryptedManager',
+    'EncryptedQuerySet',
+]
+
+import contextlib
+import contextvars
+import itertools
+import typing
+from concurrent import futures
+
+from django.core.exceptions import FieldError
+from django.db import connections, models
+from django.db.models import Value
+from django.db.models.query import ModelIterable
+
+from .descriptors import EncryptedValue, lazy_decryption
+from .fields.hashes import PendingHash
+from .mixins import EncryptedMixin
+
+
+def decrypt_values(field: EncryptedMixin, values: typing.List[str]) -> list:
+    return [field.decrypt_db_value(value) for value in values]
+
+
+def get_loaded_instances(instances: list) -> list:
+    """Return the instances along with the related ones loaded by `select_related()` or `prefetch_related()`"""
+
+    loaded = {}
+    pending = list(instances)
+    while pending:
+        instance = pending.pop()
+        if id(instance) in loaded:
+            continue
+
+        loaded[id(instance)] = instance
+        # pylint: disable=protected-access
+        pending.extend(
+            related for related in instance._state.fields_cache.values() if isinstance(related, models.Model)
+        )
+        for related in getattr(instance, '_prefetched_objects_cache', {}).values():
+            pending.extend(related._result_cache or [])
+
+    return list(loaded.values())
+
+
+def decrypt_instances(instances: list, executor: futures.Executor, workers: int):
+    """Decrypt the values loaded lazily on the instances and their related ones, one task per worker and field"""
+
+    pending = {}
+    for instance in get_loaded_instances(instances):
+        for field in instance._meta.concrete_fields:  # pylint: disable=protected-access
+            value = instance.__dict__.get(field.attname)
+            if isinstance(value, EncryptedValue):
+                pending.setdefault(field, []).append((instance, value.value))
+
+    tasks = []
+    for field, items in pending.items():
+        size = -(-len(items) // workers)
+        for offset in range(0, len(items), size):
+            chunk = items[offset:offset + size]
+            args = (decrypt_values, field, [value for _, value in chunk])
+            # NOTE: threads decrypt in the context of the caller, for the keys it resolves to (see `resolvers`),
+            #       contexts cannot be sent to processes
+            if isinstance(executor, futures.ThreadPoolExecutor):
+                args = (contextvars.copy_context().run, *args)
+            tasks.append((field, chunk, executor.submit(*args)))
+
+    for field, chunk, task in tasks:
+        for (instance, _), value in zip(chunk, task.result()):
+            instance.__dict__[field.attname] = value
+
+
+@contextlib.contextmanager
+def encrypted_columns(
+    instances: list,
+    fields: typing.Dict[EncryptedMixin, bool],
+    connection,
+    workers: int,
+    for_update: bool = False,
+) -> typing.Iterator[None]:
+    """Hold the stored values of the encrypted fields in the instances within the block
+
+    `fields` tells for each field whether to compute its hash column too. The values of a field are encrypted as
+    a column by `EncryptedMixin.encrypt_many()`, then set as loaded values which `bulk_create()` writes as is, or
+    as expressions for `bulk_update()`, which reads them through the descriptors. The values set beforehand are
+    restored at the end of the block.
+    """
+    missing = object()
+    originals = []
+    try:
+        for field, hash_column in fields.items():
+            items = [(instance, instance.__dict__[field.attname])
+                     for instance in instances
+                     if field.attname in instance.__dict__]
+            # NOTE: `None`, unchanged loaded values and expressions are already written as is
+            items = [(instance, value)
+                     for instance, value in items
+                     if value is not None and not isinstance(value, EncryptedValue) and not hasattr(value, 'as_sql')]
+            hash_field = field.hash_field if hash_column else None
+
+            results = field.encrypt_many([value for _, value in items], connection, workers, hash_field is not None)
+            for (instance, value), (stored_value, hashed_value) in zip(items, results):
+                originals.append((instance, field.attname, value))
+                stored_value = EncryptedValue(stored_value)
+                if for_update:
+                    stored_value = Value(stored_value, output_field=field)
+                instance.__dict__[field.attname] = stored_value
+
+                if hash_field is not None:
+                    originals.append((instance, hash_field.attname, instance.__dict__.get(hash_field.attname, missing)))
+                    if for_update:
+                        hashed_value = Value(hashed_value, output_field=hash_field)
+                    instance.__dict__[hash_field.attname] = hashed_value
+
+        yield
+    finally:
+        for instance, attname, value in reversed(originals):
+            if value is missing:
+                instance.__dict__.pop(attname, None)
+            else:
+                instance.__dict__[attname] = value
+
+
+class EncryptedQuerySet(models.QuerySet):
+    """QuerySet decrypting the encrypted fields of the fetched instances on a pool of workers"""
+
+    def iterator(self, chunk_size=None, decrypt_workers=None, executor_class=futures.ThreadPoolExecutor):
+        """Iterate over the results, decrypting each chunk with `decrypt_workers` workers
+
+        `executor_class` may be a `ProcessPoolExecutor` for CPU-bound decryption, in which case the
+        workers must have Django set up. Without `decrypt_workers`, or when the results are not model
+        instances, values are decrypted when loaded as usual.
+        """
+        iterator = super().iterator(chunk_size)
+        if not decrypt_workers or not issubclass(self._iterable_class, ModelIterable):
+            return iterator
+
+        return self._decrypting_iterator(iterator, chunk_size or 2000, decrypt_workers, executor_class)
+
+    def update(self, **kwargs):
+        """Update the rows like `QuerySet.update()`, and the hash columns of the fields updated with a value
+
+        Raises `FieldError` when a field with a hash column is updated with an expression, which cannot be hashed,
+        unless its hash column is updated too.
+        """
+        for name, value in list(kwargs.items()):
+            field = self.model._meta.get_field(name)  # pylint: disable=protected-access
+            hash_field = getattr(field, 'hash_field', None)
+            if hash_field is None or hash_field.name in kwargs:
+                continue
+            if hasattr(value, 'resolve_expression'):
+                raise FieldError(f'Updating `{name}` with an expression requires updating `{hash_field.name}` too')
+
+            kwargs[hash_field.name] = PendingHash(value)
+
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, encrypt_workers=1, **kwargs):
+        """Insert the instances like `QuerySet.bulk_create()`, encrypting the values of each field as a column
+
+        With more than one of `encrypt_workers`, columns are encrypted on a thread pool, see
+        `EncryptedMixin.encrypt_many()`.
+        """
+        objs = list(objs)
+        fields = {
+            field: True
+            for field in self.model._meta.concrete_fields  # pylint: disable=protected-access
+            # NOTE: values set by `pre_save()` are only known once saved
+            if isinstance(field, EncryptedMixin) and not getattr(field, 'auto_now', False) and
+            not getattr(field, 'auto_now_add', False)
+        }
+        self._for_write = True
+
+        with encrypted_columns(objs, fields, connections[self.db], encrypt_workers):
+            return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, encrypt_workers=1, **kwargs):
+        """Update the instances like `QuerySet.bulk_update()`, encrypting the values of each field as a column
+
+        The hash columns of the updated fields are always updated along with them. Raises `FieldError` when a field
+        with a hash column is set to an expression, which cannot be hashed.
+        """
+        objs = list(objs)
+        fields = list(fields)
+        encrypted_fields = {}
+        for name in list(fields):
+            field = self.model._meta.get_field(name)  # pylint: disable=protected-access
+            if not isinstance(field, EncryptedMixin):
+                continue
+
+            encrypted_fields[field] = field.hash_field is not None
+            if field.hash_field is None:
+                continue
+            if any(hasattr(obj.__dict__.get(field.attname), 'resolve_expression') for obj in objs):
+                raise FieldError(f'`{field.name}` cannot be hashed when set to an expression')
+            if field.hash_field.name not in fields:
+                fields.append(field.hash_field.name)
+        self._for_write = True
+
+        with encrypted_columns(objs, encrypted_fields, connections[self.db], encrypt_workers, for_update=True):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+    @staticmethod
+    def _decrypting_iterator(iterator, chunk_size, workers, executor_class):
+        with executor_class(max_workers=workers) as executor:
+            while True:
+                # NOTE: set only while rows are fetched, the generator runs in the caller's context
+                token = lazy_decryption.set(True)
+                try:
+                    instances = list(itertools.islice(iterator, chunk_size))
+                finally:
+                    lazy_decryption.reset(token)
+
+                if not instances:
+                    return
+
+                decrypt_instances(instances, executor, workers)
+                yield from instances
+
+
+EncryptedManager = models.Manager.from_queryset(EncryptedQuerySet)
@@ -0,0 +1,74 @@
+import abc
+import contextlib
+import contextvars
+import typing
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+Keys = typing.Union[bytes, str, typing.Sequence[typing.Union[bytes, str]]]
+
+# tenant whose keys encrypt and decrypt values, see `TenantKeyResolver`
+current_tenant: contextvars.ContextVar[typing.Optional[typing.Hashable]] = \
+    contextvars.ContextVar('current_tenant', default=None)
+
+
+@contextlib.contextmanager
+def use_tenant(tenant_id: typing.Hashable) -> typing.Iterator[None]:
+    """Encrypt and decrypt values with the keys of the tenant in the block, also in its threads and tasks"""
+
+    token = current_tenant.set(tenant_id)
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+class KeyResolver(abc.ABC):
+    """Interface of the resolvers of the keys to use instead of `SECURED_FIELDS_KEY`, e.g. by tenant or by field
+
+    `get_cache_key()` is called for every value, so it should be cheap. `get_keys()` is only called once per
+    cache key, until its client is evicted from the registry (see `fernet.ClientRegistry`).
+    """
+
+    @abc.abstractmethod
+    def get_cache_key(self, field) -> typing.Optional[typing.Hashable]:
+        """Return what the keys of the field depend on, `None` for `SECURED_FIELDS_KEY`
+
+        `field` is `None` when the caller has no field, e.g. for files.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_keys(self, cache_key: typing.Hashable) -> Keys:
+        """Return the key, or the keys from the newest to the oldest, of a cache key"""
+
+        raise NotImplementedError
+
+
+class TenantKeyResolver(KeyResolver):
+    """Keys of the current tenant (see `use_tenant()`) from `SECURED_FIELDS_TENANT_KEYS`, by tenant id"""
+
+    def get_cache_key(self, field):
+        return current_tenant.get()
+
+    def get_keys(self, cache_key):
+        try:
+            return getattr(settings, 'SECURED_FIELDS_TENANT_KEYS', {})[cache_key]
+        except KeyError as e:
+            raise ImproperlyConfigured(f'No key in `SECURED_FIELDS_TENANT_KEYS` for tenant {cache_key!r}') from e
+
+
+class FieldKeyResolver(KeyResolver):
+    """Keys of the fields listed in `SECURED_FIELDS_FIELD_KEYS`, by `app_label.ModelName.field_name`"""
+
+    def get_cache_key(self, field):
+        model = getattr(field, 'model', None)
+        if model is None:
+            return None
+
+        label = f'{model._meta.label}.{field.name}'  # pylint: disable=protected-access
+        return label if label in getattr(settings, 'SECURED_FIELDS_FIELD_KEYS', {}) else None
+
+    def get_keys(self, cache_key):
+        return settings.SECURED_FIELDS_FIELD_KEYS[cache_key]
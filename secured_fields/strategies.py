@@ -0,0 +1,128 @@
+import json
+import re
+import typing
+
+from .enum import DatabaseVendor
+
+SQLWithParams = typing.Tuple[str, typing.List[typing.Any]]
+
+
+class InLookupStrategy:
+    """Build the SQL of an `in` lookup matching any of the hashed values
+
+    The hashed values are either compared by equality (`equal_any()`), or matched as the suffix of the
+    stored value (`like_any()`). This default one renders the values as a list of params, split under
+    the backend's `IN` list size limit. Lists of more values than the backend's limit of params per query
+    are rendered as literals instead, which hashed values (hex digests) can safely be.
+    """
+
+    # hashed values, and the patterns matching them as a suffix
+    literal_pattern = re.compile(r'%?\$?[0-9a-f]{64}')
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def use_literals(self, values: typing.Sequence, params_count: int) -> bool:
+        max_query_params = getattr(self.connection.features, 'max_query_params', None)
+
+        return (
+            max_query_params is not None and params_count > max_query_params and
+            all(isinstance(value, str) and self.literal_pattern.fullmatch(value) for value in values)
+        )
+
+    @staticmethod
+    def quote(value: str) -> str:
+        # NOTE: `%` is doubled, the SQL of the query is formatted with its params
+        return "'" + value.replace('%', '%%') + "'"
+
+    def equal_any(self, lhs_sql: str, lhs_params: typing.Sequence, values: typing.Sequence[str]) -> SQLWithParams:
+        max_in_list_size = self.connection.ops.max_in_list_size() or len(values)
+        chunks_count = -(-len(values) // max_in_list_size)
+        use_literals = self.use_literals(values, len(values) + len(lhs_params) * chunks_count)
+
+        conditions = []
+        params = []
+        for offset in range(0, len(values), max_in_list_size):
+            chunk = values[offset:offset + max_in_list_size]
+            placeholders = [self.quote(value) for value in chunk] if use_literals else ['%s'] * len(chunk)
+            conditions.append(f'{lhs_sql} IN ({", ".join(placeholders)})')
+            params.extend(lhs_params)
+            if not use_literals:
+                params.extend(chunk)
+
+        return self.join_or(conditions), params
+
+    def like_any(
+        self,
+        lhs_sql: str,
+        lhs_params: typing.Sequence,
+        operator: str,
+        patterns: typing.Sequence[str],
+    ) -> SQLWithParams:
+        if self.use_literals(patterns, len(patterns) * (len(lhs_params) + 1)):
+            conditions = [f'{lhs_sql} {operator % self.quote(pattern)}' for pattern in patterns]
+            return self.join_or(conditions), list(lhs_params) * len(patterns)
+
+        condition = f'{lhs_sql} {operator}'
+        params = []
+        for pattern in patterns:
+            params.extend(lhs_params)
+            params.append(pattern)
+
+        return self.join_or([condition] * len(patterns)), params
+
+    @staticmethod
+    def join_or(conditions: typing.List[str]) -> str:
+        if len(conditions) == 1:
+            return conditions[0]
+
+        return '(' + ' OR '.join(conditions) + ')'
+
+
+class PostgreSQLInLookupStrategy(InLookupStrategy):
+    """Pass the values as a single array param, whatever the number of values"""
+
+    def equal_any(self, lhs_sql, lhs_params, values):
+        return f'{lhs_sql} = ANY(%s)', [*lhs_params, list(values)]
+
+    def like_any(self, lhs_sql, lhs_params, operator, patterns):
+        return f'{lhs_sql} {operator % "ANY(%s)"}', [*lhs_params, list(patterns)]
+
+
+class SQLiteInLookupStrategy(InLookupStrategy):
+    """Join large lists of values from a single JSON array param using `json_each()`
+
+    It keeps the statement text identical for any number of values, and never hits the limit of
+    params per query.
+    """
+
+    large_list_size = 100
+
+    def use_json_each(self, values: typing.Sequence[str]) -> bool:
+        # NOTE: the raw hashed values of fields with `binary=True` cannot be held by a JSON array
+        return (
+            len(values) > self.large_list_size and self.connection.features.supports_json_field and
+            all(isinstance(value, str) for value in values)
+        )
+
+    def equal_any(self, lhs_sql, lhs_params, values):
+        if not self.use_json_each(values):
+            return super().equal_any(lhs_sql, lhs_params, values)
+
+        return f'{lhs_sql} IN (SELECT value FROM json_each(%s))', [*lhs_params, json.dumps(list(values))]
+
+    def like_any(self, lhs_sql, lhs_params, operator, patterns):
+        if not self.use_json_each(patterns):
+            return super().like_any(lhs_sql, lhs_params, operator, patterns)
+
+        sql = f'EXISTS (SELECT 1 FROM json_each(%s) WHERE {lhs_sql} {operator % "value"})'
+        return sql, [json.dumps(list(patterns)), *lhs_params]
+
+
+def get_in_lookup_strategy(connection) -> InLookupStrategy:
+    if connection.vendor == DatabaseVendor.POSTGRESQL:
+        return PostgreSQLInLookupStrategy(connection)
+    if connection.vendor == DatabaseVendor.SQLITE:
+        return SQLiteInLookupStrategy(connection)
+
+    return InLookupStrategy(connection)
@@ -0,0 +1,416 @@
+import base64
+import collections
+import contextvars
+import io
+import os
+import struct
+import typing
+from concurrent import futures
+
+from cryptography import fernet
+from django.conf import settings
+
+from .ciphers import CIPHER_CLASSES, AEADCipher
+from .fernet import get_cipher_name, get_fernet
+
+# NOTE: a file is a header followed by segments, each one a length-prefixed Fernet token (stored
+#       decoded from base64) of a fixed-size slice of the content. The token also holds the file id,
+#       the index of the segment and whether it is the last one, so segments cannot be reordered,
+#       moved to another file, or dropped from the end without failing decryption. Files encrypted with
+#       an AEAD cipher have the magic of the cipher, and segments made of raw AEAD records instead.
+MAGIC = b'SFE1'
+HEADER = struct.Struct('>4sI16s')  # magic, segment size, file id
+SEGMENT_HEADER = struct.Struct('>16sQ?')  # file id, index, last
+SEGMENT_LENGTH = struct.Struct('>I')
+
+# Fernet token without its payload: version, timestamp, IV and HMAC
+TOKEN_OVERHEAD = 1 + 8 + 16 + 32
+
+
+def get_segment_size() -> int:
+    return getattr(settings, 'SECURED_FIELDS_FILE_SEGMENT_SIZE', 64 * 1024)
+
+
+def get_encryption_workers() -> int:
+    return getattr(settings, 'SECURED_FIELDS_FILE_ENCRYPTION_WORKERS', 1)
+
+
+def get_stream_cipher() -> typing.Optional[AEADCipher]:
+    """Return the AEAD cipher encrypting new files, `None` for Fernet"""
+
+    cipher_name = get_cipher_name()
+    if cipher_name == 'fernet':
+        return None
+
+    return get_fernet().ciphers[cipher_name]
+
+
+def get_header_cipher(header: bytes) -> typing.Optional[AEADCipher]:
+    """Return the AEAD cipher which encrypted a file from its header, `None` for Fernet"""
+
+    for cipher in get_fernet().ciphers.values():
+        if header.startswith(cipher.magic):
+            return cipher
+
+    return None
+
+
+def get_record_size(data_size: int, cipher: typing.Optional[AEADCipher] = None) -> int:
+    """Return the size of a stored segment holding `data_size` bytes"""
+
+    if cipher is not None:
+        return SEGMENT_LENGTH.size + cipher.overhead + SEGMENT_HEADER.size + data_size
+
+    # AES-CBC payload with PKCS7 padding, always at least one byte of it
+    payload_size = (SEGMENT_HEADER.size + data_size) // 16 * 16 + 16
+    return SEGMENT_LENGTH.size + TOKEN_OVERHEAD + payload_size
+
+
+def get_encrypted_size(size: int, segment_size: int, cipher: typing.Optional[AEADCipher] = None) -> int:
+    """Return the size of a file of `size` bytes once encrypted"""
+
+    full_segments, last_segment_size = divmod(size, segment_size)
+    if full_segments and not last_segment_size:
+        full_segments, last_segment_size = full_segments - 1, segment_size
+
+    return (
+        HEADER.size + full_segments * get_record_size(segment_size, cipher) +
+        get_record_size(last_segment_size, cipher)
+    )
+
+
+def read_exactly(file, size: int) -> bytes:
+    """Read `size` bytes, less only at the end of the file"""
+
+    chunks = []
+    while size > 0:
+        chunk = file.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def encrypt_segment(
+    file_id: bytes,
+    index: int,
+    last: bool,
+    data: bytes,
+    cipher: typing.Optional[AEADCipher] = None,
+) -> bytes:
+    payload = SEGMENT_HEADER.pack(file_id, index, last) + data
+    if cipher is not None:
+        record = cipher.encrypt_raw(payload)
+    else:
+        record = base64.urlsafe_b64decode(get_fernet().encrypt(payload))
+
+    return SEGMENT_LENGTH.pack(len(record)) + record
+
+
+def decrypt_segment(
+    file_id: bytes,
+    index: int,
+    record: bytes,
+    cipher: typing.Optional[AEADCipher] = None,
+) -> typing.Tuple[bool, bytes]:
+    if cipher is not None:
+        payload = cipher.decrypt_raw(record)
+    else:
+        payload = get_fernet().decrypt(base64.urlsafe_b64encode(record))
+    if len(payload) < SEGMENT_HEADER.size:
+        raise fernet.InvalidToken
+
+    segment_file_id, segment_index, last = SEGMENT_HEADER.unpack_from(payload)
+    if segment_file_id != file_id or segment_index != index:
+        raise fernet.InvalidToken
+
+    return last, payload[SEGMENT_HEADER.size:]
+
+
+def iter_segments(content, segment_size: int) -> typing.Iterator[typing.Tuple[int, bool, bytes]]:
+    """Split a file into `(index, last, data)` segments"""
+
+    if hasattr(content, 'seek'):
+        content.seek(0)
+
+    index = 0
+    data = read_exactly(content, segment_size)
+    while True:
+        # read ahead, the last segment has to be known when it is encrypted
+        next_data = read_exactly(content, segment_size)
+        last = not next_data
+
+        yield index, last, data
+        if last:
+            return
+
+        data = next_data
+        index += 1
+
+
+def encrypt_chunks(
+    content,
+    segment_size: typing.Optional[int] = None,
+    workers: typing.Optional[int] = None,
+    cipher: typing.Optional[AEADCipher] = None,
+) -> typing.Iterator[bytes]:
+    """Encrypt a file segment by segment, with the AEAD cipher if any, or Fernet
+
+    With more than one worker, segments are encrypted on a thread pool while being yielded in order,
+    holding up to two segments per worker in memory.
+    """
+    segment_size = segment_size or get_segment_size()
+    workers = workers or get_encryption_workers()
+    file_id = os.urandom(16)
+
+    yield HEADER.pack(MAGIC if cipher is None else cipher.magic, segment_size, file_id)
+
+    if workers <= 1:
+        for index, last, data in iter_segments(content, segment_size):
+            yield encrypt_segment(file_id, index, last, data, cipher)
+        return
+
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for index, last, data in iter_segments(content, segment_size):
+            # NOTE: in the context of the caller, for the keys it resolves to, see `resolvers`
+            context = contextvars.copy_context()
+            pending.append(executor.submit(context.run, encrypt_segment, file_id, index, last, data, cipher))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+class StreamEncryptor:
+    """Encrypt a file from chunks of any size, as they arrive
+
+    The last segment is only encrypted by `finalize()`, once the end of the file is known.
+    """
+
+    def __init__(self, segment_size: typing.Optional[int] = None, cipher: typing.Optional[AEADCipher] = None):
+        self.segment_size = segment_size or get_segment_size()
+        self.cipher = cipher
+        self.file_id = os.urandom(16)
+        self.index = 0
+        self.buffer = bytearray()
+
+    def header(self) -> bytes:
+        return HEADER.pack(MAGIC if self.cipher is None else self.cipher.magic, self.segment_size, self.file_id)
+
+    def update(self, data: bytes) -> bytes:
+        self.buffer += data
+
+        records = []
+        while len(self.buffer) > self.segment_size:
+            data = bytes(self.buffer[:self.segment_size])
+            records.append(encrypt_segment(self.file_id, self.index, False, data, self.cipher))
+            del self.buffer[:self.segment_size]
+            self.index += 1
+
+        return b''.join(records)
+
+    def finalize(self) -> bytes:
+        record = encrypt_segment(self.file_id, self.index, True, bytes(self.buffer), self.cipher)
+        self.buffer = bytearray()
+
+        return record
+
+
+def decrypt_chunks(file, header: bytes) -> typing.Iterator[bytes]:
+    """Decrypt a file segment by segment, from its header already read"""
+
+    _, _, file_id = HEADER.unpack(header)
+    cipher = get_header_cipher(header)
+
+    index = 0
+    while True:
+        length = read_exactly(file, SEGMENT_LENGTH.size)
+        if len(length) < SEGMENT_LENGTH.size:
+            # truncated
+            raise fernet.InvalidToken
+
+        record = read_exactly(file, SEGMENT_LENGTH.unpack(length)[0])
+        last, data = decrypt_segment(file_id, index, record, cipher)
+        yield data
+
+        if last:
+            if file.read(1):
+                raise fernet.InvalidToken
+            return
+
+        index += 1
+
+
+def is_encrypted_stream(header: bytes) -> bool:
+    magics = (MAGIC, *(cipher_class.magic for cipher_class in CIPHER_CLASSES))
+    return len(header) == HEADER.size and header.startswith(magics)
+
+
+class EncryptedFile:
+    """Seekable file-like object over an encrypted file, decrypting only the segments it reads
+
+    Every segment but the last one holds exactly `segment_size` bytes, so the position of a segment is
+    computed from its index. The underlying file must be seekable.
+    """
+
+    def __init__(self, file, header: bytes):
+        _, self.segment_size, self.file_id = HEADER.unpack(header)
+        self.cipher = get_header_cipher(header)
+        self.file = file
+        self.record_size = get_record_size(self.segment_size, self.cipher)
+
+        self.file.seek(0, io.SEEK_END)
+        self.encrypted_size = self.file.tell()
+        self.segments_count = -(-(self.encrypted_size - HEADER.size) // self.record_size)
+        if self.segments_count < 1:
+            # truncated
+            raise fernet.InvalidToken
+
+        self.position = 0
+        self.closed = False
+        self._size = None
+        self.segment: typing.Tuple[int, bytes] = (-1, b'')
+
+    def read_segment(self, index: int) -> bytes:
+        if self.segment[0] == index:
+            return self.segment[1]
+
+        start = HEADER.size + index * self.record_size
+        self.file.seek(start)
+        length = read_exactly(self.file, SEGMENT_LENGTH.size)
+        if len(length) < SEGMENT_LENGTH.size:
+            raise fernet.InvalidToken
+
+        length, = SEGMENT_LENGTH.unpack(length)
+        last, data = decrypt_segment(self.file_id, index, read_exactly(self.file, length), self.cipher)
+
+        is_last = index == self.segments_count - 1
+        if last != is_last or (not is_last and len(data) != self.segment_size):
+            raise fernet.InvalidToken
+        if is_last and start + SEGMENT_LENGTH.size + length != self.encrypted_size:
+            raise fernet.InvalidToken
+
+        self.segment = (index, data)
+        return data
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            last_segment = self.read_segment(self.segments_count - 1)
+            self._size = (self.segments_count - 1) * self.segment_size + len(last_segment)
+
+        return self._size
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size is None or size < 0 else min(self.position + size, self.size)
+
+        chunks = []
+        while self.position < end:
+            index, offset = divmod(self.position, self.segment_size)
+            chunk = self.read_segment(index)[offset:offset + end - self.position]
+            chunks.append(chunk)
+            self.position += len(chunk)
+
+        return b''.join(chunks)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f'invalid whence ({whence})')
+
+        if offset < 0:
+            raise ValueError(f'negative seek position {offset}')
+
+        self.position = offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self):
+        self.closed = True
+        self.file.close()
+
+
+class ChunksReader:
+    """Read-only file-like object over the chunks yielded by `get_chunks()`
+
+    It can only seek back to the start, by calling `get_chunks()` again.
+    """
+
+    def __init__(
+        self,
+        get_chunks: typing.Callable[[], typing.Iterator[bytes]],
+        file=None,
+        size: typing.Optional[int] = None,
+    ):
+        self.get_chunks = get_chunks
+        self.chunks = get_chunks()
+        self.file = file
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+        if size is not None:
+            self.size = size
+
+    def read(self, size: int = -1) -> bytes:
+        while size is None or size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+
+        if size is None or size < 0:
+            size = len(self.buffer)
+
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.position += len(data)
+
+        return data
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('only seeking back to the start is supported')
+
+        if self.position:
+            self.chunks = self.get_chunks()
+            self.buffer = bytearray()
+            self.position = 0
+
+        return 0
+
+    def seekable(self) -> bool:
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self):
+        self.closed = True
+        if self.file is not None:
+            self.file.close()
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(get_segment_size())
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,85 @@
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from . import streams
+
+
+class EncryptedTemporaryFile(File):
+    """Encrypted content of an `EncryptedUploadedFile`, as stored by `EncryptedStorageMixin`"""
+
+    def temporary_file_path(self) -> str:
+        return self.file.name
+
+
+class EncryptedUploadedFile(UploadedFile):
+    """File uploaded through `EncryptedFileUploadHandler`, already encrypted in a temporary file
+
+    It reads as its decrypted content, so it can be validated or saved to any storage.
+    `EncryptedStorageMixin` saves the encrypted content as is instead.
+    """
+
+    def __init__(self, encrypted_file, *, name, content_type, size, charset, content_type_extra=None):
+        self.encrypted_file = encrypted_file
+
+        encrypted_file.seek(0)
+        header = encrypted_file.read(streams.HEADER.size)
+        super().__init__(
+            streams.EncryptedFile(encrypted_file, header),
+            name,
+            content_type,
+            size,
+            charset,
+            content_type_extra,
+        )
+
+    def encrypted_content(self) -> EncryptedTemporaryFile:
+        return EncryptedTemporaryFile(self.encrypted_file, self.name)
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # moved to the storage
+            pass
+
+
+class EncryptedFileUploadHandler(FileUploadHandler):
+    """Encrypt uploaded files into temporary files as their data arrives"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+
+        self.encryptor = streams.StreamEncryptor(cipher=streams.get_stream_cipher())
+        # NOTE: the temporary file outlives this method, it is closed by the uploaded file or by `upload_interrupted()`
+        self.encrypted_file = tempfile.NamedTemporaryFile(  # pylint: disable=consider-using-with
+            suffix='.upload',
+            dir=settings.FILE_UPLOAD_TEMP_DIR,
+        )
+        self.encrypted_file.write(self.encryptor.header())
+
+    def receive_data_chunk(self, raw_data, start):
+        self.encrypted_file.write(self.encryptor.update(raw_data))
+
+    def file_complete(self, file_size):
+        self.encrypted_file.write(self.encryptor.finalize())
+        self.encrypted_file.flush()
+
+        return EncryptedUploadedFile(
+            self.encrypted_file,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if hasattr(self, 'encrypted_file'):
+            try:
+                self.encrypted_file.close()
+            except FileNotFoundError:
+                pass
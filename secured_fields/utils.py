@@ -4,10 +4,15 @@ import typing
 from django.conf import settings
 
 
-def hash_with_salt(value: typing.Union[str, bytes]) -> str:
+def get_hash_salt() -> bytes:
+    return getattr(settings, 'SECURED_FIELDS_HASH_SALT', '').encode()
+
+
+def hash_with_salt(value: typing.Union[str, bytes], salt: typing.Optional[bytes] = None) -> str:
     if isinstance(value, str):
         value = value.encode()
 
-    salt = getattr(settings, 'SECURED_FIELDS_HASH_SALT', '').encode()
+    if salt is None:
+        salt = get_hash_salt()
 
     return hashlib.sha256(value + salt).hexdigest()
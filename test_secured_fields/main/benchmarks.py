@@ -0,0 +1,198 @@
+import datetime
+import decimal
+import functools
+import gc
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+import typing
+import uuid
+
+import cryptography
+import django
+from cryptography.fernet import Fernet
+from django import test
+from django.db import connection
+
+import secured_fields
+from main import fields
+from secured_fields import fernet as fernet_module
+from secured_fields import utils
+
+SIZES = (16, 256, 4096)
+
+
+class Case(typing.NamedTuple):
+    name: str
+    function: typing.Callable[[], typing.Any]
+
+
+def make_text(size: int) -> str:
+    return ('0123456789abcdef' * (size // 16 + 1))[:size]
+
+
+def get_values(field_class) -> typing.Dict[str, typing.Any]:
+    """Sample values of the field by label, in each size for the variable-sized types"""
+
+    fixed_values = {
+        secured_fields.EncryptedBooleanField: True,
+        secured_fields.EncryptedDateField: datetime.date(2020, 1, 2),
+        secured_fields.EncryptedDateTimeField: datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+        secured_fields.EncryptedDecimalField: decimal.Decimal('1234.56'),
+        secured_fields.EncryptedIntegerField: 123456,
+        fields.EncryptedBigIntegerField: 1234567890123,
+        fields.EncryptedUUIDField: uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    }
+    if field_class in fixed_values:
+        return {'fixed': fixed_values[field_class]}
+
+    if field_class is secured_fields.EncryptedBinaryField:
+        return {str(size): make_text(size).encode() for size in SIZES}
+    if field_class is secured_fields.EncryptedJSONField:
+        return {str(size): {'value': make_text(max(size - 13, 0))} for size in SIZES}
+
+    return {str(size): make_text(size) for size in SIZES}
+
+
+def get_field(field_class, searchable: bool):
+    kwargs = {'searchable': searchable}
+    if field_class is secured_fields.EncryptedCharField:
+        kwargs['max_length'] = max(SIZES)
+    elif field_class is secured_fields.EncryptedDecimalField:
+        kwargs.update(max_digits=6, decimal_places=2)
+
+    return field_class(**kwargs)
+
+
+FIELD_CLASSES = (
+    secured_fields.EncryptedBinaryField,
+    secured_fields.EncryptedBooleanField,
+    secured_fields.EncryptedCharField,
+    secured_fields.EncryptedDateField,
+    secured_fields.EncryptedDateTimeField,
+    secured_fields.EncryptedDecimalField,
+    secured_fields.EncryptedIntegerField,
+    secured_fields.EncryptedJSONField,
+    secured_fields.EncryptedTextField,
+    fields.EncryptedBigIntegerField,
+    fields.EncryptedUUIDField,
+)
+
+
+def get_cases(keys: typing.Sequence[bytes]) -> typing.Iterator[Case]:
+    """Hot paths of every field type, with values stored with the oldest key as during a rotation"""
+
+    for field_class in FIELD_CLASSES:
+        for searchable in (False, True):
+            if searchable and field_class is secured_fields.EncryptedBinaryField:
+                continue
+
+            field = get_field(field_class, searchable)
+            for label, value in get_values(field_class).items():
+                prefix = f'{field_class.__name__}/searchable={searchable}/keys={len(keys)}/size={label}'
+
+                with test.override_settings(SECURED_FIELDS_KEY=keys[-1]):
+                    fernet_module.fernet_client = None
+                    stored_value = field.get_db_prep_save(value, connection)
+                fernet_module.fernet_client = None
+
+                yield Case(f'{prefix}/get_db_prep_save', functools.partial(field.get_db_prep_save, value, connection))
+                yield Case(
+                    f'{prefix}/from_db_value',
+                    functools.partial(field.from_db_value, stored_value, None, connection),
+                )
+                yield Case(
+                    f'{prefix}/get_encrypted_section',
+                    functools.partial(field.get_encrypted_section, stored_value),
+                )
+                if searchable:
+                    prepared = field.prepare_encryption(field.prepare_db_value(value, connection))
+                    yield Case(f'{prefix}/hash_with_salt', functools.partial(utils.hash_with_salt, prepared))
+
+
+def measure(function: typing.Callable[[], typing.Any], iterations: int) -> dict:
+    """Time each call, then trace the memory allocated by a call"""
+
+    for _ in range(min(iterations, 10)):
+        function()
+
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            started_at = time.perf_counter_ns()
+            function()
+            timings.append(time.perf_counter_ns() - started_at)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        # NOTE: the first traced call also allocates the traces of long-lived objects (e.g. caches)
+        function()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'ops_per_sec': round(len(timings) * 1e9 / max(sum(timings), 1), 1),
+        'p50_us': round(quantiles[49] / 1000, 3),
+        'p99_us': round(quantiles[98] / 1000, 3),
+        'alloc_bytes': peak - before,
+    }
+
+
+def run(iterations: int = 1000, max_keys: int = 3, name_filter: str = '') -> dict:
+    """Run the benchmarks, from 1 to `max_keys` rotation keys"""
+
+    results = {}
+    for key_count in range(1, max_keys + 1):
+        keys = [Fernet.generate_key() for _ in range(key_count)]
+        with test.override_settings(SECURED_FIELDS_KEY=keys, SECURED_FIELDS_DECRYPTION_CACHE=False):
+            try:
+                for case in get_cases(keys):
+                    if name_filter in case.name:
+                        results[case.name] = measure(case.function, iterations)
+            finally:
+                fernet_module.fernet_client = None
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cryptography': cryptography.__version__,
+            'iterations': iterations,
+        },
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> typing.List[str]:
+    """Describe the benchmarks whose throughput dropped more than `max_regression` from the baseline"""
+
+    regressions = []
+    for name, result in results['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            continue
+
+        ratio = result['ops_per_sec'] / baseline_result['ops_per_sec']
+        if ratio < 1 - max_regression:
+            regressions.append(
+                f'{name}: {result["ops_per_sec"]} ops/s, {ratio:.0%} of the baseline '
+                f'({baseline_result["ops_per_sec"]} ops/s)'
+            )
+
+    return regressions
+
+
+def dumps(results: dict) -> str:
+    return json.dumps(results, indent=2, sort_keys=True)
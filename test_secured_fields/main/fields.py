@@ -19,5 +19,7 @@ class EncryptedUUIDField(secured_fields.EncryptedMixin, models.UUIDField):
 
 EncryptedBigIntegerField.register_lookup(lookups.EncryptedExact, 'exact')
 EncryptedBigIntegerField.register_lookup(lookups.EncryptedIn, 'in')
+EncryptedBigIntegerField.register_lookup(lookups.EncryptedIsNull, 'isnull')
 EncryptedUUIDField.register_lookup(lookups.EncryptedExact, 'exact')
 EncryptedUUIDField.register_lookup(lookups.EncryptedIn, 'in')
+EncryptedUUIDField.register_lookup(lookups.EncryptedIsNull, 'isnull')
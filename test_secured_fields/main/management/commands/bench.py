@@ -0,0 +1,42 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+from main import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Command to benchmark the encryption and decryption hot paths of the encrypted fields, as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help='Number of timed calls per benchmark')
+        parser.add_argument('--keys', type=int, default=3, help='Benchmark from 1 to this number of rotation keys')
+        parser.add_argument('--filter', default='', help='Only run the benchmarks whose name contains this')
+        parser.add_argument('--output', help='File to write the results to, instead of the standard output')
+        parser.add_argument('--baseline', help='Results of an earlier run to compare with')
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=0.2,
+            help='Fail when the throughput of a benchmark drops more than this ratio from the baseline',
+        )
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        if options['iterations'] < 1 or options['keys'] < 1:
+            raise CommandError('`--iterations` and `--keys` should be positive')
+
+        results = benchmarks.run(options['iterations'], options['keys'], options['filter'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(benchmarks.dumps(results))
+        else:
+            self.stdout.write(benchmarks.dumps(results))
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+            regressions = benchmarks.compare(results, baseline, options['max_regression'])
+            if regressions:
+                raise CommandError('Slower than the baseline:\n' + '\n'.join(regressions))
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from main import query_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Command to time and explain the lookups of the searchable fields on a test database, as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of records loaded into each model')
+        parser.add_argument('--iterations', type=int, default=20, help='Number of timed queries per lookup')
+        parser.add_argument('--output', help='File to write the results to, instead of the standard output')
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        if options['rows'] < 10 or options['iterations'] < 1:
+            raise CommandError('`--rows` should be at least 10 and `--iterations` positive')
+
+        # NOTE: the records are loaded into a test database, created like the test runner does
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = query_benchmarks.run(options['rows'], options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+        sequential_scans = query_benchmarks.get_sequential_scans(results)
+        if sequential_scans:
+            raise CommandError('Lookups scanning the whole table:\n' + '\n'.join(sequential_scans))
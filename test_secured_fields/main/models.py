@@ -8,6 +8,10 @@ class BinaryFieldModel(models.Model):
     field = secured_fields.EncryptedBinaryField(null=True)
 
 
+class BinaryStorageBinaryFieldModel(models.Model):
+    field = secured_fields.EncryptedBinaryField(null=True, binary=True)
+
+
 class BigIntegerFieldModel(models.Model):
     field = fields.EncryptedBigIntegerField(null=True)
 
@@ -32,6 +36,46 @@ class SearchableCharFieldModel(models.Model):
     field = secured_fields.EncryptedCharField(max_length=30, null=True, searchable=True)
 
 
+class HashColumnCharFieldModel(models.Model):
+    field = secured_fields.EncryptedCharField(max_length=30, null=True, searchable=True, hash_column=True)
+
+
+class LazyCharFieldModel(models.Model):
+    field = secured_fields.EncryptedCharField(max_length=30, null=True, searchable=True, lazy=True)
+    other = models.CharField(max_length=30, default='')
+
+
+class LazyHashColumnCharFieldModel(models.Model):
+    field = secured_fields.EncryptedCharField(max_length=30, null=True, searchable=True, hash_column=True, lazy=True)
+
+
+class BinaryStorageCharFieldModel(models.Model):
+    field = secured_fields.EncryptedCharField(max_length=30, null=True, searchable=True, hash_column=True, binary=True)
+
+
+class ManagedFieldModel(models.Model):
+    field = secured_fields.EncryptedCharField(max_length=30, null=True, searchable=True)
+    json_field = secured_fields.EncryptedJSONField(null=True)
+
+    objects = secured_fields.EncryptedManager()
+
+
+class ManagedRelatedFieldModel(models.Model):
+    parent = models.ForeignKey(ManagedFieldModel, on_delete=models.CASCADE)
+    field = secured_fields.EncryptedCharField(max_length=30, null=True)
+
+    objects = secured_fields.EncryptedManager()
+
+
+class ManagedHashColumnFieldModel(models.Model):
+    field = secured_fields.EncryptedCharField(max_length=30, null=True, searchable=True, hash_column=True)
+    binary_field = secured_fields.EncryptedCharField(
+        max_length=30, null=True, searchable=True, hash_column=True, binary=True
+    )
+
+    objects = secured_fields.EncryptedManager()
+
+
 class DateFieldModel(models.Model):
     field = secured_fields.EncryptedDateField(null=True)
 
@@ -92,6 +136,18 @@ class SearchableJSONFieldModel(models.Model):
     field = secured_fields.EncryptedJSONField(null=True, searchable=True)
 
 
+class LazyJSONFieldModel(models.Model):
+    field = secured_fields.EncryptedJSONField(null=True, lazy=True)
+
+
+class CompressedTextFieldModel(models.Model):
+    field = secured_fields.EncryptedTextField(null=True, searchable=True, compress=True)
+
+
+class CompressedJSONFieldModel(models.Model):
+    field = secured_fields.EncryptedJSONField(null=True, compress='zlib')
+
+
 class TextFieldModel(models.Model):
     field = secured_fields.EncryptedTextField(null=True)
 
@@ -106,3 +162,7 @@ class UUIDFieldModel(models.Model):
 
 class SearchableUUIDFieldModel(models.Model):
     field = fields.EncryptedUUIDField(null=True, searchable=True)
+
+
+class HashColumnUUIDFieldModel(models.Model):
+    field = fields.EncryptedUUIDField(null=True, searchable=True, hash_column=True)
@@ -0,0 +1,125 @@
+import re
+import statistics
+import time
+import typing
+
+from django.db import connection
+from django.db.models import Model, QuerySet
+
+from main import models
+from secured_fields.enum import DatabaseVendor
+
+MODEL_CLASSES = (
+    models.SearchableCharFieldModel,
+    models.HashColumnCharFieldModel,
+    models.SearchableIntegerFieldModel,
+)
+
+
+class Lookup(typing.NamedTuple):
+    name: str
+    queryset: QuerySet
+
+
+def make_value(model_class: typing.Type[Model], index: int):
+    if model_class is models.SearchableIntegerFieldModel:
+        return index
+
+    return f'value {index}'
+
+
+def load(model_class: typing.Type[Model], rows: int, batch_size: int = 1000):
+    """Insert `rows` records, one in a hundred without value"""
+
+    for offset in range(0, rows, batch_size):
+        model_class.objects.bulk_create([
+            model_class(field=None if index % 100 == 99 else make_value(model_class, index))
+            for index in range(offset, min(offset + batch_size, rows))
+        ])
+
+    # NOTE: the planner picks sequential scans over small tables it has no statistics of. InnoDB keeps
+    #       its statistics up to date by itself, and `ANALYZE TABLE` would commit the current transaction.
+    table_name = connection.ops.quote_name(model_class._meta.db_table)  # pylint: disable=protected-access
+    if connection.vendor != DatabaseVendor.MYSQL:
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {table_name}')
+
+
+def get_lookups(model_class: typing.Type[Model], rows: int) -> typing.List[Lookup]:
+    queryset = model_class.objects.values_list('pk', flat=True)
+    values = [make_value(model_class, index) for index in range(0, rows, max(rows // 10, 1))][:10]
+
+    lookups = [
+        Lookup('exact', queryset.filter(field=values[-1])),
+        Lookup('in', queryset.filter(field__in=values)),
+    ]
+    # NOTE: `isnull` of a field with a hash column checks its value column, which has no index
+    if model_class._meta.get_field('field').hash_field is None:  # pylint: disable=protected-access
+        lookups.append(Lookup('isnull', queryset.filter(field__isnull=True)))
+
+    return lookups
+
+
+def explain(queryset: QuerySet) -> str:
+    if connection.vendor == DatabaseVendor.MYSQL:
+        return queryset.explain(format='json')
+
+    return queryset.explain()
+
+
+def is_sequential_scan(plan: str, table_name: str) -> bool:
+    if connection.vendor == DatabaseVendor.POSTGRESQL:
+        return 'Seq Scan' in plan
+    if connection.vendor == DatabaseVendor.MYSQL:
+        return re.search(r'"access_type":\s*"ALL"', plan) is not None
+    if connection.vendor == DatabaseVendor.SQLITE:
+        return re.search(rf'\bSCAN {re.escape(table_name)}\b(?! USING (COVERING )?INDEX)', plan) is not None
+
+    return False
+
+
+def measure(queryset: QuerySet, iterations: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        started_at = time.perf_counter_ns()
+        list(queryset)
+        timings.append(time.perf_counter_ns() - started_at)
+
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'p50_ms': round(quantiles[49] / 1e6, 3),
+        'p99_ms': round(quantiles[98] / 1e6, 3),
+    }
+
+
+def run(rows: int = 10000, iterations: int = 20) -> dict:
+    """Load `rows` records into each searchable model, then time and explain its lookups
+
+    It writes to the tables of the current database, so it should run on a test database.
+    """
+    results = {}
+    for model_class in MODEL_CLASSES:
+        load(model_class, rows)
+
+        table_name = model_class._meta.db_table  # pylint: disable=protected-access
+        for lookup in get_lookups(model_class, rows):
+            plan = explain(lookup.queryset)
+            results[f'{model_class.__name__}/{lookup.name}'] = {
+                **measure(lookup.queryset, iterations),
+                'sequential_scan': is_sequential_scan(plan, table_name),
+                'plan': plan,
+            }
+
+    return {
+        'environment': {
+            'vendor': connection.vendor,
+            'version': '.'.join(str(part) for part in connection.get_database_version()),
+            'rows': rows,
+            'iterations': iterations,
+        },
+        'results': results,
+    }
+
+
+def get_sequential_scans(results: dict) -> typing.List[str]:
+    return [name for name, result in results['results'].items() if result['sequential_scan']]
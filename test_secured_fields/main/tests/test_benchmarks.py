@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django import test
+from django.core.management import CommandError, call_command
+
+from main import benchmarks
+
+
+class BenchmarkTestCase(test.SimpleTestCase):
+
+    def run_command(self, *args) -> dict:
+        stdout = StringIO()
+        call_command('bench', '--iterations=2', '--keys=2', '--filter=EncryptedCharField/', *args, stdout=stdout)
+
+        return json.loads(stdout.getvalue())
+
+    def test_simple(self):
+        results = self.run_command()['results']
+
+        self.assertIn('EncryptedCharField/searchable=False/keys=1/size=16/get_db_prep_save', results)
+        self.assertIn('EncryptedCharField/searchable=True/keys=2/size=4096/from_db_value', results)
+        self.assertIn('EncryptedCharField/searchable=True/keys=2/size=256/hash_with_salt', results)
+        self.assertNotIn('EncryptedCharField/searchable=False/keys=2/size=256/hash_with_salt', results)
+        self.assertEqual(len(results), 2 * 3 * (3 + 4))
+        for result in results.values():
+            self.assertEqual(set(result), {'ops_per_sec', 'p50_us', 'p99_us', 'alloc_bytes'})
+            self.assertGreater(result['ops_per_sec'], 0)
+            self.assertLessEqual(result['p50_us'], result['p99_us'])
+
+    def test_every_field(self):
+        """Every field type is benchmarked"""
+        names = {case.name.split('/')[0] for case in benchmarks.get_cases([b'A' * 43 + b'='])}
+
+        self.assertEqual(names, {field_class.__name__ for field_class in benchmarks.FIELD_CLASSES})
+
+    def test_baseline(self):
+        results = self.run_command()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            for result in results['results'].values():
+                result['ops_per_sec'] *= 100
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f)
+
+            with self.assertRaisesMessage(CommandError, 'Slower than the baseline'):
+                self.run_command(f'--baseline={path}')
+
+            self.assertEqual(benchmarks.compare(results, results, 0.2), [])
@@ -0,0 +1,177 @@
+from io import StringIO
+from unittest import mock
+
+from cryptography.fernet import Fernet
+from django import test
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.lookups import Exact
+
+import secured_fields
+from main import models
+from secured_fields import backfill, utils
+from secured_fields.cache import decryption_cache
+from secured_fields.descriptors import EncryptedValue, lazy_decryption
+from secured_fields.enum import DatabaseVendor
+from secured_fields import fernet as fernet_module
+from secured_fields.ciphers import CIPHER_CLASSES
+from secured_fields.fernet import get_fernet
+
+
+@test.override_settings(SECURED_FIELDS_HASH_SALT='test')
+class BinaryStorageTestCase(test.TestCase):
+    model_class = models.BinaryStorageCharFieldModel
+
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+    def tearDown(self):
+        fernet_module.fernet_client = None
+
+    def get_raw_values(self, pk: int) -> tuple:
+        # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT field, field_hash FROM {self.model_class._meta.db_table} WHERE id = %s', [pk])
+            return tuple(None if value is None else bytes(value) for value in cursor.fetchone())
+
+    def test_simple(self):
+        model = self.model_class.objects.create(field='test')
+        model.refresh_from_db()
+
+        self.assertEqual(model.field, 'test')
+
+        raw_value, raw_hash = self.get_raw_values(model.pk)
+        self.assertEqual(get_fernet().decrypt_raw(raw_value), b'test')
+        # the decoded Fernet token, without the base64 overhead
+        self.assertEqual(len(raw_value), 73)
+        self.assertEqual(len(get_fernet().encrypt(b'test')), 100)
+        self.assertEqual(raw_hash, bytes.fromhex(utils.hash_with_salt('test')))
+
+        model.field = 'changed'
+        model.save()
+        self.assertEqual(self.model_class.objects.get(field='changed'), model)
+
+    def test_ciphers(self):
+        for cipher_class in CIPHER_CLASSES:
+            with self.subTest(cipher_class.name), test.override_settings(SECURED_FIELDS_CIPHER=cipher_class.name):
+                model = self.model_class.objects.create(field='test')
+                raw_value, _ = self.get_raw_values(model.pk)
+
+                self.assertTrue(raw_value.startswith(cipher_class.magic))
+                self.assertEqual(len(raw_value), len(cipher_class.magic) + cipher_class.overhead + len(b'test'))
+                self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'test')
+
+    def test_null(self):
+        model = self.model_class.objects.create(field=None)
+
+        self.assertEqual(self.get_raw_values(model.pk), (None, None))
+        self.assertEqual(list(self.model_class.objects.filter(field__isnull=True)), [model])
+
+    def test_lookups(self):
+        model_1 = self.model_class.objects.create(field='test')
+        model_2 = self.model_class.objects.create(field='user')
+        self.model_class.objects.create(field=None)
+
+        self.assertEqual(list(self.model_class.objects.filter(field='test')), [model_1])
+        self.assertEqual(
+            list(self.model_class.objects.filter(field__in=['test', 'user', 'nobody']).order_by('pk')),
+            [model_1, model_2],
+        )
+        # more values than a single JSON array param holds on SQLite
+        values = ['user', *(f'nobody {i}' for i in range(200))]
+        self.assertEqual(list(self.model_class.objects.filter(field__in=values)), [model_2])
+        self.assertEqual(self.model_class.objects.filter(field__isnull=False).count(), 2)
+
+    def test_values(self):
+        self.model_class.objects.create(field='test')
+
+        self.assertEqual(list(self.model_class.objects.values_list('field', flat=True)), ['test'])
+
+    def test_lazy(self):
+        model = self.model_class.objects.create(field='test')
+        raw_values = self.get_raw_values(model.pk)
+
+        token = lazy_decryption.set(True)
+        try:
+            model = self.model_class.objects.get(pk=model.pk)
+        finally:
+            lazy_decryption.reset(token)
+
+        self.assertIsInstance(model.__dict__['field'], EncryptedValue)
+        model.save()
+        self.assertEqual(self.get_raw_values(model.pk), raw_values)
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'test')
+
+    def test_binary_field(self):
+        model = models.BinaryStorageBinaryFieldModel.objects.create(field=b'\x00\x01test')
+        model.refresh_from_db()
+
+        self.assertEqual(model.field, b'\x00\x01test')
+
+    def test_isnull_sql(self):
+        """The stored value is checked as is, it has no hashed section to extract"""
+        queryset = models.BinaryStorageBinaryFieldModel.objects.filter(field__isnull=True)
+        sql, _ = queryset.query.get_compiler(connection=connection).as_sql()
+
+        self.assertIn(f'{connection.ops.quote_name("field")} IS NULL', sql)
+        self.assertNotIn('SUBSTR', sql)
+        self.assertNotIn('RIGHT', sql)
+
+        field = models.BinaryStorageBinaryFieldModel._meta.get_field('field')  # pylint: disable=protected-access
+        for vendor in ('mysql', 'postgresql', 'sqlite'):
+            with mock.patch.object(connection, 'vendor', vendor):
+                self.assertIsNone(field.get_hash_expression(field.get_col('t'), connection))
+
+    def test_decryption_cache(self):
+        model = self.model_class.objects.create(field='test')
+
+        with decryption_cache() as cache:
+            self.model_class.objects.get(pk=model.pk)
+            self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'test')
+
+        self.assertEqual(cache.hits, 1)
+
+    def test_rotate_keys(self):
+        old_key = Fernet.generate_key()
+        with test.override_settings(SECURED_FIELDS_KEY=old_key):
+            model = self.model_class.objects.create(field='test')
+            with test.override_settings(SECURED_FIELDS_CIPHER='aes-gcm'):
+                aead_model = self.model_class.objects.create(field='test')
+
+        fernet_module.fernet_client = None
+        with test.override_settings(SECURED_FIELDS_KEY=[Fernet.generate_key(), old_key]):
+            stdout = StringIO()
+            call_command('rotate_keys', 'main.BinaryStorageCharFieldModel', stdout=stdout)
+            self.assertIn('rotated 2 of 2 rows', stdout.getvalue())
+
+            stdout = StringIO()
+            call_command('key_usage', 'main.BinaryStorageCharFieldModel', stdout=stdout)
+            self.assertIn(f'key 0 ({get_fernet().key_ids[0]}): 2', stdout.getvalue())
+
+            self.assertTrue(self.get_raw_values(aead_model.pk)[0].startswith(b'SFA1'))
+            self.assertEqual(list(self.model_class.objects.filter(field='test').order_by('pk')), [model, aead_model])
+
+    def test_raw_values_mysql_sql(self):
+        """Stored values are read from the column as is, MySQL cannot `CAST()` to its `longblob` type"""
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        queryset = backfill.get_raw_values(self.model_class, ['field'], using='default')
+        queryset = queryset.filter(Exact(backfill.get_raw_expression(field), b'test'))
+
+        with mock.patch.object(connection, 'vendor', DatabaseVendor.MYSQL):
+            sql, _ = queryset.query.get_compiler(connection=connection).as_sql()
+
+        self.assertNotIn('CAST', sql)
+        self.assertIn(f'{connection.ops.quote_name("field")} = %s', sql)
+
+    def test_convert_in_place(self):
+        with self.assertRaises(NotImplementedError):
+            list(backfill.encrypt_existing_values(self.model_class, 'field'))
+
+    def test_searchable_without_hash_column(self):
+        with self.assertRaises(ValueError):
+            secured_fields.EncryptedCharField(max_length=30, searchable=True, binary=True)
+
+    def test_deconstruct(self):
+        _, _, _, kwargs = self.model_class._meta.get_field('field').deconstruct()  # pylint: disable=protected-access
+
+        self.assertIs(kwargs['binary'], True)
@@ -0,0 +1,107 @@
+from unittest import mock
+
+from cryptography.fernet import Fernet
+from django import test
+from django.http import HttpResponse
+
+from main import models
+from secured_fields import cache as cache_module
+from secured_fields.cache import DecryptionCache, decryption_cache, get_decryption_cache
+from secured_fields.fernet import get_fernet
+from secured_fields.middleware import DecryptionCacheMiddleware
+
+
+class DecryptionCacheTestCase(test.SimpleTestCase):
+
+    def test_simple(self):
+        cache = DecryptionCache(max_entries=10, max_bytes=1024)
+
+        self.assertIsNone(cache.get(b'token'))
+        cache.set(b'token', b'value')
+
+        self.assertEqual(cache.get(b'token'), b'value')
+        self.assertEqual(cache.info(), cache_module.CacheInfo(hits=1, misses=1, entries=1, size=37))
+
+    def test_max_entries(self):
+        cache = DecryptionCache(max_entries=2, max_bytes=1024)
+        cache.set(b'token 1', b'value 1')
+        cache.set(b'token 2', b'value 2')
+        cache.get(b'token 1')
+        cache.set(b'token 3', b'value 3')
+
+        self.assertEqual(cache.get(b'token 1'), b'value 1')
+        self.assertIsNone(cache.get(b'token 2'))
+        self.assertEqual(cache.get(b'token 3'), b'value 3')
+
+    def test_max_bytes(self):
+        cache = DecryptionCache(max_entries=10, max_bytes=100)
+        cache.set(b'token 1', b'a' * 50)
+        cache.set(b'token 2', b'b' * 50)
+        cache.set(b'token 3', b'c' * 200)
+
+        self.assertIsNone(cache.get(b'token 1'))
+        self.assertEqual(cache.get(b'token 2'), b'b' * 50)
+        self.assertIsNone(cache.get(b'token 3'))
+        self.assertEqual(cache.info().size, 82)
+
+    def test_ttl(self):
+        cache = DecryptionCache(max_entries=10, max_bytes=1024, ttl=60)
+
+        with mock.patch('time.monotonic', return_value=1000):
+            cache.set(b'token', b'value')
+        with mock.patch('time.monotonic', return_value=1059):
+            self.assertEqual(cache.get(b'token'), b'value')
+        with mock.patch('time.monotonic', return_value=1060):
+            self.assertIsNone(cache.get(b'token'))
+
+        self.assertEqual(cache.info().entries, 0)
+
+
+class FieldDecryptionCacheTestCase(test.TestCase):
+    model_class = models.CharFieldModel
+
+    def setUp(self):
+        self.model = self.model_class.objects.create(field='test')
+
+    def load_twice(self):
+        with mock.patch.object(get_fernet(), 'decrypt', wraps=get_fernet().decrypt) as decrypt:
+            self.assertEqual(self.model_class.objects.get(pk=self.model.pk).field, 'test')
+            self.assertEqual(self.model_class.objects.get(pk=self.model.pk).field, 'test')
+
+        return decrypt.call_count
+
+    def test_disabled(self):
+        self.assertIsNone(get_decryption_cache())
+        self.assertEqual(self.load_twice(), 2)
+
+    def test_scoped(self):
+        with decryption_cache() as cache:
+            self.assertIs(get_decryption_cache(), cache)
+            self.assertEqual(self.load_twice(), 1)
+
+        self.assertEqual(cache.info().hits, 1)
+        self.assertIsNone(get_decryption_cache())
+
+    @test.override_settings(SECURED_FIELDS_DECRYPTION_CACHE=True)
+    def test_process(self):
+        self.assertEqual(self.load_twice(), 1)
+        self.assertEqual(self.load_twice(), 0)
+
+    @test.override_settings(SECURED_FIELDS_DECRYPTION_CACHE=True)
+    def test_key_changed(self):
+        self.load_twice()
+        self.assertEqual(get_decryption_cache().info().entries, 1)
+
+        with test.override_settings(SECURED_FIELDS_KEY=Fernet.generate_key()):
+            self.assertEqual(get_decryption_cache().info().entries, 0)
+
+    def test_middleware(self):
+
+        def view(request):  # pylint: disable=unused-argument
+            self.assertIsNotNone(get_decryption_cache())
+            return HttpResponse(str(self.load_twice()))
+
+        response = DecryptionCacheMiddleware(view)(test.RequestFactory().get('/'))
+
+        self.assertEqual(response.content, b'1')
+        self.assertIsNone(get_decryption_cache())
@@ -0,0 +1,139 @@
+import io
+
+from cryptography.fernet import Fernet, InvalidToken
+from django import test
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+
+from main import models
+from main.tests import utils as test_utils
+from secured_fields import backfill, streams
+from secured_fields import fernet as fernet_module
+from secured_fields.ciphers import CIPHER_CLASSES
+from secured_fields.fernet import get_fernet
+
+
+class CiphersTestCase(test.TestCase):
+    model_class = models.SearchableCharFieldModel
+
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+    def tearDown(self):
+        fernet_module.fernet_client = None
+
+    def get_raw_value(self, model) -> str:
+        return dict(backfill.get_raw_values(self.model_class, ['field'], using='default'))[model.pk]
+
+    def test_simple(self):
+        fernet_model = self.model_class.objects.create(field='test')
+        for cipher_class in CIPHER_CLASSES:
+            with self.subTest(cipher_class.name), test.override_settings(SECURED_FIELDS_CIPHER=cipher_class.name):
+                model = self.model_class.objects.create(field='test')
+                raw_value = self.get_raw_value(model)
+
+                self.assertTrue(raw_value.startswith(cipher_class.prefix.decode()))
+                # same hashed section, so lookups find both
+                self.assertEqual(raw_value[-65:], self.get_raw_value(fernet_model)[-65:])
+                self.assertLess(len(raw_value), len(self.get_raw_value(fernet_model)))
+
+                model.refresh_from_db()
+                self.assertEqual(model.field, 'test')
+                self.assertEqual(self.model_class.objects.filter(field='test').count(), 2)
+                self.assertEqual(self.model_class.objects.get(pk=fernet_model.pk).field, 'test')
+
+            model.refresh_from_db()
+            self.assertEqual(model.field, 'test')
+            model.delete()
+
+    def test_rotation_keys(self):
+        key1 = Fernet.generate_key()
+        key2 = Fernet.generate_key()
+        for cipher_class in CIPHER_CLASSES:
+            with self.subTest(cipher_class.name):
+                encrypted = cipher_class([key1]).encrypt(b'test')
+
+                cipher = cipher_class([key2, key1])
+                self.assertEqual(cipher.decrypt(encrypted), b'test')
+                self.assertEqual(cipher.find_key_id(encrypted), fernet_module.MultiFernet.get_key_id(key1))
+                self.assertTrue(cipher.is_token(encrypted.decode()))
+
+                rotated = cipher.rotate(encrypted)
+                self.assertEqual(cipher.find_key_id(rotated), fernet_module.MultiFernet.get_key_id(key2))
+                with self.assertRaises(InvalidToken):
+                    cipher_class([key1]).decrypt(rotated)
+
+    def test_multi_fernet(self):
+        fernet = get_fernet()
+        for cipher_class in CIPHER_CLASSES:
+            with self.subTest(cipher_class.name):
+                encrypted = fernet.encrypt_with(cipher_class.name, b'test')
+
+                self.assertIs(fernet.get_cipher(encrypted), fernet.ciphers[cipher_class.name])
+                self.assertEqual(fernet.decrypt(encrypted), b'test')
+                self.assertEqual(fernet.decrypt(fernet.rotate(encrypted)), b'test')
+                self.assertEqual(fernet.find_key_id(encrypted), fernet.key_ids[0])
+                self.assertTrue(fernet.is_token(encrypted.decode()))
+
+        self.assertIsNone(fernet.get_cipher(fernet.encrypt(b'test')))
+        self.assertFalse(fernet.is_token('a1:test'))
+
+    def test_tampered(self):
+        fernet = get_fernet()
+        for cipher_class in CIPHER_CLASSES:
+            with self.subTest(cipher_class.name):
+                encrypted = fernet.encrypt_with(cipher_class.name, b'test')
+                tampered = encrypted[:-2] + (b'AA' if encrypted[-2:] != b'AA' else b'BA')
+
+                with self.assertRaises(InvalidToken):
+                    fernet.decrypt(tampered)
+                with self.assertRaises(InvalidToken):
+                    fernet.decrypt(cipher_class.prefix + b'AAAA')
+                self.assertIsNone(fernet.find_key_id(tampered))
+
+    @test.override_settings(SECURED_FIELDS_CIPHER='unknown')
+    def test_unknown_cipher(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.model_class.objects.create(field='test')
+
+
+class CipherFilesTestCase(test_utils.FileTestMixin, test.TestCase):
+    content = bytes(range(256)) * 4
+
+    def test_streams(self):
+        for cipher in get_fernet().ciphers.values():
+            with self.subTest(cipher.name):
+                encrypted = b''.join(streams.encrypt_chunks(io.BytesIO(self.content), 64, cipher=cipher))
+                header = encrypted[:streams.HEADER.size]
+
+                self.assertTrue(encrypted.startswith(cipher.magic))
+                self.assertTrue(streams.is_encrypted_stream(header))
+                self.assertEqual(len(encrypted), streams.get_encrypted_size(len(self.content), 64, cipher))
+                self.assertLess(len(encrypted), streams.get_encrypted_size(len(self.content), 64))
+
+                file = io.BytesIO(encrypted)
+                file.seek(streams.HEADER.size)
+                self.assertEqual(b''.join(streams.decrypt_chunks(file, header)), self.content)
+
+                file.seek(streams.HEADER.size)
+                encrypted_file = streams.EncryptedFile(file, header)
+                encrypted_file.seek(130)
+                self.assertEqual(encrypted_file.read(10), self.content[130:140])
+
+    @test.override_settings(SECURED_FIELDS_FILE_SEGMENT_SIZE=64)
+    def test_file_field(self):
+        fernet_model = models.FileFieldModel.objects.create(field=ContentFile(self.content, name='fernet.txt'))
+        for cipher_class in CIPHER_CLASSES:
+            with self.subTest(cipher_class.name), test.override_settings(SECURED_FIELDS_CIPHER=cipher_class.name):
+                model = models.FileFieldModel.objects.create(field=ContentFile(self.content, name='test.txt'))
+                model.refresh_from_db()
+
+                with open(model.field.path, 'rb') as f:
+                    encrypted_content = f.read()
+                self.assertTrue(encrypted_content.startswith(cipher_class.magic))
+                cipher = get_fernet().ciphers[cipher_class.name]
+                self.assertEqual(len(encrypted_content), streams.get_encrypted_size(len(self.content), 64, cipher))
+                self.assertEqual(model.field.read(), self.content)
+
+                fernet_model.refresh_from_db()
+                self.assertEqual(fernet_model.field.read(), self.content)
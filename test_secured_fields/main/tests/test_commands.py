@@ -1,9 +1,17 @@
+import json
+import os
+import tempfile
 from io import StringIO
 from unittest import mock
 
 from cryptography import fernet
 from django import test
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
+
+from main import models
+from secured_fields import backfill
+from secured_fields import fernet as fernet_module
+from secured_fields.fernet import get_fernet
 
 
 class GenerateKeyCommandTestCase(test.SimpleTestCase):
@@ -21,3 +29,160 @@ class GenerateKeyCommandTestCase(test.SimpleTestCase):
 
         hash_salt = hash_salt_line.removeprefix('HASH_SALT: ')
         self.assertEqual(len(hash_salt), 8)
+
+
+class KeyUsageCommandTestCase(test.TestCase):
+
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+    def tearDown(self):
+        fernet_module.fernet_client = None
+
+    def test_simple(self):
+        old_key = fernet.Fernet.generate_key()
+        with test.override_settings(SECURED_FIELDS_KEY=old_key):
+            models.SearchableCharFieldModel.objects.create(field='old')
+            with test.override_settings(SECURED_FIELDS_KEY_ID=True):
+                models.SearchableCharFieldModel.objects.create(field='old')
+
+        fernet_module.fernet_client = None
+        new_key = fernet.Fernet.generate_key()
+        with test.override_settings(SECURED_FIELDS_KEY=[new_key, old_key]):
+            models.SearchableCharFieldModel.objects.create(field='new')
+            models.SearchableCharFieldModel.objects.create(field=None)
+            models.SearchableCharFieldModel.objects.bulk_create([models.SearchableCharFieldModel()])
+
+            stdout = StringIO()
+            call_command('key_usage', 'main.SearchableCharFieldModel', stdout=stdout)
+
+        client = get_fernet()
+        self.assertEqual(
+            stdout.getvalue().splitlines(), [
+                'main.SearchableCharFieldModel.field',
+                f'  key 0 ({client.get_key_id(new_key)}): 1',
+                f'  key 1 ({client.get_key_id(old_key)}): 2',
+                '  not encrypted or unknown key: 0',
+            ]
+        )
+
+    def test_without_hash(self):
+        """Values whose hash column is not backfilled yet are counted"""
+        model = models.HashColumnCharFieldModel.objects.create(field='test')
+        models.HashColumnCharFieldModel.objects.filter(pk=model.pk).update(field_hash=None)
+
+        stdout = StringIO()
+        call_command('key_usage', 'main.HashColumnCharFieldModel', stdout=stdout)
+
+        self.assertIn(f'  key 0 ({get_fernet().key_ids[0]}): 1', stdout.getvalue().splitlines())
+
+    def test_app_label(self):
+        models.CharFieldModel.objects.create(field='test')
+
+        stdout = StringIO()
+        call_command('key_usage', 'main', stdout=stdout)
+
+        self.assertIn('main.CharFieldModel.field', stdout.getvalue().splitlines())
+
+    def test_unknown_model(self):
+        with self.assertRaises(CommandError):
+            call_command('key_usage', 'main.UnknownModel')
+
+
+class RotateKeysCommandTestCase(test.TestCase):
+    model_class = models.SearchableCharFieldModel
+
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+        self.old_key = fernet.Fernet.generate_key()
+        self.new_key = fernet.Fernet.generate_key()
+        with test.override_settings(SECURED_FIELDS_KEY=self.old_key):
+            self.models = [self.model_class.objects.create(field=f'old {i}') for i in range(3)]
+            with test.override_settings(SECURED_FIELDS_KEY_ID=True):
+                self.models.append(self.model_class.objects.create(field='old 3'))
+        self.model_class.objects.create(field=None)
+
+        fernet_module.fernet_client = None
+        settings_override = test.override_settings(SECURED_FIELDS_KEY=[self.new_key, self.old_key])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        fernet_module.fernet_client = None
+
+    def get_raw_values(self) -> dict:
+        return dict(backfill.get_raw_values(self.model_class, ['field'], using='default'))
+
+    def get_key_usage(self) -> str:
+        stdout = StringIO()
+        call_command('key_usage', self.model_class._meta.label, stdout=stdout)  # pylint: disable=protected-access
+        return stdout.getvalue()
+
+    def test_simple(self):
+        new_model = self.model_class.objects.create(field='new')
+        raw_values = self.get_raw_values()
+
+        stdout = StringIO()
+        call_command('rotate_keys', 'main.SearchableCharFieldModel', '--batch-size=2', stdout=stdout)
+
+        self.assertRegex(
+            stdout.getvalue(),
+            r'^main\.SearchableCharFieldModel: rotated 4 of 6 rows, 0 values with an unknown key \(\d+ rows/s\)\n$',
+        )
+        self.assertIn('  key 1 ', self.get_key_usage())
+        self.assertIn(f'({get_fernet().key_ids[1]}): 0', self.get_key_usage())
+
+        rotated_values = self.get_raw_values()
+        self.assertEqual(rotated_values[new_model.pk], raw_values[new_model.pk])
+        # the hashed sections and the key id envelope are kept
+        for model in self.models:
+            self.assertNotEqual(rotated_values[model.pk], raw_values[model.pk])
+            self.assertEqual(rotated_values[model.pk][-65:], raw_values[model.pk][-65:])
+        self.assertTrue(rotated_values[self.models[3].pk].startswith(f'v1:{get_fernet().key_ids[0]}:'))
+
+        for i, model in enumerate(self.models):
+            self.assertEqual(self.model_class.objects.get(field=f'old {i}'), model)
+
+    def test_workers(self):
+        call_command('rotate_keys', 'main.SearchableCharFieldModel', '--workers=2', stdout=StringIO())
+
+        self.assertIn(f'({get_fernet().key_ids[1]}): 0', self.get_key_usage())
+
+    def test_unknown_key(self):
+        with test.override_settings(SECURED_FIELDS_KEY=self.new_key):
+            fernet_module.fernet_client = None
+            stdout = StringIO()
+            call_command('rotate_keys', 'main.SearchableCharFieldModel', stdout=stdout)
+
+        self.assertIn('rotated 0 of 5 rows, 4 values with an unknown key', stdout.getvalue())
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'main.SearchableCharFieldModel': {'last_pk': str(self.models[1].pk), 'done': False}}, f)
+
+            stdout = StringIO()
+            call_command('rotate_keys', 'main.SearchableCharFieldModel', f'--checkpoint={path}', stdout=stdout)
+            self.assertIn('rotated 2 of 3 rows', stdout.getvalue())
+            self.assertIn(f'({get_fernet().key_ids[1]}): 2', self.get_key_usage())
+
+            with open(path, encoding='utf-8') as f:
+                self.assertTrue(json.load(f)['main.SearchableCharFieldModel']['done'])
+
+            stdout = StringIO()
+            call_command('rotate_keys', 'main.SearchableCharFieldModel', f'--checkpoint={path}', stdout=stdout)
+            self.assertEqual(stdout.getvalue(), 'main.SearchableCharFieldModel: already rotated\n')
+
+    def test_changed_while_rotated(self):
+        """A value saved since it was read is not replaced"""
+        model = self.models[0]
+        old_value = self.get_raw_values()[model.pk]
+
+        model.field = 'changed'
+        model.save()
+        changes = {'field': {model.pk: backfill.RawChange(old_value, 'rotated')}}
+        backfill.update_raw_values(self.model_class, changes, using='default')
+
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'changed')
@@ -0,0 +1,109 @@
+import os
+from unittest import mock
+
+from django import test
+from django.core.exceptions import ImproperlyConfigured
+
+import secured_fields
+from main import models
+from secured_fields import backfill, compression, metrics
+from secured_fields.fernet import get_fernet
+
+
+class CompressionTestCase(test.TestCase):
+    model_class = models.CompressedTextFieldModel
+    value = '{"note": "lorem ipsum dolor sit amet"}' * 100
+
+    def get_payload(self, model) -> bytes:
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        raw_value = dict(backfill.get_raw_values(self.model_class, ['field'], using='default'))[model.pk]
+
+        return get_fernet().decrypt(field.get_encrypted_section(raw_value))
+
+    def test_simple(self):
+        model = self.model_class.objects.create(field=self.value)
+        model.refresh_from_db()
+
+        self.assertEqual(model.field, self.value)
+        payload = self.get_payload(model)
+        self.assertTrue(payload.startswith(compression.FLAG + compression.MARKERS['zlib']))
+        self.assertLess(len(payload), len(self.value) // 10)
+
+        # hashed from the uncompressed value
+        self.assertEqual(self.model_class.objects.get(field=self.value), model)
+
+    def test_small(self):
+        model = self.model_class.objects.create(field='test')
+
+        self.assertEqual(self.get_payload(model), b'test')
+
+    def test_incompressible(self):
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        value = os.urandom(2048)
+
+        self.assertIs(field.compress_payload(value), value)
+
+    def test_json(self):
+        value = {'notes': ['lorem ipsum dolor sit amet'] * 100}
+        model = models.CompressedJSONFieldModel.objects.create(field=value)
+        model.refresh_from_db()
+
+        self.assertEqual(model.field, value)
+
+    def test_uncompressed_values(self):
+        """Values stored before `compress` was set, or after it was unset, are still read"""
+        with test.override_settings(SECURED_FIELDS_COMPRESSION_MIN_SIZE=len(self.value) + 1):
+            model = self.model_class.objects.create(field=self.value)
+        self.assertEqual(self.get_payload(model), self.value.encode())
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, self.value)
+
+        compressed_model = self.model_class.objects.create(field=self.value)
+        raw_value = dict(backfill.get_raw_values(self.model_class, ['field'], using='default'))[compressed_model.pk]
+        field = models.TextFieldModel._meta.get_field('field')  # pylint: disable=protected-access
+        self.assertEqual(field.decrypt_db_value(raw_value), self.value)
+
+    def test_stats(self):
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        field.compression_stats = compression.CompressionStats()
+        self.assertIsNone(field.compression_stats.ratio)
+
+        with test.override_settings(SECURED_FIELDS_METRICS_COLLECTOR='secured_fields.metrics.InMemoryCollector'):
+            self.model_class.objects.create(field=self.value)
+            self.model_class.objects.create(field='test')
+            counters = metrics.get_collector().snapshot()['counters']
+
+        self.assertEqual(field.compression_stats.values, 1)
+        self.assertEqual(field.compression_stats.input_bytes, len(self.value))
+        self.assertLess(field.compression_stats.ratio, 0.1)
+
+        labels = '{field="field",model="main.CompressedTextFieldModel"}'
+        self.assertEqual(counters[f'compressed_values{labels}'], 1)
+        self.assertEqual(counters[f'compression_input_bytes{labels}'], len(self.value))
+        self.assertEqual(counters[f'compression_output_bytes{labels}'], field.compression_stats.output_bytes)
+
+    def test_algorithm(self):
+        self.assertEqual(compression.get_algorithm('zlib'), 'zlib')
+        self.assertIsNone(compression.get_algorithm(False))
+        with self.assertRaises(ValueError):
+            compression.get_algorithm('lzma')
+
+        with mock.patch.object(compression, 'zstandard', None):
+            self.assertEqual(compression.get_algorithm(True), 'zlib')
+            with self.assertRaises(ImproperlyConfigured):
+                compression.get_algorithm('zstd')
+            with self.assertRaises(ImproperlyConfigured):
+                compression.decompress(compression.FLAG + compression.MARKERS['zstd'] + b'data')
+
+        with mock.patch.object(compression, 'zstandard', mock.Mock()):
+            self.assertEqual(compression.get_algorithm(True), 'zlib')
+            self.assertEqual(compression.get_algorithm('zstd'), 'zstd')
+
+    def test_binary_field(self):
+        with self.assertRaises(NotImplementedError):
+            secured_fields.EncryptedBinaryField(compress=True)
+
+    def test_deconstruct(self):
+        field = models.CompressedJSONFieldModel._meta.get_field('field')  # pylint: disable=protected-access
+        _, _, _, kwargs = field.deconstruct()
+
+        self.assertEqual(kwargs['compress'], 'zlib')
@@ -0,0 +1,138 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django import test
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.state import ProjectState
+
+from main import models
+from secured_fields import backfill, operations
+
+
+class EncryptExistingValuesTestCase(test.TestCase):
+
+    def insert_raw(self, model_class, *values) -> list:
+        # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            for value in values:
+                cursor.execute(f'INSERT INTO {model_class._meta.db_table} (field) VALUES (%s)', [value])
+
+        return list(model_class.objects.order_by('pk').values_list('pk', flat=True))
+
+    def get_raw_values(self, model_class) -> list:
+        return [value for _, value in backfill.get_raw_values(model_class, ['field'], using='default').order_by('pk')]
+
+    def encrypt(self, model_class, **kwargs) -> list:
+        return list(backfill.encrypt_existing_values(model_class, 'field', **kwargs))
+
+    def test_simple(self):
+        self.insert_raw(models.CharFieldModel, 'test', None)
+        models.CharFieldModel.objects.create(field='encrypted')
+        encrypted_value = self.get_raw_values(models.CharFieldModel)[2]
+
+        batches = self.encrypt(models.CharFieldModel, batch_size=1)
+
+        self.assertEqual([(batch.rows, batch.updated) for batch in batches], [(1, 1), (1, 0)])
+        field = models.CharFieldModel._meta.get_field('field')  # pylint: disable=protected-access
+        raw_values = self.get_raw_values(models.CharFieldModel)
+        self.assertTrue(backfill.is_encrypted(field, raw_values[0]))
+        self.assertIsNone(raw_values[1])
+        self.assertEqual(raw_values[2], encrypted_value)
+
+        legacy_reads = field.legacy_reads
+        values = list(models.CharFieldModel.objects.order_by('pk').values_list('field', flat=True))
+        self.assertEqual(values, ['test', None, 'encrypted'])
+        self.assertEqual(field.legacy_reads, legacy_reads)
+
+    def test_searchable(self):
+        self.insert_raw(models.SearchableCharFieldModel, 'test')
+        self.insert_raw(models.HashColumnCharFieldModel, 'test')
+        self.insert_raw(models.SearchableIntegerFieldModel, '42')
+        self.insert_raw(models.SearchableDateFieldModel, '2020-01-02')
+        for model_class in [
+            models.SearchableCharFieldModel,
+            models.HashColumnCharFieldModel,
+            models.SearchableIntegerFieldModel,
+            models.SearchableDateFieldModel,
+        ]:
+            self.encrypt(model_class)
+
+        self.assertTrue(models.SearchableCharFieldModel.objects.filter(field='test').exists())
+        self.assertTrue(models.HashColumnCharFieldModel.objects.filter(field='test').exists())
+        self.assertTrue(models.SearchableIntegerFieldModel.objects.filter(field=42).exists())
+        self.assertTrue(models.SearchableDateFieldModel.objects.filter(field=datetime.date(2020, 1, 2)).exists())
+
+    def test_json(self):
+        self.insert_raw(models.JSONFieldModel, '{"a": 1}')
+
+        self.encrypt(models.JSONFieldModel)
+
+        self.assertEqual(models.JSONFieldModel.objects.get().field, {'a': 1})
+        self.assertNotIn('"a"', self.get_raw_values(models.JSONFieldModel)[0])
+
+    def test_changed_while_encrypted(self):
+        pk, = self.insert_raw(models.CharFieldModel, 'test')
+
+        update_raw_values = backfill.update_raw_values
+
+        def save(*args, **kwargs):
+            models.CharFieldModel.objects.filter(pk=pk).update(field='changed')
+            return update_raw_values(*args, **kwargs)
+
+        with mock.patch.object(backfill, 'update_raw_values', side_effect=save):
+            self.encrypt(models.CharFieldModel)
+
+        self.assertEqual(models.CharFieldModel.objects.get(pk=pk).field, 'changed')
+
+    def test_binary(self):
+        with self.assertRaises(NotImplementedError):
+            self.encrypt(models.BinaryFieldModel)
+
+    def test_operation(self):
+        self.insert_raw(models.SearchableCharFieldModel, 'test', 'user')
+
+        state = ProjectState.from_apps(models.SearchableCharFieldModel._meta.apps)  # pylint: disable=protected-access
+        operation = operations.EncryptExistingValues('SearchableCharFieldModel', 'field')
+        operation.database_forwards('main', mock.Mock(connection=connection), state, state)
+
+        self.assertEqual(models.SearchableCharFieldModel.objects.get(field='user').field, 'user')
+
+        operation.database_backwards('main', mock.Mock(connection=connection), state, state)
+
+        self.assertEqual(self.get_raw_values(models.SearchableCharFieldModel), ['test', 'user'])
+
+    def test_operation_deconstruct(self):
+        operation = operations.EncryptExistingValues('SearchableCharFieldModel', 'field', batch_size=10)
+
+        self.assertEqual(
+            operation.deconstruct(), (
+                'EncryptExistingValues',
+                [],
+                {
+                    'model_name': 'SearchableCharFieldModel',
+                    'name': 'field',
+                    'batch_size': 10,
+                },
+            )
+        )
+        self.assertEqual(operation.migration_name_fragment, 'encrypt_searchablecharfieldmodel_field')
+
+    def test_command(self):
+        self.insert_raw(models.SearchableCharFieldModel, 'test', 'user')
+
+        stdout = StringIO()
+        call_command('encrypt_existing_values', 'main.SearchableCharFieldModel', 'field', stdout=stdout)
+
+        self.assertRegex(stdout.getvalue(), r'^main\.SearchableCharFieldModel\.field: encrypted 2 of 2 rows')
+        self.assertEqual(models.SearchableCharFieldModel.objects.get(field='test').field, 'test')
+
+    def test_command_errors(self):
+        for arguments in [
+            ['main.UnknownModel', 'field'],
+            ['main.SearchableCharFieldModel', 'unknown'],
+            ['main.SearchableCharFieldModel', 'id'],
+        ]:
+            with self.subTest(arguments=arguments), self.assertRaises(CommandError):
+                call_command('encrypt_existing_values', *arguments)
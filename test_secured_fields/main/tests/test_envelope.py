@@ -0,0 +1,181 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from cryptography.fernet import Fernet, InvalidToken
+from django import test
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+
+from main import models
+from secured_fields import backfill, providers
+from secured_fields import fernet as fernet_module
+from secured_fields.cache import ClientCache
+from secured_fields.fernet import get_data_keys, get_fernet
+
+
+class EnvelopeTestCase(test.TestCase):
+    model_class = models.SearchableCharFieldModel
+
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.directory = os.path.join(directory.name, 'keys')
+        master_key_path = os.path.join(directory.name, 'master.key')
+        with open(master_key_path, 'wb') as f:
+            f.write(Fernet.generate_key())
+
+        settings_override = test.override_settings(
+            SECURED_FIELDS_KEY_PROVIDER='secured_fields.providers.LocalKeyProvider',
+            SECURED_FIELDS_KEY_PROVIDER_OPTIONS={
+                'directory': self.directory,
+                'master_key_path': master_key_path,
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        fernet_module.fernet_client = None
+
+    def get_raw_value(self, model) -> str:
+        return dict(backfill.get_raw_values(self.model_class, ['field'], using='default'))[model.pk]
+
+    def test_simple(self):
+        model = self.model_class.objects.create(field='test')
+        model.refresh_from_db()
+
+        self.assertEqual(model.field, 'test')
+        self.assertEqual(self.model_class.objects.get(field='test'), model)
+
+        key_id = get_data_keys().get_current()[0]
+        self.assertTrue(self.get_raw_value(model).startswith(f'd1:{key_id}:gAAAAA'))
+
+        # only the wrapped data key is stored
+        with open(os.path.join(self.directory, f'{key_id}.key'), 'rb') as f:
+            wrapped_key = f.read()
+        self.assertNotIn(get_data_keys().provider.get_data_key(key_id), wrapped_key)
+
+    def test_amortized(self):
+        """The provider is called once per data key, not once per value"""
+        with mock.patch.object(
+            providers.LocalKeyProvider,
+            'generate_data_key',
+            autospec=True,
+            side_effect=providers.LocalKeyProvider.generate_data_key,
+        ) as generate_data_key:
+            self.model_class.objects.bulk_create([self.model_class(field=f'value {i}') for i in range(50)])
+        generate_data_key.assert_called_once()
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        # e.g. another process
+        fernet_module.data_keys = False
+        with mock.patch.object(
+            providers.LocalKeyProvider,
+            'get_data_key',
+            autospec=True,
+            side_effect=providers.LocalKeyProvider.get_data_key,
+        ) as get_data_key:
+            self.assertEqual(len(list(self.model_class.objects.all())), 50)
+        get_data_key.assert_called_once()
+
+    @test.override_settings(SECURED_FIELDS_DATA_KEY_MAX_AGE=0)
+    def test_max_age(self):
+        model_1 = self.model_class.objects.create(field='test')
+        model_2 = self.model_class.objects.create(field='test')
+
+        self.assertNotEqual(self.get_raw_value(model_1)[:20], self.get_raw_value(model_2)[:20])
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertEqual(self.model_class.objects.filter(field='test').count(), 2)
+
+    def test_ciphers(self):
+        with test.override_settings(SECURED_FIELDS_CIPHER='aes-gcm'):
+            model = self.model_class.objects.create(field='test')
+            binary_model = models.BinaryStorageCharFieldModel.objects.create(field='test')
+
+        self.assertRegex(self.get_raw_value(model), r'^d1:[0-9a-f]{16}:a1:')
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'test')
+
+        raw_value = dict(backfill.get_raw_values(models.BinaryStorageCharFieldModel, ['field'], using='default'))
+        raw_value = bytes(raw_value[binary_model.pk])
+        self.assertTrue(raw_value.startswith(b'SFD1'))
+        self.assertEqual(get_fernet().from_token(get_fernet().to_token(raw_value)), raw_value)
+        self.assertEqual(models.BinaryStorageCharFieldModel.objects.get(pk=binary_model.pk).field, 'test')
+
+    def test_static_keys(self):
+        """Values encrypted with `SECURED_FIELDS_KEY` stay readable, and get rotated to a data key"""
+        with test.override_settings(SECURED_FIELDS_KEY_PROVIDER=None):
+            model = self.model_class.objects.create(field='test')
+        self.assertTrue(self.get_raw_value(model).startswith('gAAAAA'))
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'test')
+
+        stdout = StringIO()
+        call_command('rotate_keys', 'main.SearchableCharFieldModel', stdout=stdout)
+        self.assertIn('rotated 1 of 1 rows', stdout.getvalue())
+        self.assertTrue(self.get_raw_value(model).startswith('d1:'))
+
+        stdout = StringIO()
+        call_command('key_usage', 'main.SearchableCharFieldModel', stdout=stdout)
+        self.assertIn('  data keys of the key provider: 1', stdout.getvalue())
+
+        stdout = StringIO()
+        call_command('rotate_keys', 'main.SearchableCharFieldModel', stdout=stdout)
+        self.assertIn('rotated 0 of 1 rows', stdout.getvalue())
+
+    def test_unknown_data_key(self):
+        model = self.model_class.objects.create(field='test')
+        token = self.get_raw_value(model)[:-65]
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+        fernet_module.data_keys = False
+        with self.assertRaises(InvalidToken):
+            get_fernet().decrypt(token)
+        self.assertIsNone(get_fernet().find_key_id(token))
+
+        with test.override_settings(SECURED_FIELDS_KEY_PROVIDER=None):
+            with self.assertRaises(ImproperlyConfigured):
+                get_fernet().decrypt(token)
+
+    def test_commands_without_provider(self):
+        self.model_class.objects.create(field='test')
+
+        with test.override_settings(SECURED_FIELDS_KEY_PROVIDER=None):
+            stdout = StringIO()
+            call_command('key_usage', 'main.SearchableCharFieldModel', stdout=stdout)
+            self.assertIn('  not encrypted or unknown key: 1', stdout.getvalue())
+
+            stdout = StringIO()
+            call_command('rotate_keys', 'main.SearchableCharFieldModel', stdout=stdout)
+            self.assertIn('rotated 0 of 1 rows, 1 values with an unknown key', stdout.getvalue())
+
+    def test_is_token(self):
+        token = get_fernet().encrypt_with('fernet', b'test').decode()
+
+        self.assertTrue(get_fernet().is_token(token))
+        self.assertFalse(get_fernet().is_token('d1:unknown:' + token[20:]))
+        self.assertFalse(get_fernet().is_token(token[:20]))
+
+
+class ClientCacheTestCase(test.SimpleTestCase):
+
+    def test_max_entries(self):
+        cache = ClientCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_ttl(self):
+        cache = ClientCache(max_entries=2, ttl=10)
+        with mock.patch('time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('time.monotonic', return_value=105):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('time.monotonic', return_value=110):
+            self.assertIsNone(cache.get('a'))
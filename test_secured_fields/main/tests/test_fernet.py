@@ -1,7 +1,11 @@
+from unittest import mock
+
 from cryptography.fernet import Fernet
 
 from django import test
+from django.db import connection
 
+from main import models
 from secured_fields import fernet as fernet_module
 from secured_fields.fernet import get_fernet
 
@@ -31,3 +35,64 @@ class FernetTestCase(test.TestCase):
 
             encrypted_2 = fernet.encrypt(b'test')
             self.assertEqual(fernet.decrypt(encrypted_2), b'test')
+
+
+class KeyIdTestCase(test.TestCase):
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+    def tearDown(self) -> None:
+        fernet_module.fernet_client = None
+
+    def test_envelope(self):
+        fernet = get_fernet()
+        encrypted = fernet.encrypt_with_key_id(b'test')
+
+        self.assertTrue(encrypted.startswith(b'v1:' + fernet.key_ids[0].encode() + b':gAAAAA'))
+        self.assertEqual(fernet.decrypt(encrypted), b'test')
+        self.assertEqual(fernet.decrypt(encrypted.decode()), b'test')
+
+    def test_rotation_keys(self):
+        key1 = Fernet.generate_key()
+        with test.override_settings(SECURED_FIELDS_KEY=key1):
+            encrypted = get_fernet().encrypt_with_key_id(b'test')
+            legacy_encrypted = get_fernet().encrypt(b'test')
+
+        fernet_module.fernet_client = None
+        key2 = Fernet.generate_key()
+        with test.override_settings(SECURED_FIELDS_KEY=[key2, key1]):
+            fernet = get_fernet()
+
+            # the key is picked from the id, without trying the newer key first
+            newer_key = fernet._fernets[0]  # pylint: disable=protected-access
+            with mock.patch.object(newer_key, 'decrypt', side_effect=AssertionError):
+                self.assertEqual(fernet.decrypt(encrypted), b'test')
+            self.assertEqual(fernet.decrypt(legacy_encrypted), b'test')
+
+            rotated = fernet.rotate(encrypted)
+            self.assertTrue(rotated.startswith(b'v1:' + fernet.key_ids[0].encode() + b':'))
+            self.assertEqual(fernet.decrypt(rotated), b'test')
+            self.assertFalse(fernet.rotate(legacy_encrypted).startswith(b'v1:'))
+
+            self.assertEqual(fernet.find_key_id(encrypted), fernet.get_key_id(key1))
+            self.assertEqual(fernet.find_key_id(legacy_encrypted), fernet.get_key_id(key1))
+            self.assertEqual(fernet.find_key_id(rotated), fernet.get_key_id(key2))
+            self.assertIsNone(fernet.find_key_id(Fernet(Fernet.generate_key()).encrypt(b'test')))
+
+    def test_unknown_key_id(self):
+        fernet = get_fernet()
+        encrypted = b'v1:00000000:' + fernet.encrypt(b'test')
+
+        self.assertEqual(fernet.decrypt(encrypted), b'test')
+
+    @test.override_settings(SECURED_FIELDS_KEY_ID=True)
+    def test_field(self):
+        model = models.SearchableCharFieldModel.objects.create(field='test')
+
+        table_name = models.SearchableCharFieldModel._meta.db_table  # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT field FROM {table_name}')
+            self.assertTrue(cursor.fetchone()[0].startswith('v1:'))
+
+        self.assertEqual(models.SearchableCharFieldModel.objects.get(field='test'), model)
+        self.assertEqual(models.SearchableCharFieldModel.objects.get(pk=model.pk).field, 'test')
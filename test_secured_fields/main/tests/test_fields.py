@@ -2,11 +2,14 @@ import base64
 import datetime
 import decimal
 import hashlib
+import io
 import typing
 import warnings
+from unittest import mock
 
 from django import test
 from django.core import exceptions
+from django.core.files import File
 from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db import connection
@@ -17,9 +20,11 @@ from freezegun import freeze_time
 import secured_fields
 from main import models
 from main.tests import utils as test_utils
+from secured_fields import streams
 from secured_fields.enum import DatabaseVendor
 from secured_fields.exceptions import DatabaseBackendNotSupported
 from secured_fields.fernet import get_fernet
+from secured_fields.mixins import EncryptedMixin
 
 
 class BaseTestCases:
@@ -332,11 +337,41 @@ class FileFieldTestCase(BaseTestCases.BaseFileFieldTestCase):
         self.assertEqual(model.field.name, self.file_name)
         self.assertEqual(model.field.read(), self.file_content)
         with open(model.field.path, 'rb') as f:
-            self.assertEqual(get_fernet().decrypt(f.read()), self.file_content)
+            encrypted_content = f.read()
+        self.assertTrue(encrypted_content.startswith(streams.MAGIC))
+        self.assertNotIn(self.file_content, encrypted_content)
+        self.assertEqual(len(encrypted_content), streams.get_encrypted_size(len(self.file_content), 64 * 1024))
 
     def test_simple(self):
         self._test()
 
+    @test.override_settings(SECURED_FIELDS_FILE_SEGMENT_SIZE=16)
+    def test_streaming(self):
+        """Files are read by segments, never as a whole"""
+        content = b'0123456789' * 10
+
+        class SegmentReader(io.BytesIO):
+
+            def read(self, size=-1):
+                assert 0 <= size <= 16, size
+                return super().read(size)
+
+        model = self.model_class.objects.create(field=File(SegmentReader(content), name=self.file_name))
+        model.refresh_from_db()
+
+        with model.field.open() as f:
+            self.assertEqual(f.read(16), content[:16])
+            self.assertEqual(b''.join(f.chunks(chunk_size=16)), content)
+
+    def test_legacy(self):
+        """Files encrypted as a whole by earlier versions are still readable"""
+        model = self.model_class.objects.create(field=self.uploaded_file)
+        with open(model.field.path, 'wb') as f:
+            f.write(get_fernet().encrypt(self.file_content))
+
+        model.refresh_from_db()
+        self.assertEqual(model.field.read(), self.file_content)
+
     def test_null(self):
         model = self.model_class.objects.create(field=None)
         model.refresh_from_db()
@@ -452,3 +487,55 @@ class SearchableUUIDFieldTestCase(UUIDFieldTestCase):
     def test_with_salt(self):
         self.create_and_assert(test_utils.UUID_1)
         self.assert_hashed_field(self.get_expected_str(), salt='test')
+
+
+class LegacyValueTestCase(test.TestCase):
+    model_class = models.CharFieldModel
+
+    def setUp(self):
+        self.field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        self.field.legacy_reads = 0
+
+    def tearDown(self):
+        self.field.legacy_reads = 0
+
+    def create_raw(self, value: str) -> Model:
+        model = self.model_class.objects.create(field=None)
+        with connection.cursor() as cursor:
+            # pylint: disable=protected-access
+            cursor.execute(f'UPDATE {self.model_class._meta.db_table} SET field = %s WHERE id = %s', [value, model.pk])
+
+        return model
+
+    def test_plaintext(self):
+        model = self.create_raw('plain text')
+
+        with mock.patch.object(EncryptedMixin, 'decrypt') as decrypt:
+            self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'plain text')
+
+        decrypt.assert_not_called()
+        self.assertEqual(self.field.legacy_reads, 1)
+
+    def test_token_like_plaintext(self):
+        value = 'gA' + 'A' * 98
+        model = self.create_raw(value)
+
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, value)
+        self.assertEqual(self.field.legacy_reads, 1)
+
+    def test_encrypted(self):
+        model = self.model_class.objects.create(field='test')
+
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'test')
+        self.assertEqual(self.field.legacy_reads, 0)
+
+    def test_is_token(self):
+        fernet = get_fernet()
+
+        self.assertTrue(fernet.is_token(fernet.encrypt(b'').decode()))
+        self.assertTrue(fernet.is_token(fernet.encrypt(b'test' * 100).decode()))
+        self.assertTrue(fernet.is_token(fernet.encrypt_with_key_id(b'test').decode()))
+        self.assertFalse(fernet.is_token('test'))
+        self.assertFalse(fernet.is_token(fernet.encrypt(b'test').decode()[:-4]))
+        self.assertFalse(fernet.is_token(fernet.encrypt(b'test').decode().replace('A', '+')))
+        self.assertFalse(fernet.is_token('hA' + fernet.encrypt(b'test').decode()[2:]))
@@ -0,0 +1,233 @@
+from unittest import mock
+
+from django import test
+from django.core.exceptions import FieldError
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.migrations.state import ProjectState
+
+from main import models
+from main.tests import utils as test_utils
+from secured_fields import backfill, operations, utils
+from secured_fields.fernet import get_fernet
+from secured_fields.mixins import EncryptedMixin
+
+
+@test.override_settings(SECURED_FIELDS_HASH_SALT='test')
+class HashColumnTestCase(test.TestCase):
+    model_class = models.HashColumnCharFieldModel
+
+    def get_raw_values(self, pk: int) -> tuple:
+        # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT field, field_hash FROM {self.model_class._meta.db_table} WHERE id = %s', [pk])
+            return cursor.fetchone()
+
+    def test_simple(self):
+        model = self.model_class.objects.create(field='test')
+        model.refresh_from_db()
+
+        self.assertEqual(model.field, 'test')
+
+        raw_value, raw_hash = self.get_raw_values(model.pk)
+        self.assertNotIn(EncryptedMixin.separator, raw_value)
+        self.assertEqual(get_fernet().decrypt(raw_value.encode()).decode(), 'test')
+        self.assertEqual(raw_hash, utils.hash_with_salt('test'))
+
+    def test_null(self):
+        model = self.model_class.objects.create(field=None)
+
+        self.assertEqual(self.get_raw_values(model.pk), (None, None))
+
+    def test_exact(self):
+        model = self.model_class.objects.create(field='under_score 100%')
+        self.model_class.objects.create(field='another')
+
+        queryset = self.model_class.objects.filter(field='under_score 100%')
+
+        self.assertEqual(list(queryset), [model])
+        self.assertIn('"field_hash" =', str(queryset.query).replace('`', '"'))
+        self.assertNotIn('LIKE', str(queryset.query))
+
+    def test_in(self):
+        model_1 = self.model_class.objects.create(field='test')
+        model_2 = self.model_class.objects.create(field='user')
+        self.model_class.objects.create(field='another')
+
+        queryset = self.model_class.objects.filter(field__in=['test', 'user', 'nobody']).order_by('pk')
+
+        self.assertEqual(list(queryset), [model_1, model_2])
+        self.assertNotIn('LIKE', str(queryset.query))
+
+    def test_isnull(self):
+        model_1 = self.model_class.objects.create(field=None)
+        model_2 = self.model_class.objects.create(field='test')
+
+        self.assertEqual(list(self.model_class.objects.filter(field__isnull=True)), [model_1])
+        self.assertEqual(list(self.model_class.objects.filter(field__isnull=False)), [model_2])
+
+        # values stored before the hash column was added have no hashed value yet
+        self.model_class.objects.filter(pk=model_2.pk).update(field_hash=None)
+        self.assertEqual(list(self.model_class.objects.filter(field__isnull=False)), [model_2])
+        self.assertEqual(list(self.model_class.objects.filter(field__isnull=True)), [model_1])
+
+    def test_uuid_field(self):
+        """The hash has to be computed from the value prepared for the database connection"""
+        model = models.HashColumnUUIDFieldModel.objects.create(field=test_utils.UUID_1)
+
+        self.assertEqual(list(models.HashColumnUUIDFieldModel.objects.filter(field=test_utils.UUID_1)), [model])
+
+    def test_save_updates_hash(self):
+        model = self.model_class.objects.create(field='test')
+        model.field = 'user'
+        model.save()
+
+        self.assertEqual(self.get_raw_values(model.pk)[1], utils.hash_with_salt('user'))
+
+    def test_save_update_fields_updates_hash(self):
+        model = self.model_class.objects.create(field='test')
+        model.field = 'user'
+        model.save(update_fields=['field', 'field_hash'])
+
+        self.assertEqual(self.get_raw_values(model.pk)[1], utils.hash_with_salt('user'))
+        self.assertEqual(self.model_class.objects.get(field='user'), model)
+
+        # only the loaded fields are saved
+        model = self.model_class.objects.only('field', 'field_hash').get(pk=model.pk)
+        model.field = 'test'
+        model.save()
+
+        self.assertEqual(self.get_raw_values(model.pk)[1], utils.hash_with_salt('test'))
+
+    def test_save_update_fields_without_hash(self):
+        model = self.model_class.objects.create(field='test')
+        model.field = 'user'
+
+        with self.assertRaisesMessage(FieldError, '`field_hash`'):
+            model.save(update_fields=['field'])
+
+        model = self.model_class.objects.only('field').get(pk=model.pk)
+        model.field = 'user'
+        with self.assertRaisesMessage(FieldError, '`field_hash`'):
+            model.save()
+
+        self.assertEqual(self.get_raw_values(model.pk)[1], utils.hash_with_salt('test'))
+
+    def test_hash_attribute(self):
+        """The hash field reads the hashed value of the current value, or the loaded one when it is unchanged"""
+        model = self.model_class(field='test')
+        self.assertEqual(model.field_hash, utils.hash_with_salt('test'))
+
+        model.save()
+        model = self.model_class.objects.get(pk=model.pk)
+        self.assertEqual(model.field_hash, utils.hash_with_salt('test'))
+
+        model.field = 'user'
+        self.assertEqual(model.field_hash, utils.hash_with_salt('user'))
+
+        model.field = None
+        self.assertIsNone(model.field_hash)
+
+        # deferred along with its encrypted field, it is loaded from the database
+        model = self.model_class.objects.only('pk').get(pk=model.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(model.field_hash, utils.hash_with_salt('test'))
+
+    def test_update(self):
+        model = self.model_class.objects.create(field='test')
+
+        # rewritten stored values keep their hashed value
+        self.model_class.objects.filter(pk=model.pk).update(field=F('field'))
+        self.assertEqual(self.model_class.objects.get(field='test'), model)
+
+        # only `update()` of `EncryptedManager` updates the hash column by itself
+        self.model_class.objects.filter(pk=model.pk).update(field='user', field_hash=utils.hash_with_salt('user'))
+        self.assertEqual(self.model_class.objects.get(field='user'), model)
+
+    def test_update_of_encrypted_manager(self):
+        model = models.ManagedHashColumnFieldModel.objects.create(field='test', binary_field='test')
+
+        models.ManagedHashColumnFieldModel.objects.filter(pk=model.pk).update(field='user', binary_field='user')
+
+        self.assertEqual(models.ManagedHashColumnFieldModel.objects.get(field='user', binary_field='user'), model)
+        self.assertFalse(models.ManagedHashColumnFieldModel.objects.filter(field='test').exists())
+
+        models.ManagedHashColumnFieldModel.objects.filter(pk=model.pk).update(field=None)
+        self.assertEqual(models.ManagedHashColumnFieldModel.objects.get(field__isnull=True), model)
+
+    def test_update_of_encrypted_manager_expression(self):
+        model = models.ManagedHashColumnFieldModel.objects.create(field='test', binary_field='test')
+
+        with self.assertRaisesMessage(FieldError, '`field_hash`'), transaction.atomic():
+            models.ManagedHashColumnFieldModel.objects.filter(pk=model.pk).update(field=F('field'))
+
+        queryset = models.ManagedHashColumnFieldModel.objects.filter(pk=model.pk)
+        queryset.update(field=F('field'), field_hash=F('field_hash'))
+        self.assertEqual(models.ManagedHashColumnFieldModel.objects.get(field='test'), model)
+
+    def test_bulk_update_updates_hash(self):
+        model = self.model_class.objects.create(field='test')
+        model.field = 'user'
+        self.model_class.objects.bulk_update([model], ['field', 'field_hash'])
+
+        self.assertEqual(self.get_raw_values(model.pk)[1], utils.hash_with_salt('user'))
+        self.assertEqual(self.model_class.objects.get(field='user'), model)
+
+    def test_bulk_update_of_encrypted_manager(self):
+        """The hash column is updated without being listed"""
+        model_1 = models.ManagedHashColumnFieldModel.objects.create(field='test', binary_field='test')
+        model_2 = models.ManagedHashColumnFieldModel.objects.create(field='test', binary_field='test')
+        model_1.field = 'user'
+        model_2.field = None
+
+        updated = models.ManagedHashColumnFieldModel.objects.bulk_update([model_1, model_2], ['field'])
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(models.ManagedHashColumnFieldModel.objects.get(field='user'), model_1)
+        self.assertEqual(models.ManagedHashColumnFieldModel.objects.get(field__isnull=True), model_2)
+        self.assertFalse(models.ManagedHashColumnFieldModel.objects.filter(field='test').exists())
+
+        model_1.field = F('binary_field')
+        with self.assertRaisesMessage(FieldError, '`field`'):
+            models.ManagedHashColumnFieldModel.objects.bulk_update([model_1], ['field'])
+
+    def test_backfill(self):
+        # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            for value in ['test', 'user']:
+                cursor.execute(
+                    f'INSERT INTO {self.model_class._meta.db_table} (field) VALUES (%s)',
+                    [get_fernet().encrypt(value.encode()).decode()],
+                )
+        self.model_class.objects.create(field=None)
+        self.assertFalse(self.model_class.objects.filter(field='test').exists())
+
+        updated = backfill.backfill_hash_column(self.model_class, 'field', batch_size=1)
+
+        self.assertEqual(updated, 3)
+        self.assertEqual(self.model_class.objects.get(field='test').field, 'test')
+        self.assertEqual(self.model_class.objects.get(field='user').field, 'user')
+
+    def test_backfill_operation(self):
+        model = self.model_class.objects.create(field='test')
+        self.model_class.objects.filter(pk=model.pk).update(field_hash=None)
+
+        state = ProjectState.from_apps(models.HashColumnCharFieldModel._meta.apps)  # pylint: disable=protected-access
+        operation = operations.BackfillHashColumn('HashColumnCharFieldModel', 'field')
+        operation.database_forwards('main', mock.Mock(connection=connection), state, state)
+
+        self.assertEqual(self.get_raw_values(model.pk)[1], utils.hash_with_salt('test'))
+
+    def test_historical_model(self):
+        """Historical models declare the hash field explicitly, it must not be added twice"""
+        state = ProjectState.from_apps(models.HashColumnCharFieldModel._meta.apps)  # pylint: disable=protected-access
+        model_state = state.models['main', 'hashcolumncharfieldmodel']
+
+        self.assertIn('field_hash', model_state.fields)
+
+        historical_model = state.apps.get_model('main', 'HashColumnCharFieldModel')
+        field_names = [field.name for field in historical_model._meta.local_fields]  # pylint: disable=protected-access
+
+        self.assertEqual(field_names, ['id', 'field', 'field_hash'])
+        field = historical_model._meta.get_field('field')  # pylint: disable=protected-access
+        self.assertIs(field.hash_field.source_field.model, historical_model)
@@ -0,0 +1,165 @@
+from unittest import mock
+
+from django import test
+from django.db import connection
+from django.db.migrations.state import ProjectState
+from django.db.models import Q
+from django.db.models.sql import Query
+
+from main import models
+from secured_fields import operations
+from secured_fields.enum import DatabaseVendor
+from secured_fields.expressions import HashedSection
+from secured_fields.indexes import HashIndex
+
+
+class HashIndexTestCase(test.TestCase):
+    model_class = models.SearchableCharFieldModel
+
+    def get_index(self, model_class=None):
+        model_class = model_class or self.model_class
+        field = model_class._meta.get_field('field')  # pylint: disable=protected-access
+
+        for index in model_class._meta.indexes:  # pylint: disable=protected-access
+            if index.name == field.get_hash_index_name():
+                return index
+
+        return None
+
+    def get_index_names(self) -> set:
+        # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, self.model_class._meta.db_table)
+
+        return {name for name, constraint in constraints.items() if constraint['index']}
+
+    def test_declared(self):
+        index = self.get_index()
+
+        self.assertIsInstance(index, HashIndex)
+        self.assertEqual(index.expressions, (HashedSection('field'),))
+        self.assertLessEqual(len(index.name), index.max_name_length)
+
+    def test_not_declared(self):
+        self.assertIsNone(self.get_index(models.CharFieldModel))
+        self.assertIsNone(self.get_index(models.HashColumnCharFieldModel))
+
+    def test_historical_model(self):
+        """Historical models declare the index in their options, it must not be added twice"""
+        state = ProjectState.from_apps(self.model_class._meta.apps)  # pylint: disable=protected-access
+        model_state = state.models['main', 'searchablecharfieldmodel']
+
+        self.assertEqual([index.name for index in model_state.options['indexes']], [self.get_index().name])
+
+        historical_model = state.apps.get_model('main', 'SearchableCharFieldModel')
+        self.assertEqual(len(historical_model._meta.indexes), 1)  # pylint: disable=protected-access
+
+    def test_create_sql(self):
+        sql = str(self.get_index().create_sql(self.model_class, connection.schema_editor()))
+
+        if connection.vendor == DatabaseVendor.POSTGRESQL:
+            self.assertIn('(RIGHT("field", 64))', sql)
+        elif connection.vendor == DatabaseVendor.MYSQL:
+            self.assertIn('GENERATED ALWAYS AS (CAST(RIGHT(`field`, 64) AS CHAR(64))) STORED', sql)
+        elif connection.vendor == DatabaseVendor.SQLITE:
+            self.assertIn('(SUBSTR("field", -64))', sql)
+
+    def test_created(self):
+        self.assertIn(self.get_index().name, self.get_index_names())
+
+    def test_mysql_sql(self):
+        """MySQL gets a generated column holding the hashed section, which is indexed"""
+        index = self.get_index()
+        table_name = self.model_class._meta.db_table  # pylint: disable=protected-access
+
+        with mock.patch.object(connection, 'vendor', DatabaseVendor.MYSQL):
+            schema_editor = connection.schema_editor()
+            create_sql = str(index.create_sql(self.model_class, schema_editor))
+            remove_sql = str(index.remove_sql(self.model_class, schema_editor))
+
+        self.assertEqual(
+            create_sql,
+            f'ALTER TABLE "{table_name}" ADD COLUMN "{index.name}" varchar(64) '
+            f'GENERATED ALWAYS AS (CAST(RIGHT("field", 64) AS CHAR(64))) STORED, '
+            f'ADD INDEX "{index.name}" ("{index.name}")',
+        )
+        self.assertEqual(
+            remove_sql,
+            f'ALTER TABLE "{table_name}" DROP INDEX "{index.name}", DROP COLUMN "{index.name}"',
+        )
+
+    def test_mysql_lookup_sql(self):
+        """Lookups compare the exact expression of the generated column, so MySQL substitutes the indexed column"""
+        index = self.get_index()
+
+        with mock.patch.object(connection, 'vendor', DatabaseVendor.MYSQL):
+            create_sql = str(index.create_sql(self.model_class, connection.schema_editor()))
+            query = Query(self.model_class, alias_cols=False)
+            query.add_q(Q(field='test'))
+            lookup_sql, _ = query.where.as_sql(query.get_compiler(connection=connection), connection)
+
+        expression_sql = create_sql.split('GENERATED ALWAYS AS (', 1)[1].rsplit(') STORED', 1)[0]
+        self.assertEqual(expression_sql, 'CAST(RIGHT("field", 64) AS CHAR(64))')
+        self.assertEqual(lookup_sql, f'{expression_sql} = %s')
+
+    def test_lookups(self):
+        hashed_section = {
+            DatabaseVendor.MYSQL: 'CAST(RIGHT(`main_searchablecharfieldmodel`.`field`, 64) AS CHAR(64))',
+            DatabaseVendor.POSTGRESQL: 'RIGHT("main_searchablecharfieldmodel"."field", 64)',
+            DatabaseVendor.SQLITE: 'SUBSTR("main_searchablecharfieldmodel"."field", -64)',
+        }[connection.vendor]
+
+        self.assertIn(f'{hashed_section} = ', str(self.model_class.objects.filter(field='test').query))
+        self.assertIn(hashed_section, str(self.model_class.objects.filter(field__in=['test', 'user']).query))
+
+    def test_lookups_follow_connection(self):
+        """The hashed section is compared only on the backends it is indexed on, whatever the default database"""
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        lhs = self.model_class.objects.filter(field='test').query.where.children[0].lhs
+
+        for vendor in (DatabaseVendor.MYSQL, DatabaseVendor.POSTGRESQL, DatabaseVendor.SQLITE):
+            self.assertEqual(field.get_hash_expression(lhs, mock.Mock(vendor=vendor)), HashedSection(lhs))
+        self.assertIsNone(field.get_hash_expression(lhs, mock.Mock(vendor='oracle')))
+
+    def test_not_searchable(self):
+        """Fields without the index keep checking the column itself"""
+        queryset = models.CharFieldModel.objects.filter(field__isnull=True)
+        sql, _ = queryset.query.get_compiler(connection=connection).as_sql()
+
+        self.assertIn(f'{connection.ops.quote_name("field")} IS NULL', sql)
+        self.assertNotIn('SUBSTR', sql)
+        self.assertNotIn('RIGHT', sql)
+
+    def test_sqlite_query_plan(self):
+        if connection.vendor != DatabaseVendor.SQLITE:
+            self.skipTest('SQLite only')
+
+        index_name = self.get_index().name
+        for queryset in [
+            self.model_class.objects.filter(field='test'),
+            self.model_class.objects.filter(field__in=['test', 'user']),
+        ]:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = ' '.join(str(row) for row in cursor.fetchall())
+
+            self.assertIn(index_name, plan)
+
+    @test.skipUnlessDBFeature('can_rollback_ddl')
+    def test_remove_legacy_search_index(self):
+        table_name = connection.ops.quote_name(self.model_class._meta.db_table)  # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE INDEX legacy_search_index ON {table_name} (field)')
+        self.assertIn('legacy_search_index', self.get_index_names())
+
+        state = ProjectState.from_apps(self.model_class._meta.apps)  # pylint: disable=protected-access
+        operation = operations.RemoveLegacySearchIndex('SearchableCharFieldModel', 'field')
+        # NOTE: the schema editor is not entered since SQLite's one cannot be used inside a transaction
+        schema_editor = connection.schema_editor()
+        schema_editor.deferred_sql = []
+        operation.database_forwards('main', schema_editor, state, state)
+
+        index_names = self.get_index_names()
+        self.assertNotIn('legacy_search_index', index_names)
+        self.assertIn(self.get_index().name, index_names)
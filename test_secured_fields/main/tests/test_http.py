@@ -0,0 +1,73 @@
+from django import test
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from main import models
+from main.tests import utils as test_utils
+from secured_fields.http import encrypted_file_response
+
+
+@test.override_settings(SECURED_FIELDS_FILE_SEGMENT_SIZE=64)
+class EncryptedFileResponseTestCase(test_utils.FileTestMixin, test.TestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.model = models.FileFieldModel.objects.create(field=SimpleUploadedFile('test.txt', self.content))
+        self.model.refresh_from_db()
+
+    def get_response(self, **headers):
+        request = test.RequestFactory().get('/', headers=headers)
+        response = encrypted_file_response(request, self.model.field)
+        self.addCleanup(response.close)
+
+        return response
+
+    def test_full(self):
+        response = self.get_response()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_range(self):
+        for header, start, end in [
+            ('bytes=100-199', 100, 199),
+            ('bytes=1000-', 1000, 1023),
+            ('bytes=-24', 1000, 1023),
+            ('bytes=0-5000', 0, 1023),
+        ]:
+            with self.subTest(header):
+                response = self.get_response(range=header)
+
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/1024')
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+                self.assertEqual(b''.join(response.streaming_content), self.content[start:end + 1])
+
+    def test_ignored_range(self):
+        for header in ['bytes=200-100', 'bytes=0-1,5-6', 'items=0-1']:
+            with self.subTest(header):
+                response = self.get_response(range=header)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_unsatisfiable_range(self):
+        for header in ['bytes=1024-', 'bytes=-0']:
+            with self.subTest(header):
+                response = self.get_response(range=header)
+
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_empty_file(self):
+        self.model = models.FileFieldModel.objects.create(field=SimpleUploadedFile('empty.txt', b''))
+        self.model.refresh_from_db()
+
+        for header in ['bytes=0-', 'bytes=-24', 'bytes=0-5']:
+            with self.subTest(header):
+                response = self.get_response(range=header)
+
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */0')
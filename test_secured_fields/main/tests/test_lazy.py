@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django import test
+from django.db import connection
+from django.db.models import F
+from django.db.models.query_utils import DeferredAttribute
+
+from main import models
+from secured_fields.descriptors import EncryptedAttribute, EncryptedValue
+from secured_fields.mixins import EncryptedMixin
+
+
+class LazyTestCase(test.TestCase):
+    model_class = models.LazyCharFieldModel
+
+    def get_raw_value(self, model) -> str:
+        # pylint: disable=protected-access
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT field FROM {model._meta.db_table} WHERE id = %s', [model.pk])
+            return cursor.fetchone()[0]
+
+    def test_decrypted_on_access(self):
+        model = self.model_class.objects.create(field='test')
+        model = self.model_class.objects.get(pk=model.pk)
+
+        self.assertIsInstance(model.__dict__['field'], EncryptedValue)
+        with mock.patch.object(EncryptedMixin, 'decrypt', autospec=True, side_effect=EncryptedMixin.decrypt) as decrypt:
+            self.assertEqual(model.field, 'test')
+            self.assertEqual(model.field, 'test')
+
+        decrypt.assert_called_once()
+        self.assertEqual(model.__dict__['field'], 'test')
+
+    def test_descriptor(self):
+        """Only lazy fields get a descriptor decrypting their values"""
+        self.assertIsInstance(self.model_class.__dict__['field'], EncryptedAttribute)
+        self.assertIs(type(models.CharFieldModel.__dict__['field']), DeferredAttribute)
+
+    def test_not_decrypted(self):
+        self.model_class.objects.create(field='test', other='other')
+
+        with mock.patch.object(EncryptedMixin, 'decrypt') as decrypt:
+            self.assertEqual([model.other for model in self.model_class.objects.all()], ['other'])
+
+        decrypt.assert_not_called()
+
+    def test_null(self):
+        model = self.model_class.objects.create(field=None)
+
+        self.assertIsNone(self.model_class.objects.get(pk=model.pk).field)
+
+    def test_values(self):
+        self.model_class.objects.create(field='test')
+
+        self.assertEqual(list(self.model_class.objects.values('field')), [{'field': 'test'}])
+        self.assertEqual(list(self.model_class.objects.values_list('field', flat=True)), ['test'])
+        queryset = self.model_class.objects.annotate(copy=F('field'))
+        self.assertEqual(list(queryset.values_list('copy', flat=True)), ['test'])
+        self.assertEqual(queryset.get().copy, 'test')
+
+    def test_deferred(self):
+        model = self.model_class.objects.create(field='test')
+
+        self.assertEqual(self.model_class.objects.only('other').get(pk=model.pk).field, 'test')
+        self.assertEqual(self.model_class.objects.defer('field').get(pk=model.pk).field, 'test')
+
+    def test_save_unchanged(self):
+        model = self.model_class.objects.create(field='test')
+        raw_value = self.get_raw_value(model)
+
+        model = self.model_class.objects.get(pk=model.pk)
+        model.other = 'other'
+        with mock.patch.object(EncryptedMixin, 'decrypt') as decrypt:
+            model.save()
+
+        decrypt.assert_not_called()
+        self.assertEqual(self.get_raw_value(model), raw_value)
+        self.assertEqual(self.model_class.objects.get(field='test'), model)
+
+    def test_save_changed(self):
+        model = self.model_class.objects.create(field='test')
+
+        model = self.model_class.objects.get(pk=model.pk)
+        model.field = 'user'
+        model.save()
+
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, 'user')
+        self.assertEqual(self.model_class.objects.get(field='user'), model)
+
+    def test_hash_column(self):
+        model = models.LazyHashColumnCharFieldModel.objects.create(field='test')
+
+        model = models.LazyHashColumnCharFieldModel.objects.get(pk=model.pk)
+        with mock.patch.object(EncryptedMixin, 'decrypt') as decrypt:
+            model.save()
+
+        decrypt.assert_not_called()
+        self.assertEqual(models.LazyHashColumnCharFieldModel.objects.get(field='test'), model)
+
+    def test_json(self):
+        model = models.LazyJSONFieldModel.objects.create(field={'key': ['value']})
+
+        self.assertEqual(models.LazyJSONFieldModel.objects.get(pk=model.pk).field, {'key': ['value']})
+
+    def test_deconstruct(self):
+        _, _, _, kwargs = self.model_class._meta.get_field('field').deconstruct()  # pylint: disable=protected-access
+
+        self.assertIs(kwargs['lazy'], True)
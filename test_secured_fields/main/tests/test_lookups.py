@@ -1,13 +1,15 @@
 import datetime
 import decimal
+import json
 import typing
+from unittest import mock
 
 from django import test
 from django.db import connection
 
 from main import models
 from main.tests import utils as test_utils
-from secured_fields import exceptions
+from secured_fields import exceptions, strategies
 from secured_fields.enum import DatabaseVendor
 
 
@@ -171,6 +173,104 @@ class EncryptedInLookupTestCase(test.TestCase):
             [test_utils.UUID_1, test_utils.UUID_2],
         )
 
+    def test_large_list(self):
+        """A list larger than the backend's limit of params per query"""
+        values = [f'value-{index}' for index in range(5000)]
+
+        self.create_and_assert(models.SearchableCharFieldModel, 'value-4999', values)
+        self.create_and_assert(models.HashColumnCharFieldModel, 'value-4999', values)
+
+    def test_large_list_of_suffixes(self):
+        """Backends without an indexed hashed section match suffixes, also beyond their limit of params"""
+        values = [f'value-{index}' for index in range(50)]
+        model = models.SearchableCharFieldModel.objects.create(field='value-49')
+
+        with (
+            mock.patch.object(connection, 'vendor', 'other'),
+            mock.patch.object(connection.features, 'max_query_params', 10),
+        ):
+            queryset = models.SearchableCharFieldModel.objects.filter(field__in=values)
+            sql, params = queryset.query.sql_with_params()
+
+            self.assertEqual(list(queryset), [model])
+        self.assertIn('LIKE', sql)
+        self.assertEqual(params, ())
+
+    def test_duplicated_hashes(self):
+        """Values prepared into the same value (`100.2` -> `100.20`) are only searched once"""
+        queryset = models.SearchableDecimalFieldModel.objects.filter(
+            field__in=[decimal.Decimal('100.2'), decimal.Decimal('100.20')],
+        )
+
+        _, params = queryset.query.sql_with_params()
+        self.assertEqual(len(params), 1)
+
+
+class InLookupStrategyTestCase(test.SimpleTestCase):
+    values = ['a' * 64, 'b' * 64]
+
+    @staticmethod
+    def get_connection(vendor: str, max_in_list_size=None, max_query_params=None):
+        return mock.Mock(
+            vendor=vendor,
+            ops=mock.Mock(max_in_list_size=lambda: max_in_list_size),
+            features=mock.Mock(max_query_params=max_query_params),
+        )
+
+    def test_default(self):
+        strategy = strategies.get_in_lookup_strategy(self.get_connection(DatabaseVendor.MYSQL))
+
+        self.assertEqual(strategy.equal_any('h', [], self.values), ('h IN (%s, %s)', self.values))
+        self.assertEqual(
+            strategy.like_any('c', [], 'LIKE BINARY %s', self.values),
+            ('(c LIKE BINARY %s OR c LIKE BINARY %s)', self.values),
+        )
+
+    def test_default_max_in_list_size(self):
+        strategy = strategies.get_in_lookup_strategy(self.get_connection('oracle', max_in_list_size=1))
+
+        self.assertEqual(strategy.equal_any('h', [], self.values), ('(h IN (%s) OR h IN (%s))', self.values))
+
+    def test_default_max_query_params(self):
+        """Hashed values beyond the limit of params per query are rendered as literals"""
+        strategy = strategies.get_in_lookup_strategy(
+            self.get_connection('oracle', max_in_list_size=1, max_query_params=1),
+        )
+        patterns = ['%$' + value for value in self.values]
+
+        self.assertEqual(
+            strategy.equal_any('h', [], self.values),
+            (f"(h IN ('{self.values[0]}') OR h IN ('{self.values[1]}'))", []),
+        )
+        self.assertEqual(
+            strategy.like_any('c', [], 'LIKE %s', patterns),
+            (f"(c LIKE '%%${self.values[0]}' OR c LIKE '%%${self.values[1]}')", []),
+        )
+
+        # anything else is never rendered as a literal
+        self.assertEqual(strategy.like_any('c', [], 'LIKE %s', ["'", "'"]), ('(c LIKE %s OR c LIKE %s)', ["'", "'"]))
+        self.assertEqual(strategy.equal_any('h', [], [b'a' * 32]), ('h IN (%s)', [b'a' * 32]))
+
+    def test_postgresql(self):
+        strategy = strategies.get_in_lookup_strategy(self.get_connection(DatabaseVendor.POSTGRESQL))
+
+        self.assertEqual(strategy.equal_any('h', [], self.values), ('h = ANY(%s)', [self.values]))
+        self.assertEqual(strategy.like_any('c', [], 'LIKE %s', self.values), ('c LIKE ANY(%s)', [self.values]))
+
+    def test_sqlite_large_list(self):
+        connection_ = self.get_connection(DatabaseVendor.SQLITE)
+        strategy = strategies.get_in_lookup_strategy(connection_)
+        values = self.values * strategy.large_list_size
+
+        self.assertEqual(
+            strategy.equal_any('h', [], values),
+            ('h IN (SELECT value FROM json_each(%s))', [json.dumps(values)]),
+        )
+        self.assertEqual(
+            strategy.like_any('c', [], 'LIKE %s', values),
+            ('EXISTS (SELECT 1 FROM json_each(%s) WHERE c LIKE value)', [json.dumps(values)]),
+        )
+
 
 @test.override_settings(SECURED_FIELDS_HASH_SALT='test')
 class IsNullLookupTestCase(test.TestCase):
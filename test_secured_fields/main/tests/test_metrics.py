@@ -0,0 +1,70 @@
+from cryptography.fernet import Fernet
+from django import http, test
+from django.db import connection
+
+from main import models
+from secured_fields import metrics
+from secured_fields.middleware import MetricsMiddleware
+
+LABELS = 'field="field",model="main.SearchableCharFieldModel"'
+
+
+@test.override_settings(SECURED_FIELDS_METRICS_COLLECTOR='secured_fields.metrics.InMemoryCollector')
+class MetricsTestCase(test.TestCase):
+
+    def test_simple(self):
+        model = models.SearchableCharFieldModel.objects.create(field='test')
+        models.SearchableCharFieldModel.objects.get(pk=model.pk)
+
+        snapshot = metrics.get_collector().snapshot()
+        for operation in ['encrypt', 'decrypt', 'hash']:
+            labels = f'{{{LABELS},operation="{operation}"}}'
+            self.assertEqual(snapshot['counters'][f'operations{labels}'], 1)
+            self.assertEqual(snapshot['histograms'][f'operation_seconds{labels}']['count'], 1)
+        self.assertEqual(snapshot['counters'][f'bytes{{{LABELS},operation="encrypt"}}'], 4)
+        self.assertNotIn('key_misses', snapshot['counters'])
+
+    def test_invalid_token(self):
+        token = Fernet(Fernet.generate_key()).encrypt(b'test').decode()
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO main_searchablecharfieldmodel (field) VALUES (%s)', [token])
+
+        self.assertEqual(models.SearchableCharFieldModel.objects.get().field, token)
+
+        snapshot = metrics.get_collector().snapshot()
+        self.assertEqual(snapshot['counters'][f'invalid_tokens{{{LABELS}}}'], 1)
+        self.assertEqual(snapshot['counters']['key_misses'], 1)
+
+    def test_signal(self):
+        received = []
+
+        def receiver(**kwargs):
+            received.append((kwargs['operation'], kwargs['model'], kwargs['field'], kwargs['size']))
+
+        metrics.operation_recorded.connect(receiver)
+        self.addCleanup(metrics.operation_recorded.disconnect, receiver)
+        models.CharFieldModel.objects.create(field='test')
+
+        self.assertEqual(received, [('encrypt', 'main.CharFieldModel', 'field', 4)])
+
+    @test.override_settings(SECURED_FIELDS_METRICS_COLLECTOR=None)
+    def test_disabled(self):
+        self.assertIsNone(metrics.get_collector())
+        self.assertIsNone(metrics.start())
+
+    @test.override_settings(SECURED_FIELDS_METRICS_COLLECTOR=None, SECURED_FIELDS_METRICS_HEADER=True)
+    def test_middleware(self):
+
+        def view(request):  # pylint: disable=unused-argument
+            models.SearchableCharFieldModel.objects.create(field='test')
+            return http.HttpResponse(headers={'Server-Timing': 'db;dur=1'})
+
+        with self.assertLogs('secured_fields.metrics', 'INFO') as logs:
+            response = MetricsMiddleware(view)(test.RequestFactory().get('/path'))
+
+        self.assertRegex(logs.records[0].getMessage(), r'^GET /path: encrypt 1 values \(4 bytes\) in [\d.]+ms, hash ')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=1, secured-fields-encrypt;dur=[\d.]+;desc="1 values", secured-fields-hash;dur=[\d.]+;',
+        )
+        self.assertIsNone(metrics.request_totals.get())
@@ -0,0 +1,174 @@
+from concurrent import futures
+from unittest import mock
+
+from django import test
+from django.db import connection
+from django.db.models import F, Value
+
+from main import models
+from secured_fields import backfill, mixins
+from secured_fields.descriptors import EncryptedValue
+from secured_fields.fernet import get_fernet
+
+
+class EncryptedQuerySetTestCase(test.TestCase):
+    model_class = models.ManagedFieldModel
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instances = [
+            cls.model_class.objects.create(field=f'test {index}', json_field={'index': index}) for index in range(5)
+        ]
+        cls.instances.append(cls.model_class.objects.create(field=None, json_field=None))
+
+    def assertDecrypted(self, instances):  # pylint: disable=invalid-name
+        self.assertEqual(instances, self.instances)
+        self.assertEqual([(instance.field, instance.json_field) for instance in instances],
+                         [(model.field, model.json_field) for model in self.instances])
+        for instance in instances:
+            self.assertNotIsInstance(instance.__dict__['field'], EncryptedValue)
+            self.assertNotIsInstance(instance.__dict__['json_field'], EncryptedValue)
+
+    def test_iterator(self):
+        queryset = self.model_class.objects.order_by('pk')
+
+        self.assertDecrypted(list(queryset.iterator(chunk_size=2, decrypt_workers=2)))
+        self.assertDecrypted(list(queryset.iterator(decrypt_workers=4)))
+
+    def test_process_pool(self):
+        queryset = self.model_class.objects.order_by('pk')
+
+        self.assertDecrypted(
+            list(queryset.iterator(chunk_size=4, decrypt_workers=2, executor_class=futures.ProcessPoolExecutor))
+        )
+
+    def test_without_workers(self):
+        self.assertDecrypted(list(self.model_class.objects.order_by('pk').iterator()))
+
+    def test_not_instances(self):
+        queryset = self.model_class.objects.order_by('pk')
+
+        self.assertEqual(
+            list(queryset.values_list('field', flat=True).iterator(decrypt_workers=2)),
+            [model.field for model in self.instances],
+        )
+        self.assertEqual(
+            [model.copy for model in queryset.annotate(copy=F('field')).iterator(decrypt_workers=2)],
+            [model.field for model in self.instances],
+        )
+
+    def test_related(self):
+        """Related instances loaded along with the instances are decrypted too"""
+        for instance in self.instances:
+            models.ManagedRelatedFieldModel.objects.create(parent=instance, field=instance.field)
+        queryset = models.ManagedRelatedFieldModel.objects.order_by('pk')
+
+        for related_queryset in [queryset.select_related('parent'), queryset.prefetch_related('parent')]:
+            instances = list(related_queryset.iterator(chunk_size=2, decrypt_workers=2))
+            self.assertDecrypted([instance.parent for instance in instances])
+            self.assertEqual([instance.field for instance in instances], [model.field for model in self.instances])
+
+        instances = list(
+            self.model_class.objects.order_by('pk').prefetch_related('managedrelatedfieldmodel_set'
+                                                                    ).iterator(chunk_size=2, decrypt_workers=2)
+        )
+        self.assertEqual([instance.managedrelatedfieldmodel_set.get().field for instance in instances],
+                         [model.field for model in self.instances])
+
+    def test_lazy_decryption_reset(self):
+        iterator = self.model_class.objects.order_by('pk').iterator(chunk_size=2, decrypt_workers=2)
+        next(iterator)
+
+        self.assertIsInstance(self.model_class.objects.order_by('pk').first().__dict__['field'], str)
+
+
+class BulkEncryptionTestCase(test.TestCase):
+    model_class = models.ManagedHashColumnFieldModel
+    values = [f'test {index}' for index in range(10)]
+
+    def get_raw_values(self, model_class, field_name) -> list:
+        return [value for _, value in backfill.get_raw_values(model_class, [field_name], using='default')]
+
+    def test_encrypt_many(self):
+        """Values are stored the same as by `get_db_prep_save()`, whatever the number of workers"""
+        field = models.ManagedFieldModel._meta.get_field('field')  # pylint: disable=protected-access
+        expected = [field.get_db_prep_save(value, connection) for value in self.values]
+
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                results = field.encrypt_many(self.values, connection, workers=workers)
+
+                self.assertEqual([hashed_value for _, hashed_value in results], [None] * len(self.values))
+                self.assertEqual(
+                    [field.decrypt_db_value(value) for value, _ in results],
+                    [field.decrypt_db_value(value) for value in expected],
+                )
+                self.assertEqual([value[-65:] for value, _ in results], [value[-65:] for value in expected])
+
+    @test.override_settings(SECURED_FIELDS_KEY_ID=True, SECURED_FIELDS_HASH_SALT='salt')
+    def test_settings(self):
+        field = models.ManagedFieldModel._meta.get_field('field')  # pylint: disable=protected-access
+
+        with mock.patch.object(mixins, 'get_fernet', side_effect=get_fernet) as get_fernet_mock:
+            results = field.encrypt_many(self.values, connection)
+        get_fernet_mock.assert_called_once()
+
+        for value, (stored_value, _) in zip(self.values, results):
+            self.assertTrue(stored_value.startswith('v1:'))
+            self.assertEqual(stored_value[-64:], field.get_db_prep_save(value, connection)[-64:])
+
+    def test_skipped_values(self):
+        field = models.ManagedFieldModel._meta.get_field('field')  # pylint: disable=protected-access
+        expression = Value('test')
+
+        self.assertEqual(
+            field.encrypt_many([None, EncryptedValue('stored'), expression], connection),
+            [(None, None), ('stored', None), (expression, None)],
+        )
+
+    def test_bulk_create(self):
+        instances = [self.model_class(field=value, binary_field=value) for value in self.values]
+        instances.append(self.model_class())
+        self.model_class.objects.bulk_create(instances, encrypt_workers=2)
+
+        # still holding their values
+        self.assertEqual([instance.field for instance in instances[:-1]], self.values)
+        self.assertIsNone(instances[0].__dict__['field_hash'])
+
+        for value in self.values:
+            model = self.model_class.objects.get(field=value, binary_field=value)
+            self.assertEqual((model.field, model.binary_field), (value, value))
+        self.assertEqual(self.model_class.objects.filter(field__isnull=True).count(), 1)
+
+        binary_field = self.model_class._meta.get_field('binary_field')  # pylint: disable=protected-access
+        hashed_values = self.model_class.objects.exclude(binary_field_hash=None).values_list('binary_field_hash')
+        self.assertEqual(
+            sorted(bytes(value) for value, in hashed_values),
+            sorted(binary_field.hash_field.get_hash(value, connection) for value in self.values),
+        )
+
+    def test_bulk_update(self):
+        instances = self.model_class.objects.bulk_create([self.model_class(field=value) for value in self.values])
+        for instance in instances:
+            instance.field = instance.field.upper()
+            instance.binary_field = instance.field
+
+        self.model_class.objects.bulk_update(instances, ['field', 'binary_field', 'binary_field_hash'])
+
+        self.assertEqual(instances[0].field, 'TEST 0')
+        for value in self.values:
+            model = self.model_class.objects.get(binary_field=value.upper())
+            self.assertEqual((model.field, model.binary_field), (value.upper(), value.upper()))
+        # not listed, but updated along with its field
+        self.assertEqual(self.model_class.objects.get(field='TEST 0'), instances[0])
+        self.assertFalse(self.model_class.objects.filter(field='test 0').exists())
+
+    def test_unchanged_values(self):
+        self.model_class.objects.create(field='test')
+        instances = list(self.model_class.objects.iterator(chunk_size=10, decrypt_workers=1))
+        raw_values = self.get_raw_values(self.model_class, 'field')
+
+        with mock.patch.object(mixins.EncryptedMixin, 'decrypt') as decrypt:
+            self.model_class.objects.bulk_update(instances, ['binary_field'])
+        self.assertEqual(self.get_raw_values(self.model_class, 'field'), raw_values)
+        decrypt.assert_not_called()
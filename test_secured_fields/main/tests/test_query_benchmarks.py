@@ -0,0 +1,30 @@
+from django import test
+from django.db import connection
+
+from main import models, query_benchmarks
+from secured_fields.enum import DatabaseVendor
+
+
+class QueryBenchmarkTestCase(test.TestCase):
+
+    def test_simple(self):
+        results = query_benchmarks.run(rows=200, iterations=2)
+
+        self.assertEqual(results['environment']['vendor'], connection.vendor)
+        lookups = [query_benchmarks.get_lookups(model_class, 200) for model_class in query_benchmarks.MODEL_CLASSES]
+        self.assertEqual(len(results['results']), sum(len(model_lookups) for model_lookups in lookups))
+        self.assertNotIn('HashColumnCharFieldModel/isnull', results['results'])
+        for result in results['results'].values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertTrue(result['plan'])
+
+        # NOTE: other planners may scan tables this small whatever the indexes
+        if connection.vendor == DatabaseVendor.SQLITE:
+            self.assertEqual(query_benchmarks.get_sequential_scans(results), [])
+
+    def test_sequential_scan(self):
+        """Lookups which cannot use an index are reported"""
+        table_name = models.CharFieldModel._meta.db_table  # pylint: disable=protected-access
+        plan = query_benchmarks.explain(models.CharFieldModel.objects.filter(field__isnull=True))
+
+        self.assertTrue(query_benchmarks.is_sequential_scan(plan, table_name))
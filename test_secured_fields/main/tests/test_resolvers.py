@@ -0,0 +1,176 @@
+import asyncio
+import threading
+from concurrent import futures
+from io import StringIO
+
+from cryptography.fernet import Fernet
+from django import test
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+
+from main import models
+from secured_fields import backfill, cache
+from secured_fields import fernet as fernet_module
+from secured_fields.fernet import get_client_registry, get_fernet
+from secured_fields.resolvers import use_tenant
+
+TENANT_KEYS = {
+    'tenant-a': Fernet.generate_key(),
+    'tenant-b': [Fernet.generate_key(), Fernet.generate_key()],
+}
+
+
+@test.override_settings(
+    SECURED_FIELDS_KEY_RESOLVER='secured_fields.resolvers.TenantKeyResolver',
+    SECURED_FIELDS_TENANT_KEYS=TENANT_KEYS,
+)
+class TenantKeyResolverTestCase(test.TestCase):
+    model_class = models.SearchableCharFieldModel
+
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+    def tearDown(self):
+        fernet_module.fernet_client = None
+
+    def get_raw_value(self, model) -> str:
+        return dict(backfill.get_raw_values(self.model_class, ['field'], using='default'))[model.pk]
+
+    def test_isolation(self):
+        with use_tenant('tenant-a'):
+            model = self.model_class.objects.create(field='test')
+            self.assertEqual(self.model_class.objects.get(field='test').field, 'test')
+
+        raw_value = self.get_raw_value(model)
+        self.assertEqual(Fernet(TENANT_KEYS['tenant-a']).decrypt(raw_value[:-65].encode()), b'test')
+
+        # read as not encrypted, like any value the keys cannot decrypt
+        with use_tenant('tenant-b'):
+            self.assertEqual(self.model_class.objects.get(pk=model.pk).field, raw_value)
+        self.assertEqual(self.model_class.objects.get(pk=model.pk).field, raw_value)
+
+    def test_default_key(self):
+        model = self.model_class.objects.create(field='test')
+
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        self.assertIs(get_fernet(field), get_fernet())
+        self.assertEqual(get_fernet().decrypt(self.get_raw_value(model)[:-65].encode()), b'test')
+
+    def test_threads(self):
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        tokens = {}
+
+        def encrypt(tenant_id):
+            with use_tenant(tenant_id):
+                tokens[tenant_id] = field.get_db_prep_save(tenant_id, connection=None)[:-65]
+
+        threads = [threading.Thread(target=encrypt, args=(tenant_id,)) for tenant_id in TENANT_KEYS]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for tenant_id, token in tokens.items():
+            client = fernet_module.MultiFernet(fernet_module.get_keys_list(TENANT_KEYS[tenant_id]))
+            self.assertEqual(client.decrypt(token.encode()), tenant_id.encode())
+
+    def test_tasks(self):
+
+        async def get_client(tenant_id):
+            with use_tenant(tenant_id):
+                await asyncio.sleep(0)
+                return get_fernet()
+
+        async def get_clients():
+            return await asyncio.gather(*(get_client(tenant_id) for tenant_id in TENANT_KEYS))
+
+        client_a, client_b = asyncio.run(get_clients())
+        self.assertEqual(client_a.decrypt(Fernet(TENANT_KEYS['tenant-a']).encrypt(b'test')), b'test')
+        self.assertEqual(client_b.decrypt(Fernet(TENANT_KEYS['tenant-b'][1]).encrypt(b'test')), b'test')
+
+    def test_worker_threads(self):
+        with use_tenant('tenant-a'):
+            for index in range(4):
+                models.ManagedFieldModel.objects.create(field=f'test {index}', json_field={'index': index})
+
+            queryset = models.ManagedFieldModel.objects.order_by('pk')
+            values = [model.field for model in queryset.iterator(chunk_size=2, decrypt_workers=2)]
+
+        self.assertEqual(values, [f'test {index}' for index in range(4)])
+
+    def test_unknown_tenant(self):
+        with use_tenant('tenant-c'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.model_class.objects.create(field='test')
+
+    def test_registry(self):
+        with use_tenant('tenant-a'):
+            client = get_fernet()
+            self.assertIs(get_fernet(), client)
+        self.assertEqual(client.key_ids, fernet_module.MultiFernet([TENANT_KEYS['tenant-a']]).key_ids)
+
+        with test.override_settings(SECURED_FIELDS_KEY_RESOLVER_CACHE_MAX_ENTRIES=1):
+            with use_tenant('tenant-a'):
+                client = get_fernet()
+            with use_tenant('tenant-b'):
+                get_fernet()
+            with use_tenant('tenant-a'):
+                self.assertIsNot(get_fernet(), client)
+            self.assertEqual(len(get_client_registry().clients.entries), 1)
+
+    def test_decryption_cache(self):
+        with use_tenant('tenant-a'):
+            token = get_fernet().encrypt(b'test').decode()
+
+        field = self.model_class._meta.get_field('field')  # pylint: disable=protected-access
+        with cache.decryption_cache():
+            with use_tenant('tenant-a'):
+                self.assertEqual(field.decrypt_db_value(token), 'test')
+
+            # not read from the values decrypted for another tenant
+            with use_tenant('tenant-b'):
+                self.assertEqual(field.decrypt_db_value(token), token)
+
+    def test_rotate_keys(self):
+        new_key, old_key = TENANT_KEYS['tenant-b']
+        with test.override_settings(SECURED_FIELDS_TENANT_KEYS={'tenant-b': old_key}):
+            with use_tenant('tenant-b'):
+                model = self.model_class.objects.create(field='test')
+
+        stdout = StringIO()
+        with use_tenant('tenant-b'):
+            call_command('rotate_keys', 'main.SearchableCharFieldModel', '--workers', '2', stdout=stdout)
+            self.assertEqual(self.model_class.objects.get(field='test'), model)
+        self.assertIn('rotated 1 of 1 rows', stdout.getvalue())
+        self.assertEqual(Fernet(new_key).decrypt(self.get_raw_value(model)[:-65].encode()), b'test')
+
+
+@test.override_settings(
+    SECURED_FIELDS_KEY_RESOLVER='secured_fields.resolvers.FieldKeyResolver',
+    SECURED_FIELDS_FIELD_KEYS={'main.CharFieldModel.field': TENANT_KEYS['tenant-a']},
+)
+class FieldKeyResolverTestCase(test.TestCase):
+
+    def setUp(self):
+        fernet_module.fernet_client = None
+
+    def tearDown(self):
+        fernet_module.fernet_client = None
+
+    def test_simple(self):
+        model = models.CharFieldModel.objects.create(field='test')
+        other_model = models.TextFieldModel.objects.create(field='test')
+
+        self.assertEqual(models.CharFieldModel.objects.get(pk=model.pk).field, 'test')
+        self.assertEqual(models.TextFieldModel.objects.get(pk=other_model.pk).field, 'test')
+
+        raw_value = dict(backfill.get_raw_values(models.CharFieldModel, ['field'], using='default'))[model.pk]
+        self.assertEqual(Fernet(TENANT_KEYS['tenant-a']).decrypt(raw_value.encode()), b'test')
+        raw_value = dict(backfill.get_raw_values(models.TextFieldModel, ['field'], using='default'))[other_model.pk]
+        self.assertEqual(get_fernet().decrypt(raw_value.encode()), b'test')
+
+    def test_files(self):
+        self.assertIsNone(get_client_registry().get(None))
+
+        with futures.ThreadPoolExecutor() as executor:
+            self.assertIs(executor.submit(get_fernet).result(), get_fernet())
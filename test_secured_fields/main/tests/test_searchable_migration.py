@@ -1,9 +1,14 @@
+from io import StringIO
+from unittest import mock
+
 from django import test
+from django.core.management import CommandError, call_command
 from django.db import connection
+from django.db.migrations.state import ProjectState
 from django.db.models import Model
 
 from main import models
-from secured_fields import utils
+from secured_fields import backfill, operations, utils
 from secured_fields.fernet import get_fernet
 from secured_fields.mixins import EncryptedMixin
 
@@ -87,3 +92,66 @@ class ChangingSearchableTestCase(test.TestCase):
         model = models.CharFieldModel.objects.get(pk=pk)
 
         self.assertEqual(model.field, raw_value)
+
+
+class BackfillHashesTestCase(ChangingSearchableTestCase):
+    """Adding the hashed values without re-encrypting, after changing `searchable` to `True`"""
+
+    def test_simple(self):
+        encrypted_value = self.make_non_searchable_value('test')
+        pks = [
+            self.insert_raw_value(models.SearchableCharFieldModel, encrypted_value),
+            self.insert_raw_value(models.SearchableCharFieldModel, self.make_searchable_value('user')),
+            self.insert_raw_value(models.SearchableCharFieldModel, 'plaintext'),
+        ]
+        models.SearchableCharFieldModel.objects.create(field=None)
+        searchable_value = self.get_raw_value(models.SearchableCharFieldModel, pks[1])
+
+        with mock.patch.object(get_fernet(), 'encrypt', side_effect=AssertionError):
+            batches = list(backfill.backfill_hashes(models.SearchableCharFieldModel, 'field', batch_size=2))
+
+        self.assertEqual([(batch.rows, batch.updated, batch.failed) for batch in batches], [(2, 1, 0), (1, 0, 1)])
+        # the encrypted section is kept
+        self.assertEqual(
+            self.get_raw_value(models.SearchableCharFieldModel, pks[0]),
+            encrypted_value + EncryptedMixin.separator + utils.hash_with_salt('test'),
+        )
+        self.assertEqual(self.get_raw_value(models.SearchableCharFieldModel, pks[1]), searchable_value)
+        self.assertEqual(self.get_raw_value(models.SearchableCharFieldModel, pks[2]), 'plaintext')
+        self.assertEqual(models.SearchableCharFieldModel.objects.get(field='test').pk, pks[0])
+
+        # already hashed values are not decrypted again
+        with mock.patch.object(EncryptedMixin, 'decrypt_db_value', side_effect=AssertionError):
+            batches = list(backfill.backfill_hashes(models.SearchableCharFieldModel, 'field', batch_size=2))
+        self.assertEqual(sum(batch.updated for batch in batches), 0)
+
+    def test_hash_column(self):
+        encrypted_value = self.make_non_searchable_value('test')
+        pk = self.insert_raw_value(models.HashColumnCharFieldModel, encrypted_value)
+
+        list(backfill.backfill_hashes(models.HashColumnCharFieldModel, 'field'))
+
+        self.assertEqual(self.get_raw_value(models.HashColumnCharFieldModel, pk), encrypted_value)
+        self.assertEqual(models.HashColumnCharFieldModel.objects.get(field='test').pk, pk)
+
+    def test_operation(self):
+        pk = self.insert_raw_value(models.SearchableCharFieldModel, self.make_non_searchable_value('test'))
+
+        state = ProjectState.from_apps(models.SearchableCharFieldModel._meta.apps)  # pylint: disable=protected-access
+        operation = operations.BackfillHashes('SearchableCharFieldModel', 'field')
+        operation.database_forwards('main', mock.Mock(connection=connection), state, state)
+
+        self.assertEqual(models.SearchableCharFieldModel.objects.get(field='test').pk, pk)
+        self.assertEqual(operation.migration_name_fragment, 'backfill_searchablecharfieldmodel_field_hashes')
+
+    def test_command(self):
+        self.insert_raw_value(models.SearchableCharFieldModel, self.make_non_searchable_value('test'))
+
+        stdout = StringIO()
+        call_command('backfill_hashes', 'main.SearchableCharFieldModel', 'field', stdout=stdout)
+
+        self.assertRegex(stdout.getvalue(), r'^main\.SearchableCharFieldModel\.field: hashed 1 of 1 rows, 0 skipped')
+        self.assertTrue(models.SearchableCharFieldModel.objects.filter(field='test').exists())
+
+        with self.assertRaises(CommandError):
+            call_command('backfill_hashes', 'main.CharFieldModel', 'field')
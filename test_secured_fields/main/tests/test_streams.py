@@ -0,0 +1,168 @@
+import io
+from unittest import mock
+
+from cryptography.fernet import InvalidToken
+from django import test
+
+from secured_fields import streams
+
+
+def encrypt(content: bytes, segment_size: int) -> bytes:
+    return b''.join(streams.encrypt_chunks(io.BytesIO(content), segment_size))
+
+
+def decrypt(encrypted: bytes) -> bytes:
+    file = io.BytesIO(encrypted)
+    header = file.read(streams.HEADER.size)
+
+    return b''.join(streams.decrypt_chunks(file, header))
+
+
+def split_segments(encrypted: bytes) -> list:
+    segments = []
+    position = streams.HEADER.size
+    while position < len(encrypted):
+        length, = streams.SEGMENT_LENGTH.unpack_from(encrypted, position)
+        end = position + streams.SEGMENT_LENGTH.size + length
+        segments.append(encrypted[position:end])
+        position = end
+
+    return segments
+
+
+class StreamsTestCase(test.SimpleTestCase):
+
+    def test_simple(self):
+        for size in [0, 1, 15, 16, 100, 128, 129, 1000]:
+            content = bytes(range(256)) * 4
+            content = content[:size]
+            encrypted = encrypt(content, 64)
+
+            self.assertTrue(streams.is_encrypted_stream(encrypted[:streams.HEADER.size]))
+            self.assertEqual(len(encrypted), streams.get_encrypted_size(size, 64))
+            self.assertEqual(decrypt(encrypted), content)
+
+    def test_workers(self):
+        content = bytes(range(256)) * 40
+
+        for workers in [2, 4]:
+            encrypted = b''.join(streams.encrypt_chunks(io.BytesIO(content), 64, workers))
+
+            self.assertEqual(len(split_segments(encrypted)), 160)
+            self.assertEqual(decrypt(encrypted), content)
+
+    @test.override_settings(SECURED_FIELDS_FILE_ENCRYPTION_WORKERS=3)
+    def test_workers_setting(self):
+        content = b'a' * 1000
+
+        executor_class = streams.futures.ThreadPoolExecutor
+        with mock.patch.object(streams.futures, 'ThreadPoolExecutor', wraps=executor_class) as executor:
+            self.assertEqual(decrypt(encrypt(content, 64)), content)
+
+        executor.assert_called_once_with(max_workers=3)
+
+    def test_segments(self):
+        encrypted = encrypt(b'a' * 100, 32)
+
+        self.assertEqual(len(split_segments(encrypted)), 4)
+
+    def test_reordered(self):
+        encrypted = encrypt(b'a' * 100, 32)
+        segments = split_segments(encrypted)
+
+        with self.assertRaises(InvalidToken):
+            decrypt(encrypted[:streams.HEADER.size] + segments[1] + segments[0] + b''.join(segments[2:]))
+
+    def test_truncated(self):
+        encrypted = encrypt(b'a' * 100, 32)
+        segments = split_segments(encrypted)
+
+        with self.assertRaises(InvalidToken):
+            decrypt(encrypted[:streams.HEADER.size] + b''.join(segments[:-1]))
+        with self.assertRaises(InvalidToken):
+            decrypt(encrypted[:-1])
+        with self.assertRaises(InvalidToken):
+            decrypt(encrypted + segments[-1])
+
+    def test_other_file(self):
+        encrypted_1 = encrypt(b'a' * 100, 32)
+        encrypted_2 = encrypt(b'a' * 100, 32)
+
+        with self.assertRaises(InvalidToken):
+            decrypt(encrypted_1[:streams.HEADER.size] + b''.join(split_segments(encrypted_2)))
+
+    def test_reader(self):
+        content = b'abcdefghij' * 10
+        reader = streams.ChunksReader(lambda: streams.encrypt_chunks(io.BytesIO(content), 32))
+
+        first = reader.read(10)
+        self.assertEqual(len(first), 10)
+        self.assertEqual(reader.tell(), 10)
+        self.assertEqual(decrypt(first + reader.read()), content)
+        self.assertEqual(reader.read(), b'')
+
+    def test_reader_seek(self):
+        reader = streams.ChunksReader(lambda: iter([b'abc', b'def']))
+
+        self.assertEqual(reader.read(4), b'abcd')
+        self.assertEqual(reader.seek(0), 0)
+        self.assertEqual(reader.read(), b'abcdef')
+        with self.assertRaises(io.UnsupportedOperation):
+            reader.seek(1)
+
+
+class EncryptedFileTestCase(test.SimpleTestCase):
+    content = bytes(range(256)) * 4
+
+    def open(self, encrypted: bytes) -> streams.EncryptedFile:
+        file = io.BytesIO(encrypted)
+        return streams.EncryptedFile(file, file.read(streams.HEADER.size))
+
+    def test_read(self):
+        file = self.open(encrypt(self.content, 64))
+
+        self.assertEqual(file.size, len(self.content))
+        self.assertEqual(file.read(10), self.content[:10])
+        self.assertEqual(file.read(100), self.content[10:110])
+        self.assertEqual(file.tell(), 110)
+        self.assertEqual(file.read(), self.content[110:])
+        self.assertEqual(file.read(), b'')
+
+    def test_seek(self):
+        file = self.open(encrypt(self.content, 64))
+
+        file.seek(500)
+        self.assertEqual(file.read(30), self.content[500:530])
+        file.seek(-24, io.SEEK_END)
+        self.assertEqual(file.read(), self.content[-24:])
+        file.seek(-100, io.SEEK_CUR)
+        self.assertEqual(file.read(1), self.content[-100:-99])
+        file.seek(5000)
+        self.assertEqual(file.read(), b'')
+
+    def test_decrypted_segments(self):
+        file = self.open(encrypt(self.content, 64))
+        file.size  # pylint: disable=pointless-statement
+
+        with mock.patch.object(streams, 'decrypt_segment', wraps=streams.decrypt_segment) as decrypt_segment:
+            file.seek(130)
+            file.read(10)
+
+        decrypt_segment.assert_called_once_with(file.file_id, 2, mock.ANY, None)
+
+    def test_empty(self):
+        file = self.open(encrypt(b'', 64))
+
+        self.assertEqual(file.size, 0)
+        self.assertEqual(file.read(), b'')
+
+    def test_truncated(self):
+        encrypted = encrypt(self.content, 64)
+        segments = split_segments(encrypted)
+
+        with self.assertRaises(InvalidToken):
+            self.open(encrypted[:streams.HEADER.size])
+        with self.assertRaises(InvalidToken):
+            self.open(encrypted[:streams.HEADER.size] + b''.join(segments[:-1])).read()
+        with self.assertRaises(InvalidToken):
+            self.open(encrypted + b'\0').read()
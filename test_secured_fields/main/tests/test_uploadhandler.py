@@ -0,0 +1,67 @@
+from unittest import mock
+
+from django import test
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from main import models
+from main.tests import utils as test_utils
+from secured_fields import streams
+from secured_fields.uploadhandler import EncryptedFileUploadHandler, EncryptedUploadedFile
+
+
+@test.override_settings(SECURED_FIELDS_FILE_SEGMENT_SIZE=64)
+class EncryptedFileUploadHandlerTestCase(test_utils.FileTestMixin, test.TestCase):
+    content = bytes(range(256)) * 4
+
+    def upload(self) -> EncryptedUploadedFile:
+        request = test.RequestFactory().post('/', {'file': SimpleUploadedFile('test.txt', self.content)})
+        request.upload_handlers = [EncryptedFileUploadHandler(request)]
+
+        uploaded_file = request.FILES['file']
+        self.addCleanup(uploaded_file.close)
+
+        return uploaded_file
+
+    def test_simple(self):
+        uploaded_file = self.upload()
+
+        self.assertIsInstance(uploaded_file, EncryptedUploadedFile)
+        self.assertEqual(uploaded_file.name, 'test.txt')
+        self.assertEqual(uploaded_file.size, len(self.content))
+        self.assertEqual(uploaded_file.read(), self.content)
+
+        encrypted_content = b''.join(uploaded_file.encrypted_content().chunks())
+        self.assertTrue(streams.is_encrypted_stream(encrypted_content[:streams.HEADER.size]))
+        self.assertEqual(len(encrypted_content), streams.get_encrypted_size(len(self.content), 64))
+
+    def test_chunks(self):
+        handler = EncryptedFileUploadHandler()
+        handler.new_file('file', 'test.txt', 'text/plain', None)
+        for start in range(0, len(self.content), 100):
+            handler.receive_data_chunk(self.content[start:start + 100], start)
+        uploaded_file = handler.file_complete(len(self.content))
+        self.addCleanup(uploaded_file.close)
+
+        self.assertEqual(uploaded_file.read(), self.content)
+
+    def test_encrypted_storage(self):
+        """Saved as uploaded, without being encrypted again"""
+        uploaded_file = self.upload()
+        encrypted_content = b''.join(uploaded_file.encrypted_content().chunks())
+
+        with mock.patch.object(streams, 'encrypt_segment') as encrypt_segment:
+            model = models.FileFieldModel.objects.create(field=uploaded_file)
+
+        encrypt_segment.assert_not_called()
+        with open(model.field.path, 'rb') as f:
+            self.assertEqual(f.read(), encrypted_content)
+
+        model.refresh_from_db()
+        self.assertEqual(model.field.read(), self.content)
+        model.field.close()
+
+    def test_plain_storage(self):
+        model = models.FileFieldNoEncryptionModel.objects.create(field=self.upload())
+
+        with open(model.field.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)